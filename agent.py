@@ -1,12 +1,26 @@
 from langgraph.graph import StateGraph, END, START
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.prebuilt import ToolNode
+from langchain_core.runnables import RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import ToolMessage
 from tools import get_rendered_html, download_file, post_request, run_code, add_dependencies
+from tools.workspace import task_workspace
+from tools.time_budget import budget_tool, current_budget, time_budget_scope
+from compaction import current_compactor, compaction_scope
+from llm_cache import LLMCache, fingerprint
+from tracing import span, trace_scope, TraceCallbackHandler
+from events import EventCallbackHandler
+from tool_concurrency import limit_tool, tool_concurrency_scope
+from checkpoints import create_checkpoint_store, SubmissionRecorder
+from rate_limiter import SharedRateLimiter, create_bucket_backend, is_throttle_error, LLM_THROTTLE_RETRIES
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from typing import TypedDict, Annotated, List, Any
 from langchain.chat_models import init_chat_model
 from langgraph.graph.message import add_messages
+import asyncio
 import os
+import threading
+import uuid
 from dotenv import load_dotenv
 
 # Load environment variables from .env file (e.g., EMAIL, SECRET, API keys)
@@ -38,21 +52,28 @@ TOOLS = [run_code, get_rendered_html, download_file, post_request, add_dependenc
 # -------------------------------------------------
 # 🤖 GEMINI LLM SETUP
 # -------------------------------------------------
-# Implement a custom rate limiter to ensure API usage stays within limits
-# (e.g., 9 requests per minute, or 9/60 requests per second).
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=9/60,    
-    check_every_n_seconds=1,    
-    max_bucket_size=9    
-)
-
-# Initialize the Chat Model (Gemini 2.5 Flash is efficient for tool-calling/reasoning).
-# The model is bound to the TOOLS list, enabling Gemini's structured Tool Calling capability.
-llm = init_chat_model(
-    model_provider="google_genai",
-    model="gemini-2.5-flash",
-    rate_limiter=rate_limiter
-).bind_tools(TOOLS)    
+# The Chat Model (Gemini 2.5 Flash is efficient for tool-calling/reasoning),
+# bound to the TOOLS list, enabling Gemini's structured Tool Calling capability.
+# It is built on first use (or by the startup warm-up, see warmup.py) rather
+# than at import, so the server answers /healthz before the provider SDK loads.
+# LLM_PROVIDER=fake swaps in the scripted offline model used by benchmark/.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google_genai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+
+# Rate limiter shared by every process on the host (SQLite-backed by default),
+# so several uvicorn workers together stay within the model's quota
+# (LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE). It slows down on 429s.
+rate_limiter = SharedRateLimiter(LLM_MODEL, backend=create_bucket_backend())
+
+def _build_llm():
+    if LLM_PROVIDER == "fake":
+        from benchmark.fake_llm import ScriptedQuizModel
+        return ScriptedQuizModel(email=EMAIL or "", secret=SECRET or "", rate_limiter=rate_limiter).bind_tools(TOOLS)
+    return init_chat_model(
+        model_provider=LLM_PROVIDER,
+        model=LLM_MODEL,
+        rate_limiter=rate_limiter
+    ).bind_tools(TOOLS)
 
 
 # -------------------------------------------------
@@ -77,31 +98,116 @@ YOUR JOB:
 
 # Create the full prompt template using the system prompt and a placeholder 
 # for the message history (which comes from the State).
+# The run's remaining time (see tools/time_budget.py) is filled in per call.
 prompt = ChatPromptTemplate.from_messages([
-    ("system", SYSTEM_PROMPT),
+    ("system", SYSTEM_PROMPT + "\n{time_budget}"),
     MessagesPlaceholder(variable_name="messages")
 ])
 
-# Define the runnable chain: Prompt -> LLM.
-# This chain is invoked by the 'agent_node'.
-llm_with_prompt = prompt | llm
+# The chat model and the compiled graph are built once, on first use.
+_CHAIN = None
+_APP = None
+_BUILD_LOCK = threading.RLock()
+
+
+def get_llm_chain():
+    """
+    Return the runnable chain: Prompt -> LLM, building the model on first use.
+    This chain is invoked by the 'agent_node'. The last step feeds each
+    response's token usage back to the rate limiter.
+    """
+    global _CHAIN
+    with _BUILD_LOCK:
+        if _CHAIN is None:
+            _CHAIN = prompt | _build_llm() | RunnableLambda(rate_limiter.observe)
+        return _CHAIN
+
+# Record/replay cache of LLM responses (LLM_CACHE_MODE=off|record|replay).
+# Responses are keyed by everything that shapes the answer: model, system
+# prompt, bound tool schemas and the message history. Cache hits never reach
+# the rate limiter.
+llm_cache = LLMCache(fingerprint(
+    provider=LLM_PROVIDER,
+    model=LLM_MODEL,
+    system_prompt=SYSTEM_PROMPT,
+    tools=[convert_to_openai_tool(t) for t in TOOLS],
+))
 
 
 # -------------------------------------------------
 # 🧠 AGENT NODE (The Reasoning Step)
 # -------------------------------------------------
+def call_llm(messages):
+    """
+    Ask the model for the next step, through the response cache. A call the
+    provider throttles (429) makes the shared rate limiter back off, then is
+    retried up to LLM_THROTTLE_RETRIES times.
+    """
+    for attempt in range(LLM_THROTTLE_RETRIES + 1):
+        try:
+            return llm_cache.invoke(get_llm_chain(), messages, time_budget=current_budget().prompt_note())
+        except Exception as e:
+            if attempt == LLM_THROTTLE_RETRIES or not is_throttle_error(e):
+                raise
+            rate_limiter.report_throttle(e)
+
+
+async def acall_llm(messages):
+    """Async counterpart of `call_llm`."""
+    for attempt in range(LLM_THROTTLE_RETRIES + 1):
+        try:
+            return await llm_cache.ainvoke(get_llm_chain(), messages, time_budget=current_budget().prompt_note())
+        except Exception as e:
+            if attempt == LLM_THROTTLE_RETRIES or not is_throttle_error(e):
+                raise
+            rate_limiter.report_throttle(e)
+
+
+def _llm_span_attrs(messages, result) -> dict:
+    """Payload sizes and token counts of one LLM call, for its trace span."""
+    usage = getattr(result, "usage_metadata", None) or {}
+    return {
+        "messages": len(messages),
+        "input_chars": sum(len(str(m.content)) for m in messages),
+        "output_chars": len(str(result.content)),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "tool_calls": len(getattr(result, "tool_calls", None) or []),
+    }
+
+
 def agent_node(state: AgentState):
     """
     The main reasoning node where the LLM decides the next action.
-    It takes the full message history and outputs either a text response 
+    It takes the message history and outputs either a text response 
     (for reasoning or "END") or a structured tool call.
+
+    The LLM sees a compacted view of the history (see compaction.py): finished
+    quiz steps are summarized and large tool outputs are truncated, so the
+    prompt stays within COMPACT_TOKEN_BUDGET however long the chain gets.
     """
-    # Invoke the LLM chain with the current state's messages.
-    result = llm_with_prompt.invoke({"messages": state["messages"]})
+    # Invoke the LLM chain with the compacted view of the state's messages.
+    messages = current_compactor().compact(state["messages"])
+    with span("node", "agent") as s:
+        result = call_llm(messages)
+        s.set(**_llm_span_attrs(messages, result))
     
-    # Return the updated state by appending the LLM's response to the history.
-    # The 'add_messages' reducer handles the list concatenation automatically.
-    return {"messages": state["messages"] + [result]}
+    # Return only the new message; the 'add_messages' reducer appends it
+    # to the history.
+    return {"messages": [result]}
+
+
+async def agent_node_async(state: AgentState):
+    """
+    Async variant of `agent_node`, used when the graph runs with `ainvoke`.
+    The Gemini call (and the rate limiter wait) is awaited instead of
+    blocking a thread.
+    """
+    messages = current_compactor().compact(state["messages"])
+    with span("node", "agent") as s:
+        result = await acall_llm(messages)
+        s.set(**_llm_span_attrs(messages, result))
+    return {"messages": [result]}
 
 
 # -------------------------------------------------
@@ -143,48 +249,179 @@ def route(state):
     # If no tool call and not "END", go back to the agent (e.g., for self-correction or reasoning).
     return "agent"
 
-# Initialize the LangGraph StateGraph with the defined state object.
-graph = StateGraph(AgentState)
+def entry(state):
+    """
+    Conditional entry point. A fresh run starts at the agent; a run resumed
+    from a checkpoint taken between the agent's tool call request and the
+    tool results goes straight to the tools.
+    """
+    last = state["messages"][-1]
+    return "tools" if getattr(last, "tool_calls", None) else "agent"
+
+def build_graph():
+    """Define the agent graph and compile it into an executable application."""
+    # Initialize the LangGraph StateGraph with the defined state object.
+    graph = StateGraph(AgentState)
 
-# Add the main reasoning node.
-graph.add_node("agent", agent_node)
+    # Add the main reasoning node. It carries both a sync and an async
+    # implementation so the same graph serves `invoke` and `ainvoke`.
+    graph.add_node("agent", RunnableLambda(agent_node, afunc=agent_node_async, name="agent"))
 
-# Add the Tool execution node. ToolNode is a pre-built node that executes 
-# the tool calls requested by the LLM and formats the output.
-graph.add_node("tools", ToolNode(TOOLS))
+    # Add the Tool execution node. ToolNode is a pre-built node that executes 
+    # the tool calls requested by the LLM and formats the output. Under `ainvoke`
+    # it awaits each tool's async variant (see tools/) instead of using threads.
+    # Several tool calls in one message run side by side, bounded per run
+    # (TOOL_CONCURRENCY) and per resource group (TOOL_CONCURRENCY_CAPS); results
+    # are returned in the order of the calls. A call overrunning the question's
+    # time budget (TOOL_TIMEOUT_POLICY) is cut off with an error result.
+    graph.add_node("tools", ToolNode([budget_tool(limit_tool(t)) for t in TOOLS]))
 
 
-# Define the edges (connections) between nodes:
+    # Define the edges (connections) between nodes:
 
-# 1. Start: The graph always begins by routing the initial user message (URL) to the agent.
-graph.add_edge(START, "agent")
+    # 1. Start: The graph begins by routing the initial user message (URL) to the
+    #    agent, or resumes with the tools when a checkpoint ends in a tool call.
+    graph.add_conditional_edges(START, entry, ["agent", "tools"])
+
+    # 2. Tool-Use Loop: After the tools execute, send the results back to the agent 
+    #    so the LLM can read the output and decide the next step.
+    graph.add_edge("tools", "agent")
+
+    # 3. Decision Maker: Route the agent's output conditionally using the 'route' function.
+    graph.add_conditional_edges(
+        "agent",    # The source node for the conditional routing
+        route       # The function that determines the next destination
+    )
 
-# 2. Tool-Use Loop: After the tools execute, send the results back to the agent 
-#    so the LLM can read the output and decide the next step.
-graph.add_edge("tools", "agent")
+    # Compile the graph into an executable application.
+    return graph.compile()
 
-# 3. Decision Maker: Route the agent's output conditionally using the 'route' function.
-graph.add_conditional_edges(
-    "agent",    # The source node for the conditional routing
-    route       # The function that determines the next destination
-)
 
-# Compile the graph into an executable application.
-app = graph.compile()
+def get_app():
+    """
+    Return the compiled graph, building it (and the chat model) on first
+    use. The startup warm-up calls this in the background.
+    """
+    global _APP
+    with _BUILD_LOCK:
+        if _APP is None:
+            get_llm_chain()
+            _APP = build_graph()
+        return _APP
 
 
 # -------------------------------------------------
 # 🧪 TEST FUNCTION
 # -------------------------------------------------
-def run_agent(url: str) -> str:
+def report_compaction(compactor):
+    """Print how many prompt tokens compaction saved over the run."""
+    stats = compactor.stats()
+    print(
+        f"Compaction: {stats['tokens_saved']} tokens saved over {stats['calls']} LLM calls "
+        f"({stats['tokens_sent']} sent of {stats['tokens_raw']}), "
+        f"{stats['outputs_spilled']} outputs spilled"
+    )
+
+
+# Message history of unfinished runs, saved after every graph step
+# (CHECKPOINT_STORE=sqlite|memory|off), so an interrupted run can resume.
+CHECKPOINTS = create_checkpoint_store()
+
+
+# Result given to the other tool calls of a message whose submission already
+# completed before the interruption (see `_settle_submissions`).
+NOT_RUN = "Not run: the task was interrupted by a restart. Call the tool again if you still need its result."
+
+
+def _settle_submissions(history: list, submissions: dict) -> list:
+    """
+    When the checkpoint ends in tool calls and a submission among them had
+    already completed, answer the calls from the record instead of running
+    them again: the submission with its recorded response, the others with
+    NOT_RUN. The resumed run then continues at the agent.
+    """
+    calls = getattr(history[-1], "tool_calls", None) or []
+    if not any(call["id"] in submissions for call in calls):
+        return history
+    return history + [
+        ToolMessage(content=submissions.get(call["id"], NOT_RUN), tool_call_id=call["id"], name=call["name"])
+        for call in calls
+    ]
+
+
+def _start(run_id: str, url: str, resume: bool):
+    """
+    Initial graph input of a run, the number of its messages already
+    checkpointed, and the saved time budget: the checkpointed history and
+    clock when resuming one, else the user's message containing the URL.
+    """
+    history = CHECKPOINTS.load(run_id) if resume else None
+    if not history:
+        CHECKPOINTS.delete(run_id)
+        return {"messages": [{"role": "user", "content": url}]}, 0, None
+    state = CHECKPOINTS.load_state(run_id)
+    print(f"Resuming run {run_id} from {len(history)} checkpointed messages")
+    saved = len(history)
+    return {"messages": _settle_submissions(history, state.get("submissions", {}))}, saved, state.get("budget")
+
+
+def _run_config(run_id: str, trace, recorder) -> dict:
+    # Set a high recursion limit for multi-step, complex problems. The
+    # callback handlers record a trace span per tool call, publish progress
+    # events (see events.py) and checkpoint completed submissions.
+    return {
+        "recursion_limit": 200,
+        "callbacks": [TraceCallbackHandler(trace), EventCallbackHandler(run_id), recorder],
+    }
+
+
+def run_agent(url: str, task_id=None, resume: bool = False) -> dict:
     """
     Executes the compiled LangGraph application with a starting URL.
+
+    The run gets its own workspace directory (see tools/workspace.py), so
+    several quiz chains can execute concurrently without sharing files.
+    With `resume`, it continues from the run's last checkpoint, if any.
+    Returns the chain's per-question timing (see tools/time_budget.py).
     """
-    # Invoke the graph with the initial state: the user's message containing the URL.
-    app.invoke({
-        "messages": [{"role": "user", "content": url}]},
-        # Set a high recursion limit for multi-step, complex problems.
-        config={"recursion_limit": 200}, 
-    )
+    run_id = str(task_id) if task_id is not None else uuid.uuid4().hex
+    inputs, saved, clock = _start(run_id, url, resume)
+    with task_workspace(run_id, resume=resume), compaction_scope() as compactor, \
+            trace_scope(run_id) as trace, tool_concurrency_scope(), time_budget_scope(url, clock) as budget:
+        recorder = SubmissionRecorder(CHECKPOINTS, run_id, lambda: {"budget": budget.snapshot()})
+        # Run the graph step by step from the initial state, checkpointing
+        # the message history and the clock after each step.
+        for state in get_app().stream(inputs, config=_run_config(run_id, trace, recorder), stream_mode="values"):
+            saved = CHECKPOINTS.save(run_id, state["messages"], saved, recorder.state())
+            recorder.submissions.clear()
+    CHECKPOINTS.delete(run_id)
+    report_compaction(compactor)
     # This print statement assumes the END state was reached successfully.
     print("Tasks completed succesfully")
+    # Per-question timing, stored as the task's result.
+    return budget.summary()
+
+
+async def run_agent_async(url: str, task_id=None, resume: bool = False) -> dict:
+    """
+    Async counterpart of `run_agent`, driven by the graph's `astream`.
+
+    Runs directly on the caller's event loop: LLM calls, page renders,
+    downloads, submissions and code execution are all awaited, so one
+    process can multiplex many concurrent quiz chains without holding an
+    OS thread per chain.
+    """
+    run_id = str(task_id) if task_id is not None else uuid.uuid4().hex
+    # Checkpoint reads and writes are SQLite calls; they run in threads so
+    # other chains and the event streams keep going meanwhile.
+    inputs, saved, clock = await asyncio.to_thread(_start, run_id, url, resume)
+    with task_workspace(run_id, resume=resume), compaction_scope() as compactor, \
+            trace_scope(run_id) as trace, tool_concurrency_scope(), time_budget_scope(url, clock) as budget:
+        recorder = SubmissionRecorder(CHECKPOINTS, run_id, lambda: {"budget": budget.snapshot()})
+        async for state in get_app().astream(inputs, config=_run_config(run_id, trace, recorder), stream_mode="values"):
+            saved = await asyncio.to_thread(CHECKPOINTS.save, run_id, state["messages"], saved, recorder.state())
+            recorder.submissions.clear()
+    await asyncio.to_thread(CHECKPOINTS.delete, run_id)
+    report_compaction(compactor)
+    print("Tasks completed succesfully")
+    return budget.summary()
@@ -0,0 +1,12 @@
+"""
+Offline end-to-end benchmark for the quiz agent.
+
+- quiz_server: a local stand-in for the quiz site (JS-rendered pages,
+  downloadable CSV files and a submit endpoint that hands out next URLs).
+- fake_llm: a scripted chat model that solves those quizzes, selected in
+  agent.py with LLM_PROVIDER=fake.
+- driver: starts both servers, fires concurrent /quiz submissions at
+  main.py and reports step latency, throughput, per-tool time and peak RSS.
+
+Run with `python -m benchmark.driver --help`; no network or API keys needed.
+"""
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+EMAIL = "bench@example.com"
+
+
+# -------------------------------------------------
+# Process helpers
+# -------------------------------------------------
+def _children(pid: int) -> list:
+    """All descendant pids of `pid` (Linux /proc)."""
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces; ppid follows its closing paren.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(name))
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def tree_rss_mb(pid: int) -> float:
+    """Resident memory of `pid` and all its descendants (browser, code workers)."""
+    total_kb = 0
+    for p in [pid] + _children(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return total_kb / 1024
+
+
+def spawn(args, env, log_path):
+    """Start `args` in the repository root with stdout and stderr written to `log_path`."""
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_healthy(client: httpx.AsyncClient, url: str, proc, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode} during startup")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise TimeoutError(f"{url} did not become healthy within {timeout} seconds")
+
+
+# -------------------------------------------------
+# Statistics
+# -------------------------------------------------
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def step_latencies(trace: dict) -> list:
+    """Seconds between consecutive answer submissions (the first from the run start)."""
+    ends = sorted(
+        s["start"] + s["duration"]
+        for s in trace["spans"]
+        if s["kind"] == "tool" and s["name"] == "post_request"
+    )
+    return [b - a for a, b in zip([0.0] + ends, ends)]
+
+
+def span_totals(traces) -> dict:
+    totals = {}
+    for trace in traces:
+        for s in trace["spans"]:
+            key = f"{s['kind']}:{s['name']}"
+            entry = totals.setdefault(key, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += s["duration"]
+    for entry in totals.values():
+        entry["avg_seconds"] = entry["seconds"] / entry["count"]
+    return dict(sorted(totals.items(), key=lambda item: -item[1]["seconds"]))
+
+
+# -------------------------------------------------
+# Benchmark run
+# -------------------------------------------------
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="quiz-bench-")
+    env = dict(
+        os.environ,
+        SECRET=SECRET,
+        EMAIL=EMAIL,
+        LLM_PROVIDER="fake",
+        FAKE_LLM_LATENCY=str(args.llm_latency),
+        LLM_CACHE_MODE="off",
+        LLM_RATE_LIMIT_BACKEND="memory",
+        LLM_REQUESTS_PER_MINUTE="1000000",
+        LLM_MAX_BURST="1000000",
+        TASK_STORE="memory",
+        WORKSPACE_ROOT=os.path.join(workdir, "files"),
+        DOWNLOAD_CACHE_DIR=os.path.join(workdir, "files", ".cache"),
+        SCHEDULER_WORKERS=str(args.concurrency),
+        SCHEDULER_MAX_QUEUE=str(max(args.tasks, 1)),
+        BENCH_STEPS=str(args.steps),
+        BENCH_ROWS=str(args.rows),
+    )
+    quiz = spawn(
+        [sys.executable, "-m", "benchmark.quiz_server", "--port", str(args.quiz_port)],
+        env, os.path.join(workdir, "quiz_server.log"),
+    )
+    server = spawn(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.server_port), "--log-level", "warning"],
+        env, os.path.join(workdir, "server.log"),
+    )
+    quiz_base = f"http://127.0.0.1:{args.quiz_port}"
+    server_base = f"http://127.0.0.1:{args.server_port}"
+    peak_rss = 0.0
+    sampling = True
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, tree_rss_mb(server.pid))
+            await asyncio.sleep(0.25)
+
+    try:
+        async with httpx.AsyncClient(timeout=30) as client:
+            await _wait_healthy(client, f"{quiz_base}/healthz", quiz)
+            await _wait_healthy(client, f"{server_base}/healthz", server)
+            baseline_rss = tree_rss_mb(server.pid)
+            sampler = asyncio.create_task(sample_rss())
+
+            started = time.monotonic()
+            responses = await asyncio.gather(*[
+                client.post(f"{server_base}/quiz", json={"url": f"{quiz_base}/quiz/chain{i}/1", "secret": SECRET})
+                for i in range(args.tasks)
+            ])
+            task_ids = [r.json()["task_id"] for r in responses if r.status_code == 200]
+
+            statuses = {}
+            deadline = time.monotonic() + args.timeout
+            while len(statuses) < len(task_ids) and time.monotonic() < deadline:
+                for task_id in task_ids:
+                    if task_id in statuses:
+                        continue
+                    task = (await client.get(f"{server_base}/tasks/{task_id}", params={"fields": "status"})).json()
+                    if task["status"] not in ("queued", "running"):
+                        statuses[task_id] = task["status"]
+                await asyncio.sleep(0.25)
+            wall = time.monotonic() - started
+
+            sampling = False
+            await sampler
+            traces = []
+            for task_id in task_ids:
+                r = await client.get(f"{server_base}/tasks/{task_id}/trace")
+                if r.status_code == 200:
+                    traces.append(r.json())
+            pools = (await client.get(f"{server_base}/stats")).json()
+    finally:
+        sampling = False
+        for proc in (server, quiz):
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    steps = [latency for trace in traces for latency in step_latencies(trace)]
+    completed = sum(1 for s in statuses.values() if s == "completed")
+    return {
+        "tasks": args.tasks,
+        "accepted": len(task_ids),
+        "completed": completed,
+        "unfinished_or_failed": len(task_ids) - completed,
+        "steps_per_task": args.steps,
+        "steps_submitted": len(steps),
+        "wall_seconds": round(wall, 3),
+        "tasks_per_minute": round(completed / wall * 60, 2) if wall else 0.0,
+        "step_latency_p50": round(percentile(steps, 50), 3),
+        "step_latency_p95": round(percentile(steps, 95), 3),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "spans": span_totals(traces),
+        "scheduler": pools.get("scheduler"),
+        "logs": workdir,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the quiz agent")
+    parser.add_argument("--tasks", type=int, default=8, help="concurrent /quiz submissions")
+    parser.add_argument("--steps", type=int, default=3, help="questions per quiz chain")
+    parser.add_argument("--rows", type=int, default=2000, help="rows in each quiz CSV")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds per call")
+    parser.add_argument("--concurrency", type=int, default=8, help="SCHEDULER_WORKERS of the server")
+    parser.add_argument("--quiz-port", type=int, default=8765)
+    parser.add_argument("--server-port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for all tasks")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Tasks:            {report['completed']}/{report['tasks']} completed in {report['wall_seconds']}s")
+    print(f"Throughput:       {report['tasks_per_minute']} tasks/minute")
+    print(f"Step latency:     p50 {report['step_latency_p50']}s, p95 {report['step_latency_p95']}s "
+          f"over {report['steps_submitted']} steps")
+    print(f"Peak RSS:         {report['peak_rss_mb']} MB (idle {report['baseline_rss_mb']} MB)")
+    print("Time per span:")
+    for key, entry in report["spans"].items():
+        print(f"  {key:<32} {entry['count']:>6} calls  {entry['seconds']:>9.2f}s total  {entry['avg_seconds']:.3f}s avg")
+    print(f"Server logs:      {report['logs']}")
+
+
+if __name__ == "__main__":
+    main()
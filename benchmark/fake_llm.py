@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Simulated model "thinking" time per call (overridable through the environment)
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+
+_CSV_URL = re.compile(r"https?://[^\s\"'<>]+?\.csv")
+_SUBMIT_URL = re.compile(r"answer to (https?://\S+?/submit)")
+_URL_FIELD = re.compile(r'"url":\s*"([^"]+)"')
+_FIRST_URL = re.compile(r"https?://\S+")
+
+SOLVE_CODE = """import csv
+with open({filename!r}) as f:
+    print(sum(int(row["value"]) for row in csv.DictReader(f)))
+"""
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        return "".join(p if isinstance(p, str) else str(p.get("text", "")) for p in content)
+    return str(content)
+
+
+def _last_call(messages, name: str):
+    """Arguments of the most recent tool call to `name`, or None."""
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls or []:
+                if call["name"] == name:
+                    return call["args"]
+    return None
+
+
+def _last_output(messages, name: str) -> str:
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage) and message.name == name:
+            return _text(message)
+    return ""
+
+
+class ScriptedQuizModel(BaseChatModel):
+    """
+    A deterministic stand-in for Gemini that solves benchmark/quiz_server.py
+    quizzes through the real tools: render the page, download its CSV, sum
+    the "value" column with run_code, submit, and follow the next URL until
+    the chain ends. Each call sleeps `latency` seconds to mimic model time
+    and reports an estimated token usage.
+    """
+
+    latency: float = FAKE_LLM_LATENCY
+    email: str = ""
+    secret: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-quiz"
+
+    def bind_tools(self, tools, **kwargs):
+        # The script already knows the tool names; nothing to bind.
+        return self
+
+    def _call(self, name: str, **args) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": uuid.uuid4().hex}])
+
+    def _next(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        if not isinstance(last, ToolMessage):
+            # The task URL, or the compacted header whose last summary holds the next URL.
+            text = _text(last)
+            urls = _URL_FIELD.findall(text)
+            url = urls[-1] if urls else _FIRST_URL.search(text).group(0)
+            return self._call("get_rendered_html", url=url)
+
+        output = _text(last)
+        if last.name == "get_rendered_html":
+            csv_url = _CSV_URL.search(output).group(0)
+            return self._call("download_file", url=csv_url, filename=csv_url.rsplit("/", 1)[-1])
+        if last.name == "download_file":
+            filename = _last_call(messages, "download_file")["filename"]
+            return self._call("run_code", code=SOLVE_CODE.format(filename=filename))
+        if last.name == "run_code":
+            answer = int(json.loads(output)["stdout"].strip())
+            page = _last_output(messages, "get_rendered_html")
+            return self._call(
+                "post_request",
+                url=_SUBMIT_URL.search(page).group(1),
+                payload={
+                    "email": self.email,
+                    "secret": self.secret,
+                    "url": _last_call(messages, "get_rendered_html")["url"],
+                    "answer": answer,
+                },
+            )
+        if last.name == "post_request":
+            urls = _URL_FIELD.findall(output)
+            if urls:
+                return self._call("get_rendered_html", url=urls[-1])
+        return AIMessage(content="END")
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        message = self._next(messages)
+        input_tokens = sum(len(_text(m)) for m in messages) // 4
+        output_tokens = len(json.dumps(message.tool_calls)) // 4 + 1
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import base64
+import html
+import os
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+import uvicorn
+
+# Quiz shape (overridable through the environment / command line)
+BENCH_STEPS = int(os.getenv("BENCH_STEPS", "3"))
+BENCH_ROWS = int(os.getenv("BENCH_ROWS", "2000"))
+BENCH_DELAY = float(os.getenv("BENCH_DELAY", "0"))
+SECRET = os.getenv("SECRET", "bench-secret")
+
+app = FastAPI(title="Benchmark quiz server")
+
+
+def _value(row: int, step: int) -> int:
+    return (row * 7 + step * 13) % 100
+
+
+def expected_answer(step: int, rows: int = None) -> int:
+    """The correct answer of `step`: the sum of the 'value' column of its CSV."""
+    rows = BENCH_ROWS if rows is None else rows
+    return sum(_value(i, step) for i in range(rows))
+
+
+def _base(request: Request) -> str:
+    return str(request.base_url).rstrip("/")
+
+
+@app.get("/healthz")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/quiz/{chain}/{step}", response_class=HTMLResponse)
+def quiz_page(chain: str, step: int, request: Request):
+    """
+    A quiz page whose instructions only exist after JavaScript runs: they are
+    base64-encoded and injected with atob(), like the real quiz pages.
+    """
+    base = _base(request)
+    instructions = (
+        f"<h1>Question {step} of {BENCH_STEPS}</h1>"
+        f'<p>Download <a href="/files/{html.escape(chain)}/{step}.csv">the data file</a> '
+        f'and compute the sum of the "value" column.</p>'
+        f"<p>Post your answer to {base}/submit as JSON with email, secret, url and answer.</p>"
+    )
+    encoded = base64.b64encode(instructions.encode()).decode()
+    return f"""
+    <html>
+      <head><title>Quiz {step}</title><style>body {{ font-family: sans-serif; }}</style></head>
+      <body>
+        <div id="question"></div>
+        <script>document.getElementById("question").innerHTML = atob("{encoded}");</script>
+      </body>
+    </html>
+    """
+
+
+@app.get("/files/{chain}/{step}.csv", response_class=PlainTextResponse)
+def data_file(chain: str, step: int):
+    lines = ["id,value"] + [f"{i},{_value(i, step)}" for i in range(BENCH_ROWS)]
+    return "\n".join(lines) + "\n"
+
+
+@app.post("/submit")
+async def submit(request: Request):
+    data = await request.json()
+    if data.get("secret") != SECRET:
+        return JSONResponse(status_code=403, content={"correct": False, "reason": "Invalid secret"})
+    url = str(data.get("url", ""))
+    try:
+        prefix, chain, step = url.rstrip("/").rsplit("/", 2)
+        step = int(step)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"correct": False, "reason": f"Unknown quiz url: {url}"})
+
+    if BENCH_DELAY:
+        await asyncio.sleep(BENCH_DELAY)
+    correct = data.get("answer") == expected_answer(step)
+    next_url = f"{prefix}/{chain}/{step + 1}" if correct and step < BENCH_STEPS else None
+    return {
+        "correct": correct,
+        "url": next_url,
+        "delay": 0,
+        "reason": None if correct else "Wrong answer",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local quiz server for the benchmark")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from .driver import REPO_ROOT, SECRET, EMAIL, spawn, percentile
+
+# Measures a cold start of the server: how long `import main` takes, and
+# how long after spawning uvicorn /healthz (liveness) and /readyz (warm-up
+# done) first answer 200. Each run is a fresh process.
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def _env(workdir: str, provider: str) -> dict:
+    return dict(
+        os.environ,
+        SECRET=SECRET,
+        EMAIL=EMAIL,
+        LLM_PROVIDER=provider,
+        LLM_CACHE_MODE="off",
+        LLM_RATE_LIMIT_BACKEND="memory",
+        TASK_STORE="memory",
+        CHECKPOINT_STORE="memory",
+        WORKSPACE_ROOT=os.path.join(workdir, "files"),
+        DOWNLOAD_CACHE_DIR=os.path.join(workdir, "files", ".cache"),
+    )
+
+
+def import_times(env: dict, top: int) -> tuple:
+    """Seconds `import main` takes, and the `top` slowest modules by cumulative import time."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # Nested imports are indented below (and included in) their parents.
+        name = parts[2][1:].rstrip()
+        if not name.startswith(" "):
+            modules.append((name, int(parts[1]) / 1e6))
+    slowest = sorted(modules, key=lambda m: -m[1])
+    return float(proc.stdout.strip().splitlines()[-1]), [
+        {"module": name, "seconds": round(seconds, 3)} for name, seconds in slowest[:top]
+    ]
+
+
+async def serve_times(env: dict, port: int, log_path: str, timeout: float) -> dict:
+    """Seconds from spawning uvicorn until /healthz, then /readyz, first answer 200."""
+    started = time.monotonic()
+    server = spawn(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env, log_path,
+    )
+    base = f"http://127.0.0.1:{port}"
+    result = {"healthz_seconds": None, "readyz_seconds": None, "warm_up": None}
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            while time.monotonic() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}, see {log_path}")
+                try:
+                    if result["healthz_seconds"] is None:
+                        if (await client.get(f"{base}/healthz")).status_code == 200:
+                            result["healthz_seconds"] = round(time.monotonic() - started, 3)
+                    else:
+                        resp = await client.get(f"{base}/readyz")
+                        result["warm_up"] = resp.json()["steps"]
+                        if resp.status_code == 200:
+                            result["readyz_seconds"] = round(time.monotonic() - started, 3)
+                            break
+                        if any(s["state"] == "failed" for s in result["warm_up"].values()):
+                            break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.02)
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return result
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="startup-bench-")
+    env = _env(workdir, args.provider)
+    imports, slowest, healthz, readyz, warm_up = [], [], [], [], None
+    for i in range(args.runs):
+        seconds, slowest = import_times(env, args.top)
+        imports.append(seconds)
+        served = await serve_times(env, args.port, os.path.join(workdir, f"server-{i}.log"), args.timeout)
+        if served["healthz_seconds"] is not None:
+            healthz.append(served["healthz_seconds"])
+        if served["readyz_seconds"] is not None:
+            readyz.append(served["readyz_seconds"])
+        warm_up = served["warm_up"]
+    return {
+        "runs": args.runs,
+        "provider": args.provider,
+        "import_seconds_p50": round(percentile(imports, 50), 3),
+        "import_seconds_max": round(max(imports), 3),
+        "healthz_seconds_p50": round(percentile(healthz, 50), 3) if healthz else None,
+        "healthz_seconds_max": round(max(healthz), 3) if healthz else None,
+        "readyz_seconds_p50": round(percentile(readyz, 50), 3) if readyz else None,
+        "readyz_seconds_max": round(max(readyz), 3) if readyz else None,
+        "warm_up": warm_up,
+        "slowest_imports": slowest,
+        "logs": workdir,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark: import time and time to /healthz and /readyz")
+    parser.add_argument("--runs", type=int, default=5, help="fresh server processes to start")
+    parser.add_argument("--provider", default="fake", help="LLM_PROVIDER of the server (e.g. google_genai)")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for readiness per run")
+    parser.add_argument("--max-healthz-seconds", type=float, default=None,
+                        help="exit with status 1 when the p50 time to /healthz exceeds this (regression gate)")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import main:      p50 {report['import_seconds_p50']}s, max {report['import_seconds_max']}s "
+              f"over {report['runs']} runs")
+        print(f"First /healthz:   p50 {report['healthz_seconds_p50']}s, max {report['healthz_seconds_max']}s")
+        print(f"First /readyz:    p50 {report['readyz_seconds_p50']}s, max {report['readyz_seconds_max']}s")
+        for name, step in (report["warm_up"] or {}).items():
+            detail = f" ({step['error']})" if step["error"] else ""
+            print(f"  warm-up {name:<10} {step['state']:<8} {step['seconds']}s{detail}")
+        print("Slowest imports:")
+        for entry in report["slowest_imports"]:
+            print(f"  {entry['module']:<40} {entry['seconds']:.3f}s")
+        print(f"Server logs:      {report['logs']}")
+
+    limit = args.max_healthz_seconds
+    if limit is not None and (report["healthz_seconds_p50"] is None or report["healthz_seconds_p50"] > limit):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+# Agent run checkpoints (overridable through the environment / .env file):
+# "sqlite" (default, survives restarts), "memory" or "off".
+CHECKPOINT_STORE = os.getenv("CHECKPOINT_STORE", "sqlite")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join("LLMFiles", "checkpoints.sqlite3"))
+# Checkpoints of runs that never finished are dropped after this long.
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+
+class CheckpointStore(ABC):
+    """
+    Message history of unfinished agent runs, keyed by run id (the task id).
+
+    The graph state is just the message list, so a checkpoint is that list,
+    appended to after every completed graph step. A run that crashed or was
+    cut off by a restart resumes from its last checkpoint instead of from
+    the first URL. Finished runs drop their checkpoint.
+
+    Next to the messages a checkpoint keeps a small JSON-able `state` dict
+    of the run (its time budget, submissions completed since the last
+    step), replaced as a whole on every write.
+    """
+
+    @abstractmethod
+    def save(self, run_id: str, messages: list, saved: int = 0, state: dict = None) -> int:
+        """
+        Persist `messages[saved:]` (the messages added since the last save)
+        and `state`, and return the new number of saved messages.
+        """
+
+    @abstractmethod
+    def save_state(self, run_id: str, state: dict):
+        """Replace the run state of an existing checkpoint, leaving its messages alone."""
+
+    @abstractmethod
+    def load(self, run_id: str):
+        """Return the saved messages of `run_id`, or None without a checkpoint."""
+
+    @abstractmethod
+    def load_state(self, run_id: str) -> dict:
+        """Return the saved run state of `run_id` ({} without one)."""
+
+    @abstractmethod
+    def delete(self, run_id: str):
+        ...
+
+    @abstractmethod
+    def gc(self, max_age_seconds: float = CHECKPOINT_MAX_AGE_SECONDS) -> int:
+        """Drop checkpoints not written to for `max_age_seconds`; returns how many."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class NullCheckpointStore(CheckpointStore):
+    """CHECKPOINT_STORE=off: nothing is saved, every run starts over."""
+
+    def save(self, run_id, messages, saved=0, state=None):
+        return len(messages)
+
+    def save_state(self, run_id, state):
+        pass
+
+    def load(self, run_id):
+        return None
+
+    def load_state(self, run_id):
+        return {}
+
+    def delete(self, run_id):
+        pass
+
+    def gc(self, max_age_seconds=CHECKPOINT_MAX_AGE_SECONDS):
+        return 0
+
+    def stats(self):
+        return {"backend": "off", "runs": 0}
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """Dict-backed store; protects against crashed runs, not restarts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+
+    def save(self, run_id, messages, saved=0, state=None):
+        with self._lock:
+            history, _, _ = self._runs.get(str(run_id), ([], 0, {}))
+            self._runs[str(run_id)] = (history[:saved] + list(messages[saved:]), time.time(), dict(state or {}))
+        return len(messages)
+
+    def save_state(self, run_id, state):
+        with self._lock:
+            entry = self._runs.get(str(run_id))
+            if entry is not None:
+                self._runs[str(run_id)] = (entry[0], time.time(), dict(state))
+
+    def load(self, run_id):
+        with self._lock:
+            entry = self._runs.get(str(run_id))
+        return None if entry is None else list(entry[0])
+
+    def load_state(self, run_id):
+        with self._lock:
+            entry = self._runs.get(str(run_id))
+        return {} if entry is None else dict(entry[2])
+
+    def delete(self, run_id):
+        with self._lock:
+            self._runs.pop(str(run_id), None)
+
+    def gc(self, max_age_seconds=CHECKPOINT_MAX_AGE_SECONDS):
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            stale = [run_id for run_id, (_, updated, _) in self._runs.items() if updated < cutoff]
+            for run_id in stale:
+                del self._runs[run_id]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "runs": len(self._runs)}
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Persistent store in a single SQLite file (WAL mode, one connection per
+    thread). Each message is one row, so a save only writes the messages
+    the last step added.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        with db:
+            db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    run_id TEXT PRIMARY KEY,
+                    messages INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    state TEXT
+                );
+                CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+                CREATE TABLE IF NOT EXISTS checkpoint_messages (
+                    run_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (run_id, seq)
+                );
+                """
+            )
+            # Checkpoint files written before run states were kept.
+            columns = [row[1] for row in db.execute("PRAGMA table_info(checkpoints)")]
+            if "state" not in columns:
+                db.execute("ALTER TABLE checkpoints ADD COLUMN state TEXT")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def save(self, run_id, messages, saved=0, state=None):
+        run_id = str(run_id)
+        rows = [
+            (run_id, seq, json.dumps(messages_to_dict([message])[0], default=str))
+            for seq, message in enumerate(messages[saved:], start=saved)
+        ]
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM checkpoint_messages WHERE run_id = ? AND seq >= ?", (run_id, saved))
+            db.executemany("INSERT INTO checkpoint_messages (run_id, seq, message) VALUES (?, ?, ?)", rows)
+            db.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, messages, updated_at, state) VALUES (?, ?, ?, ?)",
+                (run_id, len(messages), time.time(), json.dumps(state or {}, default=str)),
+            )
+        return len(messages)
+
+    def save_state(self, run_id, state):
+        db = self._db()
+        with db:
+            db.execute(
+                "UPDATE checkpoints SET state = ?, updated_at = ? WHERE run_id = ?",
+                (json.dumps(state, default=str), time.time(), str(run_id)),
+            )
+
+    def load(self, run_id):
+        db = self._db()
+        head = db.execute("SELECT messages FROM checkpoints WHERE run_id = ?", (str(run_id),)).fetchone()
+        if head is None:
+            return None
+        rows = db.execute(
+            "SELECT message FROM checkpoint_messages WHERE run_id = ? AND seq < ? ORDER BY seq",
+            (str(run_id), head[0]),
+        ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def load_state(self, run_id):
+        row = self._db().execute("SELECT state FROM checkpoints WHERE run_id = ?", (str(run_id),)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] else {}
+
+    def delete(self, run_id):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM checkpoint_messages WHERE run_id = ?", (str(run_id),))
+            db.execute("DELETE FROM checkpoints WHERE run_id = ?", (str(run_id),))
+
+    def gc(self, max_age_seconds=CHECKPOINT_MAX_AGE_SECONDS):
+        cutoff = time.time() - max_age_seconds
+        db = self._db()
+        with db:
+            stale = [r[0] for r in db.execute("SELECT run_id FROM checkpoints WHERE updated_at < ?", (cutoff,))]
+            for run_id in stale:
+                db.execute("DELETE FROM checkpoint_messages WHERE run_id = ?", (run_id,))
+                db.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+        return len(stale)
+
+    def stats(self):
+        runs = self._db().execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"backend": "sqlite", "runs": runs}
+
+
+class SubmissionRecorder(BaseCallbackHandler):
+    """
+    Writes every completed submission (post_request result) into the run's
+    checkpoint as soon as it returns, together with the run state from
+    `state()`. The messages are only saved after the whole tools step, so
+    without this a run interrupted in between would submit again on resume.
+    """
+
+    run_inline = True
+
+    def __init__(self, store: CheckpointStore, run_id: str, state):
+        self.store = store
+        self.run_id = str(run_id)
+        self.state = state
+        self.submissions = {}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        tool_call_id = getattr(output, "tool_call_id", None)
+        if tool_call_id is None or (getattr(output, "name", None) or kwargs.get("name")) != "post_request":
+            return
+        self.submissions[tool_call_id] = output.content
+        self.store.save_state(self.run_id, {**self.state(), "submissions": dict(self.submissions)})
+
+
+def create_checkpoint_store(kind: str = CHECKPOINT_STORE) -> CheckpointStore:
+    """Build the checkpoint store selected by CHECKPOINT_STORE ("sqlite", "memory" or "off")."""
+    if kind == "off":
+        return NullCheckpointStore()
+    if kind == "memory":
+        return MemoryCheckpointStore()
+    if kind == "sqlite":
+        return SQLiteCheckpointStore()
+    raise ValueError(f"Unknown CHECKPOINT_STORE backend: {kind}")
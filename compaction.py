@@ -0,0 +1,238 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from tools.workspace import current_workspace
+
+# Compaction knobs (overridable through the environment / .env file)
+# Upper bound on the estimated prompt tokens of the history sent per LLM call.
+COMPACT_TOKEN_BUDGET = int(os.getenv("COMPACT_TOKEN_BUDGET", "32000"))
+# Tool outputs longer than this are truncated in the prompt and spilled to disk.
+COMPACT_TOOL_OUTPUT_CHARS = int(os.getenv("COMPACT_TOOL_OUTPUT_CHARS", "6000"))
+# Truncation is tightened down to this size when the budget is still exceeded.
+COMPACT_MIN_TOOL_OUTPUT_CHARS = int(os.getenv("COMPACT_MIN_TOOL_OUTPUT_CHARS", "400"))
+# Set COMPACT_COLLAPSE_STEPS=0 to keep finished quiz steps verbatim.
+COMPACT_COLLAPSE_STEPS = os.getenv("COMPACT_COLLAPSE_STEPS", "1") == "1"
+
+# Directory (inside the run workspace) holding spilled tool outputs.
+SPILL_DIR = "spill"
+# Rough characters-per-token ratio used for budget estimates.
+CHARS_PER_TOKEN = 4
+
+
+def _text(content) -> str:
+    """Flatten message content (a string or a list of parts) to text."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+    return str(content)
+
+
+def estimate_tokens(messages) -> int:
+    """Cheap token estimate of a message list (content plus tool call arguments)."""
+    chars = 0
+    for message in messages:
+        chars += len(_text(message.content))
+        for call in getattr(message, "tool_calls", None) or []:
+            chars += len(json.dumps(call.get("args", {}), default=str))
+    return chars // CHARS_PER_TOKEN
+
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class Compactor:
+    """
+    Builds the bounded view of a run's history that is sent to the LLM.
+
+    The graph state keeps the full history; `compact` never mutates it. Per
+    call it (1) collapses quiz steps whose answer was accepted (the
+    submission response carries the next URL) into one-line summaries folded
+    into the first user message, (2) truncates large tool outputs, spilling
+    the full text into the run workspace under `spill/` so the agent can
+    read it back with run_code, and (3) tightens the truncation until the
+    estimated size fits `token_budget`.
+    """
+
+    def __init__(self, token_budget: int = COMPACT_TOKEN_BUDGET,
+                 tool_output_chars: int = COMPACT_TOOL_OUTPUT_CHARS,
+                 collapse_steps: bool = COMPACT_COLLAPSE_STEPS):
+        self.token_budget = token_budget
+        self.tool_output_chars = tool_output_chars
+        self.collapse_steps = collapse_steps
+        self._spilled = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "tokens_raw": 0,
+            "tokens_sent": 0,
+            "tokens_saved": 0,
+            "steps_collapsed": 0,
+            "outputs_spilled": 0,
+            "over_budget_calls": 0,
+        }
+
+    # -------------------------------------------------
+    # Collapsing finished quiz steps
+    # -------------------------------------------------
+    def _step_boundaries(self, messages) -> list:
+        """Indexes just past each tool batch whose post_request moved to a new URL."""
+        boundaries = []
+        for i, message in enumerate(messages):
+            if not (isinstance(message, ToolMessage) and message.name == "post_request"):
+                continue
+            if '"url"' not in _text(message.content):
+                # Wrong answer (or an error): the step is still in progress.
+                continue
+            end = i + 1
+            while end < len(messages) and isinstance(messages[end], ToolMessage):
+                end += 1
+            if not boundaries or boundaries[-1] != end:
+                boundaries.append(end)
+        return boundaries
+
+    def _summarize_step(self, number: int, messages) -> str:
+        actions = []
+        for message in messages:
+            if isinstance(message, AIMessage):
+                for call in message.tool_calls or []:
+                    args = call.get("args", {})
+                    if call["name"] == "get_rendered_html":
+                        actions.append(f"visited {args.get('url')}")
+                    elif call["name"] == "download_file":
+                        actions.append(f"downloaded {args.get('filename')}")
+                    elif call["name"] == "post_request":
+                        answer = _shorten(json.dumps(args.get("payload", {}).get("answer"), default=str), 200)
+                        actions.append(f"submitted answer {answer} to {args.get('url')}")
+            elif isinstance(message, ToolMessage) and message.name == "post_request":
+                actions.append(f"response {_shorten(_text(message.content), 300)}")
+        return f"Step {number}: " + "; ".join(actions)
+
+    def _collapse(self, messages) -> list:
+        boundaries = self._step_boundaries(messages)
+        if not boundaries or len(messages) < 2:
+            return messages
+        cut = boundaries[-1]
+        starts = [1] + boundaries[:-1]
+        summaries = [
+            self._summarize_step(n + 1, messages[start:end])
+            for n, (start, end) in enumerate(zip(starts, boundaries))
+        ]
+        first = messages[0]
+        header = HumanMessage(
+            content=_text(first.content) + "\n\nCompleted quiz steps (history compacted):\n" + "\n".join(summaries),
+            id=first.id,
+        )
+        with self._lock:
+            self._stats["steps_collapsed"] = max(self._stats["steps_collapsed"], len(boundaries))
+        return [header] + messages[cut:]
+
+    # -------------------------------------------------
+    # Truncating and spilling tool outputs
+    # -------------------------------------------------
+    def _spill(self, message: ToolMessage, text: str) -> str:
+        """Write the full output into the workspace once; return its relative path."""
+        key = message.tool_call_id
+        with self._lock:
+            handle = self._spilled.get(key)
+        if handle is None:
+            handle = os.path.join(SPILL_DIR, f"{message.name or 'tool'}_{len(self._spilled) + 1}.txt")
+            path = current_workspace().resolve(handle)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            with self._lock:
+                self._spilled[key] = handle
+                self._stats["outputs_spilled"] += 1
+        return handle
+
+    def _truncate(self, message, limit: int):
+        if not isinstance(message, ToolMessage):
+            return message
+        text = _text(message.content)
+        if len(text) <= limit:
+            return message
+        handle = self._spill(message, text)
+        head = text[: limit * 3 // 4]
+        tail = text[-(limit // 4):]
+        note = (
+            f"\n...[{len(text) - len(head) - len(tail)} characters omitted; "
+            f"full output saved to '{handle}', read it with run_code]...\n"
+        )
+        return message.model_copy(update={"content": head + note + tail})
+
+    # -------------------------------------------------
+    # Public API
+    # -------------------------------------------------
+    def compact(self, messages) -> list:
+        """Return the compacted view of `messages` to send to the LLM."""
+        raw_tokens = estimate_tokens(messages)
+        history = self._collapse(list(messages)) if self.collapse_steps else list(messages)
+
+        limit = self.tool_output_chars
+        view = [self._truncate(m, limit) for m in history]
+        sent_tokens = estimate_tokens(view)
+        while sent_tokens > self.token_budget and limit > COMPACT_MIN_TOOL_OUTPUT_CHARS:
+            limit = max(COMPACT_MIN_TOOL_OUTPUT_CHARS, limit // 2)
+            view = [self._truncate(m, limit) for m in history]
+            sent_tokens = estimate_tokens(view)
+
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["tokens_raw"] += raw_tokens
+            self._stats["tokens_sent"] += sent_tokens
+            self._stats["tokens_saved"] += raw_tokens - sent_tokens
+            self._stats["over_budget_calls"] += 1 if sent_tokens > self.token_budget else 0
+        _record_totals(raw_tokens, sent_tokens)
+        return view
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# -------------------------------------------------
+# Per-run scoping and process-wide totals
+# -------------------------------------------------
+_CURRENT = contextvars.ContextVar("compactor", default=None)
+_totals_lock = threading.Lock()
+_totals = {"calls": 0, "tokens_raw": 0, "tokens_sent": 0, "tokens_saved": 0}
+
+
+def _record_totals(raw_tokens: int, sent_tokens: int):
+    with _totals_lock:
+        _totals["calls"] += 1
+        _totals["tokens_raw"] += raw_tokens
+        _totals["tokens_sent"] += sent_tokens
+        _totals["tokens_saved"] += raw_tokens - sent_tokens
+
+
+def current_compactor() -> Compactor:
+    """Return the compactor of the agent run executing in this context."""
+    compactor = _CURRENT.get()
+    if compactor is None:
+        # Outside a run (e.g. invoking the graph from a REPL): use a throwaway one.
+        compactor = Compactor()
+        _CURRENT.set(compactor)
+    return compactor
+
+
+@contextmanager
+def compaction_scope():
+    """Give the enclosed agent run its own Compactor (and spill bookkeeping)."""
+    compactor = Compactor()
+    token = _CURRENT.set(compactor)
+    try:
+        yield compactor
+    finally:
+        _CURRENT.reset(token)
+
+
+def compaction_stats() -> dict:
+    """Process-wide compaction totals, for the /stats endpoint."""
+    with _totals_lock:
+        return dict(_totals)
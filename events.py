@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Progress event knobs (overridable through the environment / .env file)
+# Events buffered per subscriber; a slow client loses the oldest ones first.
+EVENTS_SUBSCRIBER_BUFFER = int(os.getenv("EVENTS_SUBSCRIBER_BUFFER", "256"))
+# Recent events kept per task and replayed to new subscribers.
+EVENTS_BACKLOG = int(os.getenv("EVENTS_BACKLOG", "200"))
+# Tasks whose backlog is kept after they finished.
+EVENTS_KEEP_TASKS = int(os.getenv("EVENTS_KEEP_TASKS", "200"))
+# Tool inputs/outputs and LLM text are cut to this many characters.
+EVENTS_MAX_CHARS = int(os.getenv("EVENTS_MAX_CHARS", "1000"))
+# Idle streams send a keep-alive comment this often, so proxies keep them open.
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Argument keys whose values never leave the process (the quiz payload
+# carries the secret and email), plus the configured credential values
+# themselves, which are masked wherever they appear in published text.
+REDACTED_KEYS = {"secret", "email", "password", "token", "api_key", "apikey", "authorization"}
+REDACTED = "***"
+
+# Task statuses after which no more events follow.
+TERMINAL_STATUSES = ("completed", "failed", "expired", "rejected")
+
+
+def _redact(value):
+    """Copy of `value` with credential-like keys masked, at any depth."""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in REDACTED_KEYS else _redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(v) for v in value]
+    return value
+
+
+def _scrub(text: str) -> str:
+    """Mask the configured credentials wherever they appear in `text`."""
+    for name in ("SECRET", "EMAIL"):
+        credential = os.getenv(name)
+        if credential:
+            text = text.replace(credential, REDACTED)
+    return text
+
+
+def _clip(value) -> str:
+    text = getattr(value, "content", value)
+    text = text if isinstance(text, str) else json.dumps(_redact(text), default=str)
+    text = _scrub(text)
+    return text if len(text) <= EVENTS_MAX_CHARS else text[:EVENTS_MAX_CHARS] + "..."
+
+
+def _response(output):
+    """The quiz server's answer from a post_request result (a dict, or text as sent to the LLM)."""
+    content = getattr(output, "content", output)
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            pass
+    return _redact(content) if isinstance(content, dict) else _clip(content)
+
+
+class Subscription:
+    """
+    One client's view of a task's events: a bounded queue on the client's
+    event loop. Publishers on other threads hand events over with
+    call_soon_threadsafe; when the queue is full the oldest event is dropped.
+    """
+
+    def __init__(self, task_id: str, loop, size: int):
+        self.task_id = task_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max(1, size))
+        self.dropped = 0
+
+    def deliver(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: float):
+        """The next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    Fans task progress events out to any number of subscribers.
+
+    Events are dicts with a per-process increasing `id`, the `task_id`, a
+    `type` ("status", "agent", "tool_start", "tool_end", "submission") and
+    type-specific fields. Each task keeps a short backlog, so a client that
+    subscribes late (or reconnects with Last-Event-ID) catches up first.
+    """
+
+    def __init__(self, buffer: int = EVENTS_SUBSCRIBER_BUFFER, backlog: int = EVENTS_BACKLOG,
+                 keep_tasks: int = EVENTS_KEEP_TASKS):
+        self.buffer = buffer
+        self.backlog = backlog
+        self.keep_tasks = keep_tasks
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._backlogs = OrderedDict()
+        self._subscribers = {}
+        self._stats = {"published": 0, "delivered": 0, "subscribers": 0}
+
+    def publish(self, task_id, type: str, **fields) -> dict:
+        """Record an event of `task_id` and push it to its subscribers (callable from any thread)."""
+        task_id = str(task_id)
+        event = {"id": next(self._ids), "task_id": task_id, "type": type, "time": time.time(), **fields}
+        with self._lock:
+            backlog = self._backlogs.get(task_id)
+            if backlog is None:
+                backlog = self._backlogs[task_id] = deque(maxlen=self.backlog)
+            self._backlogs.move_to_end(task_id)
+            backlog.append(event)
+            while len(self._backlogs) > self.keep_tasks:
+                self._backlogs.popitem(last=False)
+            subscribers = list(self._subscribers.get(task_id, ()))
+            self._stats["published"] += 1
+            self._stats["delivered"] += len(subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is removed on unsubscribe.
+                pass
+        return event
+
+    def subscribe(self, task_id, last_event_id: int = None) -> Subscription:
+        """
+        Subscribe to `task_id` from a coroutine. The task's backlog (events
+        after `last_event_id`, if given) is queued first.
+        """
+        task_id = str(task_id)
+        sub = Subscription(task_id, asyncio.get_running_loop(), self.buffer)
+        with self._lock:
+            for event in self._backlogs.get(task_id, ()):
+                if last_event_id is None or event["id"] > last_event_id:
+                    sub.deliver(event)
+            self._subscribers.setdefault(task_id, set()).add(sub)
+            self._stats["subscribers"] += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.task_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.task_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["active_subscribers"] = sum(len(s) for s in self._subscribers.values())
+            snapshot["tasks_with_backlog"] = len(self._backlogs)
+        return snapshot
+
+
+EVENTS = EventBus()
+
+
+def format_sse(event: dict) -> str:
+    """Encode an event as one Server-Sent Events message (events without an id get no id line)."""
+    message = f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    return f"id: {event['id']}\n{message}" if event.get("id") else message
+
+
+class EventCallbackHandler(BaseCallbackHandler):
+    """
+    Publishes the progress of one agent run: every agent turn (the tool calls
+    it requested, or its text), tool starts and ends, and submission
+    responses. Passed in the graph config next to the trace handler.
+    """
+
+    run_inline = True
+
+    def __init__(self, task_id, bus: EventBus = EVENTS):
+        self.task_id = str(task_id)
+        self.bus = bus
+        self._tools = {}
+        self._turns = set()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        if kwargs.get("name") == "agent" and (metadata or {}).get("langgraph_node") == "agent":
+            self._turns.add(run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id not in self._turns:
+            return
+        self._turns.discard(run_id)
+        for message in (outputs.get("messages", []) if isinstance(outputs, dict) else []):
+            calls = getattr(message, "tool_calls", None) or []
+            self.bus.publish(
+                self.task_id, "agent",
+                tool_calls=[{"name": c["name"], "args": _clip(c.get("args", {}))} for c in calls],
+                text=_clip(message.content) if not calls else None,
+            )
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        if run_id in self._turns:
+            self._turns.discard(run_id)
+            self.bus.publish(self.task_id, "agent", error=str(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[run_id] = (name, time.monotonic())
+        # The structured inputs can be redacted by key; the string form only by value.
+        self.bus.publish(self.task_id, "tool_start", tool=name, input=_clip(inputs if inputs is not None else input_str or ""))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        name, started = self._tools.pop(run_id, ("tool", time.monotonic()))
+        seconds = round(time.monotonic() - started, 3)
+        self.bus.publish(self.task_id, "tool_end", tool=name, seconds=seconds, output=_clip(output))
+        if name == "post_request":
+            self.bus.publish(self.task_id, "submission", response=_response(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        name, started = self._tools.pop(run_id, ("tool", time.monotonic()))
+        seconds = round(time.monotonic() - started, 3)
+        self.bus.publish(self.task_id, "tool_end", tool=name, seconds=seconds, error=str(error))
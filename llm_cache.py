@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+# LLM response cache (overridable through the environment / .env file)
+# "off" (default): always call the model.
+# "record": serve cached responses, call the model on a miss and store the answer.
+# "replay": serve cached responses only; a miss raises LLMCacheMiss.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("LLMFiles", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+MODES = ("off", "record", "replay")
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+def _canonical_message(message) -> dict:
+    """
+    The parts of a message that determine the model's answer. Message and
+    tool call ids are random per run, so they are left out of the key.
+    """
+    return {
+        "type": message.type,
+        "content": message.content,
+        "name": getattr(message, "name", None),
+        "tool_calls": [
+            {"name": call["name"], "args": call.get("args", {})}
+            for call in getattr(message, "tool_calls", None) or []
+        ],
+    }
+
+
+def fingerprint(**parts) -> str:
+    """Stable hash of JSON-serializable parts (model, system prompt, tool schemas, ...)."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent record/replay cache of chat model responses.
+
+    Entries live in a SQLite file keyed by a SHA-256 of `namespace` (the
+    fingerprint of model, system prompt and bound tools) plus the canonical
+    message history. A hit returns the stored AIMessage without calling the
+    model, so it also skips the model's rate limiter. Entries expire after
+    `ttl_seconds`; beyond `max_entries` the least recently used are evicted.
+    """
+
+    def __init__(self, namespace: str, mode: str = LLM_CACHE_MODE, path: str = LLM_CACHE_PATH,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM_CACHE_MODE: {mode}")
+        self.namespace = namespace
+        self.mode = mode
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+        if mode != "off":
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            db = self._db()
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                db.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at);
+                    """
+                )
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, **counters):
+        with self._stats_lock:
+            for key, value in counters.items():
+                self._stats[key] += value
+
+    def key(self, messages) -> str:
+        return fingerprint(namespace=self.namespace, messages=[_canonical_message(m) for m in messages])
+
+    # -------------------------------------------------
+    # Lookup and storage
+    # -------------------------------------------------
+    def lookup(self, key: str):
+        """Return the cached response for `key`, or None."""
+        db = self._db()
+        row = db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        now = time.time()
+        if self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+            with db:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._count(misses=1, expired=1)
+            return None
+        with db:
+            db.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+        self._count(hits=1)
+        return messages_from_dict(json.loads(row[0]))[0]
+
+    def store(self, key: str, response):
+        # Drop the run-specific id so the replayed message gets a fresh one.
+        response = response.model_copy(update={"id": None})
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(messages_to_dict([response])), now, now),
+            )
+            excess = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if self.max_entries > 0 and excess > 0:
+                db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used_at ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count(evicted=excess)
+        self._count(stores=1)
+
+    def _cached(self, messages):
+        """Return (key, cached response or None); raises LLMCacheMiss in replay mode."""
+        key = self.key(messages)
+        cached = self.lookup(key)
+        if cached is None and self.mode == "replay":
+            raise LLMCacheMiss(f"No recorded LLM response for prompt {key[:12]}")
+        return key, cached
+
+    # -------------------------------------------------
+    # Public API
+    # -------------------------------------------------
+    def invoke(self, runnable, messages, **inputs):
+        """
+        `runnable.invoke({"messages": messages, **inputs})`, served from the
+        cache when possible. Extra `inputs` (the time budget note) change from
+        call to call and are not part of the key.
+        """
+        if self.mode == "off":
+            return runnable.invoke({"messages": messages, **inputs})
+        key, cached = self._cached(messages)
+        if cached is not None:
+            return cached
+        response = runnable.invoke({"messages": messages, **inputs})
+        self.store(key, response)
+        return response
+
+    async def ainvoke(self, runnable, messages, **inputs):
+        """Async counterpart of `invoke`; the SQLite lookup and store run in threads."""
+        if self.mode == "off":
+            return await runnable.ainvoke({"messages": messages, **inputs})
+        key, cached = await asyncio.to_thread(self._cached, messages)
+        if cached is not None:
+            return cached
+        response = await runnable.ainvoke({"messages": messages, **inputs})
+        await asyncio.to_thread(self.store, key, response)
+        return response
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["mode"] = self.mode
+        return snapshot
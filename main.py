@@ -1,11 +1,28 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-# Import the synchronous agent execution function
-from agent import run_agent 
+# Import the async agent execution function
+from agent import llm_cache, rate_limiter, CHECKPOINTS
+from tools.browser_pool import get_browser_pool
+from tools.download_cache import get_download_cache
+from tools.code_pool import get_code_pool
+from tools.provisioning import get_provisioner
+from tools.prefetch import get_prefetcher
+from tools.http_client import get_http_client
+from tools.workspace import sweep_stale_workspaces
+from scheduler import TaskScheduler, SchedulerFull
+from compaction import compaction_stats
+from tracing import METRICS, get_trace
+from events import EVENTS, EVENTS_KEEPALIVE_SECONDS, TERMINAL_STATUSES, format_sse
+from task_store import ALL_FIELDS
+from task_runner import STORE, aset_status, run_agent_with_logging, mark_expired
+from task_queue import create_task_queue, TASK_QUEUE_MAX_DEPTH, TASK_LEASE_SECONDS
+from warmup import WarmUp, create_warm_up
 import uvicorn
+import asyncio
+import json
 import os
 import time
 
@@ -18,10 +35,9 @@ load_dotenv()
 EMAIL = os.getenv("EMAIL")
 SECRET = os.getenv("SECRET")
 
-# In-memory log storage for simplicity. In production, this would be 
-# replaced by a persistent database (e.g., PostgreSQL, MongoDB, Redis).
-QUIZ_LOGS = []
-TASK_ID = 0 # Simple counter for unique task IDs
+# With TASK_QUEUE=sqlite this process only enqueues tasks; agent worker
+# processes (worker.py) claim and run them. None runs them in-process.
+QUEUE = create_task_queue()
 
 # App setup: Initialize the FastAPI application
 app = FastAPI(
@@ -43,6 +59,45 @@ app.add_middleware(
 # Record application start time for uptime tracking
 START_TIME = time.time()
 
+# Tasks a previous process left queued or running are resumed from their
+# last checkpoint on startup (RESUME_ON_STARTUP=0 marks them failed instead).
+# With a shared queue, expired leases take care of that instead. Of several
+# server processes on one store (uvicorn --workers), only the one that
+# claims the recovery touches them.
+RECOVER = QUEUE is None and STORE.claim_recovery()
+RESUME_ON_STARTUP = os.getenv("RESUME_ON_STARTUP", "1") == "1" and RECOVER
+
+# Remove workspaces and checkpoints left behind long ago by runs that never
+# finished (see tools/workspace.py and checkpoints.py).
+sweep_stale_workspaces()
+CHECKPOINTS.gc()
+if RECOVER and not RESUME_ON_STARTUP:
+    STORE.fail_unfinished("Interrupted by server restart", time.time())
+
+# Bounded scheduler that runs agent tasks on a fixed set of worker coroutines
+# (SCHEDULER_WORKERS) with a bounded queue (SCHEDULER_MAX_QUEUE). Its workers
+# live on the server's event loop, so they are started on startup. Idle
+# when a shared queue hands the tasks to worker processes.
+SCHEDULER = TaskScheduler()
+
+# The chat model, compiled graph, browser and code workers are built in the
+# background once the server is up (see warmup.py); /readyz reports when they
+# are. With a shared queue they are only needed in the worker processes.
+WARM_UP = create_warm_up() if QUEUE is None else WarmUp()
+
+@app.on_event("startup")
+async def start_scheduler():
+    WARM_UP.start()
+    if QUEUE is not None:
+        return
+    await SCHEDULER.start()
+    if RESUME_ON_STARTUP:
+        await resume_unfinished()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await SCHEDULER.shutdown()
+
 # ------------------------------------------------------
 # 🔗 ROOT ENDPOINT
 # ------------------------------------------------------
@@ -54,8 +109,13 @@ def homepage():
     <p>Available endpoints:</p>
     <ul>
         <li><b>GET /healthz</b> - health check</li>
+        <li><b>GET /readyz</b> - readiness (model, graph and browser warmed up)</li>
         <li><b>POST /quiz</b> - submit a task</li>
+        <li><b>GET /quiz/{id}/events?secret=...</b> - live progress of a task (Server-Sent Events)</li>
         <li><b>GET /history</b> - view log history</li>
+        <li><b>GET /tasks/{id}</b> - view a single task</li>
+        <li><b>POST /tasks/{id}/resume</b> - resume a failed task from its last checkpoint</li>
+        <li><b>GET /stats</b> - tool resource pool, prompt compaction and LLM cache statistics</li>
     </ul>
     """
 
@@ -64,51 +124,96 @@ def homepage():
 # ------------------------------------------------------
 @app.get("/healthz")
 def health():
-    """Standard health check endpoint to monitor application status and uptime."""
+    """
+    Standard health check endpoint to monitor application status and uptime.
+    Liveness only: it is answered while the warm-up is still running.
+    """
     return {
         "status": "ok",
         "uptime_seconds": int(time.time() - START_TIME)
     }
 
+@app.get("/readyz")
+def ready():
+    """
+    Readiness check: 200 once the warm-up built the chat model and graph and
+    launched the browser and code workers, 503 (with per-step states) before
+    that or when a step failed. Tasks are accepted either way.
+    """
+    status = WARM_UP.status()
+    return JSONResponse(
+        status_code=200 if status["ready"] else 503,
+        content={"status": "ready" if status["ready"] else "warming_up", **status},
+    )
+
+# ------------------------------------------------------
+# 📊 STATS ENDPOINT
+# ------------------------------------------------------
+@app.get("/stats")
+def stats():
+    """Reports usage statistics of the shared resource pools used by the tools."""
+    return {
+        "browser_pool": get_browser_pool().stats(),
+        "download_cache": get_download_cache().stats(),
+        "prefetch": get_prefetcher().stats(),
+        "code_pool": get_code_pool().stats(),
+        "dependencies": get_provisioner().stats(),
+        "http_client": get_http_client().stats(),
+        "scheduler": SCHEDULER.stats(),
+        "queue": None if QUEUE is None else QUEUE.stats(),
+        "checkpoints": CHECKPOINTS.stats(),
+        "events": EVENTS.stats(),
+        "compaction": compaction_stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_rate_limiter": rate_limiter.stats(),
+    }
+
+# ------------------------------------------------------
+# 📈 METRICS ENDPOINT
+# ------------------------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Span duration histograms, payload sizes and LLM token counts in Prometheus format."""
+    return METRICS.render()
+
 # ------------------------------------------------------
 # 🏃 BACKGROUND TASK EXECUTION LOGIC
 # ------------------------------------------------------
-def run_agent_with_logging(url, log_entry):
+def dispatch(url, task_id, resume=False, priority=0, deadline=None):
     """
-    Executes the synchronous LangGraph agent function and updates the log entry
-    with the final status and result.
-
-    Why a background task?
-    The `run_agent(url)` call is synchronous and blocking. If we ran it directly 
-    in the `/quiz` endpoint handler, the server would be blocked for the 
-    entire duration of the quiz (potentially several minutes). 
-    `BackgroundTasks` allows the `/quiz` endpoint to immediately return a 200 
-    response while the long-running agent task executes separately, keeping 
-    the API responsive.
+    Hands a task to whatever runs the agents: the in-process scheduler, or
+    with TASK_QUEUE=sqlite the shared queue the agent worker processes
+    (worker.py) claim from. Raises SchedulerFull when there is no room.
     """
-    try:
-        # Execute the synchronous agent, which blocks this thread until completion.
-        result = run_agent(url) 
-        log_entry["status"] = "completed"
-        log_entry["completed_at"] = time.time()
-        log_entry["result"] = result
-    except Exception as e:
-        # Log any exceptions that occur during the agent's execution.
-        log_entry["status"] = "failed"
-        log_entry["completed_at"] = time.time()
-        log_entry["result"] = str(e)
+    if QUEUE is None:
+        SCHEDULER.submit(
+            run_agent_with_logging, url, task_id, resume,
+            priority=priority, deadline=deadline, on_expire=mark_expired,
+        )
+        return
+    if QUEUE.depth() >= TASK_QUEUE_MAX_DEPTH:
+        # A worker slot frees up about once a lease period at worst.
+        raise SchedulerFull(retry_after=int(TASK_LEASE_SECONDS))
+    QUEUE.enqueue(task_id, url, priority=priority, deadline=deadline, resume=resume)
+
+async def resume_unfinished():
+    """Requeue the tasks a previous process left queued or running, resuming from their checkpoints."""
+    for task in await asyncio.to_thread(STORE.unfinished):
+        await aset_status(task["id"], "queued", started_at=None)
+        try:
+            dispatch(task["url"], task["id"], True, priority=task["priority"])
+        except SchedulerFull:
+            await aset_status(task["id"], "failed", "Interrupted by server restart", completed_at=time.time())
 
 # ------------------------------------------------------
 # 🎯 SOLVE ENDPOINT (Task Submission)
 # ------------------------------------------------------
 @app.post("/quiz")
-async def solve(request: Request, background_tasks: BackgroundTasks):
+async def solve(request: Request):
     """
     Accepts a quiz URL, validates the secret, queues the agent execution, 
     and immediately returns a task ID.
     """
-    global TASK_ID
-
     # 1. Input Parsing and Validation
     try:
         # Request body must be parsed asynchronously
@@ -126,55 +231,221 @@ async def solve(request: Request, background_tasks: BackgroundTasks):
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
 
+    # Optional scheduling hints: higher priority runs first; a task still
+    # queued `deadline` seconds after submission is dropped.
+    priority = data.get("priority", 0)
+    deadline = data.get("deadline")
+    if not isinstance(priority, int) or (deadline is not None and not isinstance(deadline, (int, float))):
+        raise HTTPException(status_code=400, detail="Invalid priority or deadline")
+
     # 2. Log Entry Creation
-    TASK_ID += 1
-    log_entry = {
-        "id": TASK_ID,
-        "url": url,
-        "submitted_at": time.time(),
-        "completed_at": None,
-        "status": "queued", # Initial status
-        "result": None
-    }
-    QUIZ_LOGS.append(log_entry)
+    submitted_at = time.time()
+    task_id = await asyncio.to_thread(STORE.create, url, submitted_at, priority=priority)
+    EVENTS.publish(task_id, "status", status="queued", result=None)
 
     # 3. Task Offloading
-    # Add the agent execution function to the BackgroundTasks list.
-    # FastAPI will ensure this function is called after the HTTP response is sent.
-    background_tasks.add_task(run_agent_with_logging, url, log_entry)
+    # Hand the agent execution to the bounded scheduler (or the shared
+    # queue). When it is full, push back with 429 + Retry-After instead of
+    # piling up work.
+    try:
+        dispatch(url, task_id, priority=priority, deadline=None if deadline is None else submitted_at + deadline)
+    except SchedulerFull as e:
+        await aset_status(task_id, "rejected", completed_at=time.time())
+        return JSONResponse(
+            status_code=429,
+            content={"status": "busy", "detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
     # 4. Immediate Response
     # Respond immediately to the client to confirm the task is accepted.
     return JSONResponse(
         status_code=200,
-        content={"status": "ok", "task_id": TASK_ID}
+        content={"status": "ok", "task_id": task_id}
+    )
+
+# ------------------------------------------------------
+# 📡 PROGRESS EVENTS ENDPOINT
+# ------------------------------------------------------
+def worker_status_event(task_id, known_status):
+    """
+    With TASK_QUEUE=sqlite the agents run in worker processes, whose events
+    never reach this process. Their status transitions are read back from
+    the task store instead: returns a status event if the task is no longer
+    in `known_status`, else None.
+    """
+    task = STORE.get(task_id, fields=["status", "result"])
+    if task is None or task["status"] == known_status:
+        return None
+    result = task["result"] if task["status"] in TERMINAL_STATUSES else None
+    return {"task_id": str(task_id), "type": "status", "time": time.time(), "status": task["status"], "result": result}
+
+@app.get("/quiz/{task_id}/events")
+async def task_events(task_id: int, request: Request, secret: str = None):
+    """
+    Streams a task's progress as Server-Sent Events: status transitions,
+    agent turns, tool starts and ends, and submission responses, as they
+    happen. The first message (`snapshot`) is the task's current row; the
+    stream ends after the task completes, fails or expires.
+
+    Reconnecting clients send the Last-Event-ID header and only receive the
+    events they missed (as far as the task's backlog reaches). With
+    TASK_QUEUE=sqlite only status transitions are streamed.
+
+    Requires the secret as the `secret` query parameter (EventSource cannot
+    send headers). Credentials in tool arguments are redacted either way.
+    """
+    if secret != SECRET:
+        raise HTTPException(status_code=403, detail="Invalid secret")
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    # Subscribe before reading the task, so no transition falls in between.
+    subscription = EVENTS.subscribe(task_id, last_event_id)
+    task = await asyncio.to_thread(STORE.get, task_id, fields=[f for f in ALL_FIELDS if f != "result"])
+    if task is None:
+        EVENTS.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def stream():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(readable(task))}\n\n"
+            status, idle = task["status"], 0.0
+            while True:
+                # A finished task only drains what its backlog still holds.
+                # With a shared queue the workers' status changes are polled for.
+                polling = status in TERMINAL_STATUSES or QUEUE is not None
+                timeout = 1.0 if polling else EVENTS_KEEPALIVE_SECONDS
+                event = await subscription.next(timeout)
+                if event is None and QUEUE is not None and status not in TERMINAL_STATUSES:
+                    event = await asyncio.to_thread(worker_status_event, task_id, status)
+                if event is None:
+                    if status in TERMINAL_STATUSES or await request.is_disconnected():
+                        return
+                    idle += timeout
+                    if idle >= EVENTS_KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                idle = 0.0
+                yield format_sse(event)
+                if event["type"] == "status":
+                    status = event["status"]
+                    if status in TERMINAL_STATUSES:
+                        return
+        finally:
+            EVENTS.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 # ------------------------------------------------------
-# 📝 HISTORY ENDPOINT
+# 📝 HISTORY ENDPOINTS
 # ------------------------------------------------------
+# Helper function to format timestamps into readable strings
+def fmt(t):
+    return None if t is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+def readable(task):
+    """Formats the timestamp fields of a (possibly projected) task for display."""
+    for key in ("submitted_at", "started_at", "completed_at"):
+        if key in task:
+            task[key] = fmt(task[key])
+    return task
+
+def parse_fields(fields):
+    """Parses a comma-separated field projection, rejecting unknown fields."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in ALL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
 @app.get("/history")
-def history():
-    """
-    Retrieves the in-memory log of all submitted quiz tasks, formatted for readability.
-    """
-    # Helper function to format timestamps into readable strings
-    def fmt(t):
-        return None if t is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
-
-    readable_logs = []
-    for log in QUIZ_LOGS:
-        readable_logs.append({
-            "id": log["id"],
-            "url": log["url"],
-            "submitted_at": fmt(log["submitted_at"]),
-            "completed_at": fmt(log["completed_at"]),
-            "status": log["status"],
-            # The 'result' field holds the final output or error message from the agent.
-            "result": log["result"],
-        })
-
-    return {"count": len(readable_logs), "logs": readable_logs}
+def history(status: str = None, cursor: int = None, limit: int = 50, fields: str = None, order: str = "asc",
+            total: bool = False):
+    """
+    Retrieves a page of submitted quiz tasks, formatted for readability.
+
+    Supports filtering by `status`, cursor pagination (pass the returned
+    `next_cursor` back as `cursor`), a comma-separated `fields` projection
+    and `order` (asc/desc by task id). The number of matching tasks costs a
+    full count, so it is only computed with `total=1`.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    limit = max(1, min(limit, 500))
+    tasks, next_cursor = STORE.list_tasks(
+        status=status, cursor=cursor, limit=limit, fields=parse_fields(fields), order=order
+    )
+    # The 'result' field holds the final output or error message from the agent.
+    readable_logs = [readable(task) for task in tasks]
+
+    return {
+        "count": len(readable_logs),
+        "total": STORE.count(status) if total else None,
+        "next_cursor": next_cursor,
+        "logs": readable_logs,
+    }
+
+@app.get("/tasks/{task_id}")
+def get_task(task_id: int, fields: str = None):
+    """Retrieves a single task by id, optionally projected to `fields`."""
+    task = STORE.get(task_id, fields=parse_fields(fields))
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return readable(task)
+
+@app.post("/tasks/{task_id}/resume")
+async def resume_task(task_id: int, request: Request):
+    """
+    Requeues a failed or expired task. It continues from its last
+    checkpoint: completed steps (LLM turns, downloads, submissions) are not
+    repeated. Without a checkpoint it starts over from its URL.
+    """
+    try:
+        data = await request.json()
+    except:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if data.get("secret") != SECRET:
+        raise HTTPException(status_code=403, detail="Invalid secret")
+
+    task = await asyncio.to_thread(STORE.get, task_id, fields=["id", "url", "status", "priority", "started_at", "completed_at"])
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["status"] not in ("failed", "expired", "rejected"):
+        raise HTTPException(status_code=409, detail=f"Task is {task['status']}")
+
+    # Queued before dispatching: a worker may pick the task up (and mark it
+    # running) as soon as it is enqueued.
+    await aset_status(task_id, "queued", started_at=None, completed_at=None)
+    try:
+        dispatch(task["url"], task_id, True, priority=task["priority"])
+    except SchedulerFull as e:
+        await aset_status(task_id, task["status"], started_at=task["started_at"], completed_at=task["completed_at"])
+        return JSONResponse(
+            status_code=429,
+            content={"status": "busy", "detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    checkpoint = await asyncio.to_thread(CHECKPOINTS.load, task_id)
+    return {"status": "ok", "task_id": task_id, "checkpoint": checkpoint is not None}
+
+@app.get("/tasks/{task_id}/trace")
+def get_task_trace(task_id: int):
+    """
+    Retrieves the span timeline of a task: agent node calls, tool calls and
+    rate limiter waits with their offsets, durations, sizes and outcomes.
+    Running tasks return the spans recorded so far.
+    """
+    trace = get_trace(task_id) or STORE.get_trace(task_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
 
 # ------------------------------------------------------
 # 🖥️ DEV MODE EXECUTION
@@ -0,0 +1,318 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from langchain_core.rate_limiters import BaseRateLimiter
+from tracing import record_span
+
+# LLM quota (overridable through the environment / .env file)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "9"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "250000"))
+LLM_MAX_BURST = float(os.getenv("LLM_MAX_BURST", "9"))
+# "sqlite" shares the budget between all processes on the host, "memory" is process-local.
+LLM_RATE_LIMIT_BACKEND = os.getenv("LLM_RATE_LIMIT_BACKEND", "sqlite")
+LLM_RATE_LIMIT_PATH = os.getenv("LLM_RATE_LIMIT_PATH", os.path.join("LLMFiles", "rate_limits.sqlite3"))
+# Adaptive backoff: a 429 multiplies the rate by LLM_THROTTLE_FACTOR (down to
+# LLM_MIN_RATE_SCALE); each success recovers LLM_RECOVERY_STEP of the full rate.
+LLM_THROTTLE_FACTOR = float(os.getenv("LLM_THROTTLE_FACTOR", "0.5"))
+LLM_MIN_RATE_SCALE = float(os.getenv("LLM_MIN_RATE_SCALE", "0.1"))
+LLM_RECOVERY_STEP = float(os.getenv("LLM_RECOVERY_STEP", "0.05"))
+LLM_THROTTLE_DEFAULT_DELAY = float(os.getenv("LLM_THROTTLE_DEFAULT_DELAY", "10"))
+# How many times a throttled LLM call is retried (after backing off).
+LLM_THROTTLE_RETRIES = int(os.getenv("LLM_THROTTLE_RETRIES", "3"))
+
+_RETRY_DELAY = re.compile(r"retry[_ -]?(?:delay|after)[\"']?\s*[:=]?\s*[\"']?(\d+(?:\.\d+)?)\s*s", re.I)
+
+
+class _Bucket:
+    """State of one token bucket: level, last refill, rate scale and throttle window."""
+
+    def __init__(self, level: float, updated_at: float, scale: float = 1.0, blocked_until: float = 0.0):
+        self.level = level
+        self.updated_at = updated_at
+        self.scale = scale
+        self.blocked_until = blocked_until
+
+    def refill(self, rate: float, capacity: float, now: float):
+        self.level = min(capacity, self.level + max(0.0, now - self.updated_at) * rate * self.scale)
+        self.updated_at = now
+
+
+class BucketBackend(ABC):
+    """
+    Storage of token buckets. `update(name, fn, default)` must apply `fn` to
+    the bucket atomically (across every process sharing the backend) and
+    return its result.
+    """
+
+    @abstractmethod
+    def update(self, name: str, fn, default: _Bucket):
+        ...
+
+
+class MemoryBucketBackend(BucketBackend):
+    """Process-local buckets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def update(self, name, fn, default):
+        with self._lock:
+            bucket = self._buckets.setdefault(name, default)
+            return fn(bucket)
+
+
+class SQLiteBucketBackend(BucketBackend):
+    """
+    Buckets in a SQLite file, so every process on the host (uvicorn workers,
+    containers sharing a volume) draws from the same budget. Each update runs
+    in an IMMEDIATE transaction, which serializes writers across processes.
+    """
+
+    def __init__(self, path: str = LLM_RATE_LIMIT_PATH):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                level REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                scale REAL NOT NULL,
+                blocked_until REAL NOT NULL
+            )
+            """
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def update(self, name, fn, default):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT level, updated_at, scale, blocked_until FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            bucket = default if row is None else _Bucket(*row)
+            result = fn(bucket)
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (name, level, updated_at, scale, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                (name, bucket.level, bucket.updated_at, bucket.scale, bucket.blocked_until),
+            )
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+# Exception classes providers raise for quota refusals (google.api_core,
+# openai, anthropic), matched by name so none of them has to be installed.
+THROTTLE_ERROR_TYPES = {"ResourceExhausted", "TooManyRequests", "RateLimitError"}
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """
+    Whether `error` is the provider refusing a call for quota reasons: an
+    HTTP 429 status, the gRPC RESOURCE_EXHAUSTED status, or a quota
+    exception class, on the error or on the error it wraps.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if any(cls.__name__ in THROTTLE_ERROR_TYPES for cls in type(error).__mro__):
+            return True
+        for attr in ("code", "status_code"):
+            if getattr(error, attr, None) == 429:
+                return True
+        if getattr(error, "status", None) == "RESOURCE_EXHAUSTED":
+            return True
+        response = getattr(error, "response", None)
+        if getattr(response, "status_code", None) == 429:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def throttle_delay(error: Exception):
+    """Seconds the provider asked us to wait (Retry-After / retryDelay), if it said."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    match = _RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """
+    Token-bucket limiter for one model, shared through a BucketBackend.
+
+    Two buckets are kept per model: requests (`requests_per_minute`, bursts
+    of up to `max_burst`) and tokens (`tokens_per_minute`, debited after each
+    call from the response's usage metadata). A call may start once a request
+    is available and the token bucket is not in debt.
+
+    The limiter adapts to provider throttling: `report_throttle` pauses every
+    process for the provider's Retry-After and cuts the rate by
+    LLM_THROTTLE_FACTOR; `observe` (chained after the model) records token usage
+    and recovers the rate step by step.
+    """
+
+    def __init__(self, model: str, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_burst: float = LLM_MAX_BURST,
+                 backend: BucketBackend = None, check_every_n_seconds: float = 0.5):
+        self.model = model
+        self.request_rate = requests_per_minute / 60
+        self.request_capacity = max(1.0, max_burst)
+        self.token_rate = tokens_per_minute / 60
+        self.token_capacity = tokens_per_minute
+        self.backend = backend or MemoryBucketBackend()
+        self.check_every_n_seconds = check_every_n_seconds
+        self._requests = f"{model}:requests"
+        self._tokens = f"{model}:tokens"
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "acquired": 0,
+            "throttles": 0,
+            "tokens_used": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _record(self, wait_seconds: float = None, **counters):
+        with self._stats_lock:
+            for key, value in counters.items():
+                self._stats[key] += value
+            if wait_seconds is not None:
+                self._stats["wait_seconds_total"] += wait_seconds
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_seconds)
+
+    # -------------------------------------------------
+    # Bucket operations
+    # -------------------------------------------------
+    def _try_take(self) -> float:
+        """Take one request if allowed; return 0 on success, else the seconds to wait."""
+        now = time.time()
+        if self.token_rate > 0:
+            def check_tokens(bucket):
+                bucket.refill(self.token_rate, self.token_capacity, now)
+                return 0.0 if bucket.level > 0 else -bucket.level / (self.token_rate * bucket.scale)
+            wait = self.backend.update(self._tokens, check_tokens, _Bucket(self.token_capacity, now))
+            if wait > 0:
+                return wait
+
+        def take_request(bucket):
+            if now < bucket.blocked_until:
+                return bucket.blocked_until - now
+            bucket.refill(self.request_rate, self.request_capacity, now)
+            if bucket.level >= 1:
+                bucket.level -= 1
+                return 0.0
+            return (1 - bucket.level) / (self.request_rate * bucket.scale)
+        return self.backend.update(self._requests, take_request, _Bucket(self.request_capacity, now))
+
+    def _acquired(self, started: float):
+        waited = time.monotonic() - started
+        self._record(wait_seconds=waited, acquired=1)
+        record_span("rate_limiter", self.model, started, waited)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                self._acquired(started)
+                return True
+            if not blocking:
+                return False
+            time.sleep(min(wait, self.check_every_n_seconds))
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        while True:
+            # The SQLite backend may wait up to its busy timeout for the lock.
+            wait = await asyncio.to_thread(self._try_take)
+            if wait <= 0:
+                self._acquired(started)
+                return True
+            if not blocking:
+                return False
+            await asyncio.sleep(min(wait, self.check_every_n_seconds))
+
+    # -------------------------------------------------
+    # Feedback from the provider
+    # -------------------------------------------------
+    def observe(self, message):
+        """Record a successful call's token usage and recover the rate; returns `message`."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        tokens = usage.get("total_tokens", 0)
+        now = time.time()
+        if tokens and self.token_rate > 0:
+            def debit(bucket):
+                bucket.refill(self.token_rate, self.token_capacity, now)
+                bucket.level -= tokens
+            self.backend.update(self._tokens, debit, _Bucket(self.token_capacity, now))
+
+        def recover(bucket):
+            bucket.scale = min(1.0, bucket.scale + LLM_RECOVERY_STEP)
+        self.backend.update(self._requests, recover, _Bucket(self.request_capacity, now))
+        self._record(tokens_used=tokens)
+        return message
+
+    def report_throttle(self, error: Exception = None):
+        """Back off after the provider answered 429 (optionally with a Retry-After)."""
+        delay = throttle_delay(error) if error is not None else None
+        delay = LLM_THROTTLE_DEFAULT_DELAY if delay is None else delay
+        now = time.time()
+
+        def throttle(bucket):
+            bucket.refill(self.request_rate, self.request_capacity, now)
+            bucket.level = 0.0
+            bucket.scale = max(LLM_MIN_RATE_SCALE, bucket.scale * LLM_THROTTLE_FACTOR)
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+        self.backend.update(self._requests, throttle, _Bucket(self.request_capacity, now))
+        self._record(throttles=1)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        acquired = snapshot["acquired"] or 1
+        snapshot["wait_seconds_avg"] = snapshot["wait_seconds_total"] / acquired
+        now = time.time()
+
+        def peek(bucket):
+            return bucket.scale, max(0.0, bucket.blocked_until - now)
+        snapshot["rate_scale"], snapshot["blocked_seconds"] = self.backend.update(
+            self._requests, peek, _Bucket(self.request_capacity, now)
+        )
+        snapshot["model"] = self.model
+        return snapshot
+
+
+def create_bucket_backend(kind: str = LLM_RATE_LIMIT_BACKEND) -> BucketBackend:
+    """Build the bucket backend selected by LLM_RATE_LIMIT_BACKEND ("sqlite" or "memory")."""
+    if kind == "memory":
+        return MemoryBucketBackend()
+    if kind == "sqlite":
+        return SQLiteBucketBackend()
+    raise ValueError(f"Unknown LLM_RATE_LIMIT_BACKEND: {kind}")
@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import math
+import os
+import time
+
+# Scheduler sizing (overridable through the environment / .env file)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))
+
+
+class SchedulerFull(Exception):
+    """Raised by `TaskScheduler.submit` when the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Task queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class _Job:
+    def __init__(self, fn, args, priority, deadline, on_expire):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.deadline = deadline
+        self.on_expire = on_expire
+        self.enqueued_at = time.time()
+
+
+async def _call(fn, *args):
+    """Call a sync function or await a coroutine function."""
+    result = fn(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class TaskScheduler:
+    """
+    In-process scheduler for long-running agent tasks.
+
+    A fixed number of worker coroutines on the server's event loop pull jobs
+    from a bounded priority queue (higher `priority` first, FIFO within a
+    priority). Jobs are coroutine functions (e.g. `run_agent_async`), so the
+    worker count bounds concurrency without tying up OS threads. When the
+    queue is full, `submit` raises SchedulerFull with a Retry-After estimate
+    instead of accepting unbounded work. A job counts as failed in `stats`
+    when it raises or returns False. Jobs still queued when their
+    `deadline` (epoch seconds) passes are dropped and `on_expire` is called
+    instead.
+
+    `submit` and `stats` must be called from the event loop thread.
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, max_queue: int = SCHEDULER_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._heap = []
+        self._seq = itertools.count()
+        self._ready = None
+        self._tasks = []
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "expired": 0,
+            "in_flight": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    async def start(self):
+        """Start the worker coroutines on the running event loop."""
+        if self._tasks:
+            return
+        # Counts queued jobs; workers sleep on it while the heap is empty.
+        self._ready = asyncio.Semaphore(len(self._heap))
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"scheduler-{i}") for i in range(self.workers)
+        ]
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up, for the Retry-After header."""
+        finished = self._stats["completed"] + self._stats["failed"]
+        avg_run = self._stats["run_seconds_total"] / finished if finished else 60.0
+        # Every finished job pulls one queued job, i.e. a slot frees up
+        # roughly every avg_run / workers seconds.
+        return max(1, math.ceil(avg_run / self.workers))
+
+    def submit(self, fn, *args, priority: int = 0, deadline: float = None, on_expire=None):
+        """Queue `fn(*args)`; raises SchedulerFull when the queue is at capacity."""
+        if len(self._heap) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise SchedulerFull(self.retry_after())
+        heapq.heappush(self._heap, (-priority, next(self._seq), _Job(fn, args, priority, deadline, on_expire)))
+        self._stats["submitted"] += 1
+        if self._ready is not None:
+            self._ready.release()
+
+    async def _work(self):
+        while True:
+            await self._ready.acquire()
+            _, _, job = heapq.heappop(self._heap)
+            waited = time.time() - job.enqueued_at
+
+            if job.deadline is not None and time.time() > job.deadline:
+                self._stats["expired"] += 1
+                if job.on_expire is not None:
+                    try:
+                        await _call(job.on_expire, *job.args)
+                    except Exception:
+                        pass
+                continue
+
+            self._stats["in_flight"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            started = time.time()
+            try:
+                # A job that records its own failures reports them by returning False.
+                ok = await _call(job.fn, *job.args) is not False
+            except Exception:
+                ok = False
+            finally:
+                self._stats["in_flight"] -= 1
+                self._stats["run_seconds_total"] += time.time() - started
+            self._stats["completed" if ok else "failed"] += 1
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["queue_depth"] = len(self._heap)
+        started = snapshot["submitted"] - snapshot["queue_depth"] - snapshot["expired"]
+        snapshot["wait_seconds_avg"] = snapshot["wait_seconds_total"] / started if started > 0 else 0.0
+        snapshot["workers"] = self.workers
+        snapshot["max_queue"] = self.max_queue
+        return snapshot
+
+    async def shutdown(self):
+        """Cancel the workers (and the jobs they are running); queued jobs are discarded."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# Task queue knobs (overridable through the environment / .env file)
+# "local" (default): the API process runs the agents on its in-process
+# scheduler. "sqlite": the API only enqueues; `python worker.py` processes
+# claim the tasks from a queue shared through a SQLite file.
+TASK_QUEUE = os.getenv("TASK_QUEUE", "local")
+TASK_QUEUE_PATH = os.getenv("TASK_QUEUE_PATH", os.path.join("LLMFiles", "queue.sqlite3"))
+# Tasks waiting in the shared queue before /quiz answers 429.
+TASK_QUEUE_MAX_DEPTH = int(os.getenv("TASK_QUEUE_MAX_DEPTH", "256"))
+# A claimed task belongs to its worker for TASK_LEASE_SECONDS; the worker
+# renews the lease every TASK_HEARTBEAT_SECONDS. A lease that runs out (the
+# worker crashed or hung) makes the task claimable again.
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "60"))
+TASK_HEARTBEAT_SECONDS = float(os.getenv("TASK_HEARTBEAT_SECONDS", "15"))
+# A task whose lease ran out this many times is given up on.
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+
+class TaskQueue(ABC):
+    """
+    Interface of the queue between the API process and the agent workers.
+
+    A task is enqueued once and then claimed by one worker at a time under a
+    lease. The worker heartbeats to keep the lease, and completes (removes)
+    the task when it finished, however it ended. Claiming prefers higher
+    priority, then older tasks; a task whose lease expired is claimed again
+    with `resume` set, so the next worker continues from the checkpoint.
+
+    Backends must be safe to share between processes (e.g. SQLite here, a
+    Redis sorted set with per-task lease keys for several hosts).
+    """
+
+    @abstractmethod
+    def enqueue(self, task_id: int, url: str, priority: int = 0, deadline: float = None, resume: bool = False):
+        ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float = TASK_LEASE_SECONDS):
+        """
+        Lease the next claimable task to `worker_id`. Returns a dict (task_id,
+        url, priority, deadline, resume, attempts, reclaimed) or None.
+        """
+
+    @abstractmethod
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float = TASK_LEASE_SECONDS) -> bool:
+        """Extend the lease; False when `worker_id` no longer holds it."""
+
+    @abstractmethod
+    def release(self, task_id: int, worker_id: str):
+        """Hand a leased task back (e.g. on worker shutdown) without counting an attempt."""
+
+    @abstractmethod
+    def complete(self, task_id: int, worker_id: str = None):
+        """Remove a task from the queue (if `worker_id` is given, only while it holds the lease)."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Tasks waiting to be claimed."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Queue in a single SQLite file (WAL mode, one connection per thread),
+    shared by every process on the host. Claims are optimistic: a worker
+    picks the best candidate and takes it with a conditional UPDATE, trying
+    the next candidate when another worker was faster.
+    """
+
+    def __init__(self, path: str = TASK_QUEUE_PATH):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "claimed": 0, "reclaimed": 0, "released": 0, "completed": 0, "lost_leases": 0}
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        with db:
+            db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS task_queue (
+                    task_id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    deadline REAL,
+                    resume INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_until REAL
+                );
+                CREATE INDEX IF NOT EXISTS task_queue_claim ON task_queue (lease_until, priority, task_id);
+                """
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def enqueue(self, task_id, url, priority=0, deadline=None, resume=False):
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO task_queue (task_id, url, priority, deadline, resume, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, url, priority, deadline, int(resume), time.time()),
+            )
+        self._count("enqueued")
+
+    def claim(self, worker_id, lease_seconds=TASK_LEASE_SECONDS):
+        db = self._db()
+        while True:
+            now = time.time()
+            row = db.execute(
+                "SELECT * FROM task_queue WHERE lease_until IS NULL OR lease_until < ? "
+                "ORDER BY priority DESC, task_id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            # An expired lease means the previous worker died mid-run.
+            reclaimed = row["lease_owner"] is not None
+            with db:
+                taken = db.execute(
+                    "UPDATE task_queue SET lease_owner = ?, lease_until = ?, attempts = attempts + 1, "
+                    "resume = ? WHERE task_id = ? AND lease_until IS ?",
+                    (worker_id, now + lease_seconds, int(reclaimed or row["resume"]), row["task_id"], row["lease_until"]),
+                ).rowcount
+            if taken:
+                self._count("reclaimed" if reclaimed else "claimed")
+                return {
+                    "task_id": row["task_id"],
+                    "url": row["url"],
+                    "priority": row["priority"],
+                    "deadline": row["deadline"],
+                    "resume": bool(reclaimed or row["resume"]),
+                    "attempts": row["attempts"] + 1,
+                    "reclaimed": reclaimed,
+                }
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=TASK_LEASE_SECONDS):
+        db = self._db()
+        with db:
+            held = db.execute(
+                "UPDATE task_queue SET lease_until = ? WHERE task_id = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, task_id, worker_id),
+            ).rowcount
+        if not held:
+            self._count("lost_leases")
+        return bool(held)
+
+    def release(self, task_id, worker_id):
+        db = self._db()
+        with db:
+            released = db.execute(
+                "UPDATE task_queue SET lease_owner = NULL, lease_until = NULL, resume = 1, attempts = attempts - 1 "
+                "WHERE task_id = ? AND lease_owner = ?",
+                (task_id, worker_id),
+            ).rowcount
+        if released:
+            self._count("released")
+
+    def complete(self, task_id, worker_id=None):
+        db = self._db()
+        with db:
+            if worker_id is None:
+                removed = db.execute("DELETE FROM task_queue WHERE task_id = ?", (task_id,)).rowcount
+            else:
+                removed = db.execute(
+                    "DELETE FROM task_queue WHERE task_id = ? AND lease_owner = ?", (task_id, worker_id)
+                ).rowcount
+        if removed:
+            self._count("completed")
+
+    def depth(self):
+        return self._db().execute("SELECT COUNT(*) FROM task_queue WHERE lease_until IS NULL").fetchone()[0]
+
+    def stats(self):
+        now = time.time()
+        row = self._db().execute(
+            "SELECT SUM(lease_until IS NULL), SUM(lease_until >= ?), SUM(lease_until < ?) FROM task_queue",
+            (now, now),
+        ).fetchone()
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot.update(queued=row[0] or 0, leased=row[1] or 0, expired_leases=row[2] or 0)
+        return snapshot
+
+
+def create_task_queue(kind: str = TASK_QUEUE) -> TaskQueue:
+    """Build the shared queue selected by TASK_QUEUE; None in "local" mode."""
+    if kind == "local":
+        return None
+    if kind == "sqlite":
+        return SQLiteTaskQueue()
+    raise ValueError(f"Unknown TASK_QUEUE backend: {kind}")
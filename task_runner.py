@@ -0,0 +1,74 @@
+import asyncio
+import time
+from agent import run_agent_async
+from events import EVENTS, TERMINAL_STATUSES
+from task_store import create_task_store
+from tracing import get_trace
+
+# Runs quiz tasks and records their status transitions. Shared by the API
+# process (main.py) and the agent workers (worker.py); importing it builds
+# the task store, nothing else.
+
+# Persistent task log. SQLite (WAL) by default, in-memory with TASK_STORE=memory.
+# The store also assigns the unique task IDs.
+STORE = create_task_store()
+
+
+def set_status(task_id, status, result=None, **fields):
+    """
+    Records a status transition in the task store and publishes it to the
+    task's event subscribers (see events.py). Final statuses carry the result.
+    """
+    if status in TERMINAL_STATUSES and result is not None:
+        STORE.set_result(task_id, result)
+    STORE.update(task_id, status=status, **fields)
+    EVENTS.publish(task_id, "status", status=status, result=result)
+
+
+async def aset_status(task_id, status, result=None, **fields):
+    """
+    `set_status` for coroutines. The store write may wait on SQLite's busy
+    timeout, so it runs in a thread instead of stalling the event loop.
+    """
+    await asyncio.to_thread(set_status, task_id, status, result, **fields)
+
+
+async def run_agent_with_logging(url, task_id, resume=False):
+    """
+    Executes the async LangGraph agent and updates the task store with the
+    final status and result.
+
+    Why a scheduler?
+    A quiz chain can take several minutes. If we awaited it directly in the
+    `/quiz` endpoint handler, the client would wait for the entire duration.
+    Running it on the scheduler's worker coroutines lets `/quiz` return
+    immediately and caps how many agents run at once. Because the agent is
+    awaited on the event loop (LLM calls, renders, downloads and code runs are
+    all async), concurrent chains no longer hold an OS thread each.
+
+    With `resume`, the run continues from its last checkpoint (see
+    checkpoints.py) instead of starting over from `url`.
+
+    Failures are recorded rather than raised; returns whether the run
+    completed, which the scheduler counts in its stats.
+    """
+    await aset_status(task_id, "running", started_at=time.time())
+    try:
+        # Await the agent; other chains and requests proceed in the meantime.
+        result = await run_agent_async(url, task_id=task_id, resume=resume)
+        await aset_status(task_id, "completed", result, completed_at=time.time())
+        return True
+    except Exception as e:
+        # Log any exceptions that occur during the agent's execution.
+        await aset_status(task_id, "failed", str(e), completed_at=time.time())
+        return False
+    finally:
+        # Persist the span timeline recorded by the run (see tracing.py).
+        trace = get_trace(task_id)
+        if trace is not None:
+            await asyncio.to_thread(STORE.set_trace, task_id, trace)
+
+
+async def mark_expired(url, task_id, resume=False):
+    """Called by the scheduler when a task's deadline passed while it was queued."""
+    await aset_status(task_id, "expired", "Deadline passed before the task could start", completed_at=time.time())
@@ -0,0 +1,352 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+# Task store backend (overridable through the environment / .env file):
+# "sqlite" (default, persistent) or "memory" (tests / throwaway runs).
+TASK_STORE = os.getenv("TASK_STORE", "sqlite")
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", os.path.join("LLMFiles", "tasks.sqlite3"))
+
+# Columns of the task index; results are kept separately.
+TASK_FIELDS = ["id", "url", "status", "priority", "submitted_at", "started_at", "completed_at"]
+ALL_FIELDS = TASK_FIELDS + ["result"]
+UNFINISHED_STATUSES = ("queued", "running")
+
+
+def _check_fields(fields):
+    fields = list(fields or ALL_FIELDS)
+    unknown = [f for f in fields if f not in ALL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+class TaskStore(ABC):
+    """
+    Interface of the quiz task store used by main.py.
+
+    Tasks are small index rows (TASK_FIELDS); their potentially large result
+    is stored separately and only loaded when the "result" field is asked
+    for. `list_tasks` pages by task id with an opaque cursor, so a page costs
+    O(limit) however many tasks exist.
+    """
+
+    @abstractmethod
+    def create(self, url: str, submitted_at: float, priority: int = 0, status: str = "queued") -> int:
+        ...
+
+    @abstractmethod
+    def update(self, task_id: int, **fields):
+        ...
+
+    @abstractmethod
+    def set_result(self, task_id: int, result):
+        ...
+
+    @abstractmethod
+    def get(self, task_id: int, fields=None):
+        ...
+
+    @abstractmethod
+    def set_trace(self, task_id: int, trace: dict):
+        """Store the span timeline of a finished task (see tracing.py)."""
+
+    @abstractmethod
+    def get_trace(self, task_id: int):
+        ...
+
+    @abstractmethod
+    def list_tasks(self, status=None, cursor=None, limit: int = 50, fields=None, order: str = "asc"):
+        """Return (tasks, next_cursor); next_cursor is None on the last page."""
+
+    @abstractmethod
+    def count(self, status=None) -> int:
+        ...
+
+    @abstractmethod
+    def fail_unfinished(self, reason: str, completed_at: float) -> int:
+        """Mark tasks left queued/running by a previous process as failed."""
+
+    @abstractmethod
+    def unfinished(self) -> list:
+        """Tasks (id, url, priority) left queued/running by a previous process, oldest first."""
+
+    @abstractmethod
+    def claim_recovery(self) -> bool:
+        """
+        True in exactly one of the processes sharing the store (the first to
+        ask), which then resumes or fails the unfinished tasks; False in the
+        others, so a restart of N server processes recovers each task once.
+        """
+
+
+class MemoryTaskStore(TaskStore):
+    """Dict-backed store; nothing survives a restart."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._results = {}
+        self._traces = {}
+        self._next_id = 1
+
+    def create(self, url, submitted_at, priority=0, status="queued"):
+        with self._lock:
+            task_id = self._next_id
+            self._next_id += 1
+            self._tasks[task_id] = {
+                "id": task_id,
+                "url": url,
+                "status": status,
+                "priority": priority,
+                "submitted_at": submitted_at,
+                "started_at": None,
+                "completed_at": None,
+            }
+            return task_id
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            self._tasks[task_id].update(fields)
+
+    def set_result(self, task_id, result):
+        with self._lock:
+            self._results[task_id] = result
+
+    def set_trace(self, task_id, trace):
+        with self._lock:
+            self._traces[task_id] = trace
+
+    def get_trace(self, task_id):
+        with self._lock:
+            return self._traces.get(task_id)
+
+    def _project(self, task, fields):
+        row = dict(task, result=self._results.get(task["id"]))
+        return {f: row[f] for f in fields}
+
+    def get(self, task_id, fields=None):
+        fields = _check_fields(fields)
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return None if task is None else self._project(task, fields)
+
+    def list_tasks(self, status=None, cursor=None, limit=50, fields=None, order="asc"):
+        fields = _check_fields(fields)
+        with self._lock:
+            ids = sorted(self._tasks, reverse=(order == "desc"))
+            if cursor is not None:
+                ids = [i for i in ids if (i < cursor if order == "desc" else i > cursor)]
+            if status is not None:
+                ids = [i for i in ids if self._tasks[i]["status"] == status]
+            page = ids[:limit + 1]
+            tasks = [self._project(self._tasks[i], fields) for i in page[:limit]]
+        next_cursor = page[limit - 1] if len(page) > limit else None
+        return tasks, next_cursor
+
+    def count(self, status=None):
+        with self._lock:
+            return sum(1 for t in self._tasks.values() if status is None or t["status"] == status)
+
+    def fail_unfinished(self, reason, completed_at):
+        with self._lock:
+            stale = [t for t in self._tasks.values() if t["status"] in UNFINISHED_STATUSES]
+            for task in stale:
+                task.update(status="failed", completed_at=completed_at)
+                self._results[task["id"]] = reason
+            return len(stale)
+
+    def unfinished(self):
+        with self._lock:
+            return [
+                {"id": t["id"], "url": t["url"], "priority": t["priority"]}
+                for t in sorted(self._tasks.values(), key=lambda t: t["id"])
+                if t["status"] in UNFINISHED_STATUSES
+            ]
+
+    def claim_recovery(self):
+        # Nothing is shared with other processes.
+        return True
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Persistent store in a single SQLite file (WAL mode, one connection per
+    thread). `tasks` is indexed by status and submission time; results live
+    in their own table keyed by task id, as do the traces of finished tasks.
+    """
+
+    def __init__(self, path: str = TASK_STORE_PATH):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        self._recovery_lock = None
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        with db:
+            db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    submitted_at REAL NOT NULL,
+                    started_at REAL,
+                    completed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+                CREATE INDEX IF NOT EXISTS tasks_submitted_at ON tasks (submitted_at);
+                CREATE TABLE IF NOT EXISTS task_results (
+                    task_id INTEGER PRIMARY KEY REFERENCES tasks (id),
+                    result TEXT
+                );
+                CREATE TABLE IF NOT EXISTS task_traces (
+                    task_id INTEGER PRIMARY KEY REFERENCES tasks (id),
+                    trace TEXT NOT NULL
+                );
+                """
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def create(self, url, submitted_at, priority=0, status="queued"):
+        db = self._db()
+        with db:
+            cur = db.execute(
+                "INSERT INTO tasks (url, status, priority, submitted_at) VALUES (?, ?, ?, ?)",
+                (url, status, priority, submitted_at),
+            )
+        return cur.lastrowid
+
+    def update(self, task_id, **fields):
+        columns = [f for f in fields if f in TASK_FIELDS and f != "id"]
+        if not columns:
+            return
+        db = self._db()
+        with db:
+            db.execute(
+                f"UPDATE tasks SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?",
+                [fields[c] for c in columns] + [task_id],
+            )
+
+    def set_result(self, task_id, result):
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO task_results (task_id, result) VALUES (?, ?)",
+                (task_id, json.dumps(result, default=str)),
+            )
+
+    def set_trace(self, task_id, trace):
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO task_traces (task_id, trace) VALUES (?, ?)",
+                (task_id, json.dumps(trace, default=str)),
+            )
+
+    def get_trace(self, task_id):
+        row = self._db().execute("SELECT trace FROM task_traces WHERE task_id = ?", (task_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _select(self, fields) -> str:
+        columns = [f"t.{f}" for f in fields if f != "result"]
+        if "result" in fields:
+            columns.append("r.result")
+            return f"SELECT {', '.join(columns)} FROM tasks t LEFT JOIN task_results r ON r.task_id = t.id"
+        return f"SELECT {', '.join(columns)} FROM tasks t"
+
+    def _row(self, row, fields):
+        task = {f: row[f] for f in fields}
+        if "result" in task and task["result"] is not None:
+            task["result"] = json.loads(task["result"])
+        return task
+
+    def get(self, task_id, fields=None):
+        fields = _check_fields(fields)
+        row = self._db().execute(self._select(fields) + " WHERE t.id = ?", (task_id,)).fetchone()
+        return None if row is None else self._row(row, fields)
+
+    def list_tasks(self, status=None, cursor=None, limit=50, fields=None, order="asc"):
+        fields = _check_fields(fields)
+        # The cursor needs the id even when it was not projected.
+        select_fields = fields if "id" in fields else ["id"] + fields
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("t.status = ?")
+            params.append(status)
+        if cursor is not None:
+            clauses.append("t.id < ?" if order == "desc" else "t.id > ?")
+            params.append(cursor)
+        sql = self._select(select_fields)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY t.id {'DESC' if order == 'desc' else 'ASC'} LIMIT ?"
+        params.append(limit + 1)
+        rows = self._db().execute(sql, params).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [self._row(row, fields) for row in rows[:limit]], next_cursor
+
+    def count(self, status=None):
+        if status is None:
+            return self._db().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return self._db().execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+
+    def fail_unfinished(self, reason, completed_at):
+        db = self._db()
+        marks = ", ".join("?" for _ in UNFINISHED_STATUSES)
+        with db:
+            ids = [r[0] for r in db.execute(f"SELECT id FROM tasks WHERE status IN ({marks})", UNFINISHED_STATUSES)]
+            for task_id in ids:
+                db.execute("UPDATE tasks SET status = 'failed', completed_at = ? WHERE id = ?", (completed_at, task_id))
+                db.execute(
+                    "INSERT OR REPLACE INTO task_results (task_id, result) VALUES (?, ?)",
+                    (task_id, json.dumps(reason)),
+                )
+        return len(ids)
+
+    def unfinished(self):
+        marks = ", ".join("?" for _ in UNFINISHED_STATUSES)
+        rows = self._db().execute(
+            f"SELECT id, url, priority FROM tasks WHERE status IN ({marks}) ORDER BY id", UNFINISHED_STATUSES
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_recovery(self):
+        # An exclusive lock next to the database, held until this process
+        # exits. The processes of one server start together, so the holder is
+        # the only one that sees the previous run's tasks as unfinished. (A
+        # process restarted alone while its siblings keep running would get
+        # the lock if the holder died, and take their running tasks for
+        # leftovers: run the server processes as one unit.)
+        if self._recovery_lock is None:
+            lock = open(self.path + ".lock", "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return False
+            self._recovery_lock = lock
+        return True
+
+
+def create_task_store(kind: str = TASK_STORE) -> TaskStore:
+    """Build the task store selected by TASK_STORE ("sqlite" or "memory")."""
+    if kind == "memory":
+        return MemoryTaskStore()
+    if kind == "sqlite":
+        return SQLiteTaskStore()
+    raise ValueError(f"Unknown TASK_STORE backend: {kind}")
@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from tracing import record_span
+
+# Tool concurrency knobs (overridable through the environment / .env file)
+# How many tool calls of one agent run may execute at the same time.
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+# Process-wide caps per resource group ("group=limit,..."; 0 or missing = uncapped).
+TOOL_CONCURRENCY_CAPS = os.getenv("TOOL_CONCURRENCY_CAPS", "browser=4,http=16,sandbox=4")
+
+# Resource group of each tool; tools in one group compete for the same cap.
+TOOL_GROUPS = {
+    "get_rendered_html": "browser",
+    "download_file": "http",
+    "post_request": "http",
+    "run_code": "sandbox",
+    "add_dependencies": "deps",
+}
+
+
+def parse_caps(spec: str) -> dict:
+    caps = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            caps[name.strip()] = int(value)
+    return caps
+
+
+class Slots:
+    """
+    A counting semaphore usable from threads and coroutines alike. Tool calls
+    run on executor threads under `invoke` and on the event loop under
+    `ainvoke`, and both must count against the same limit.
+
+    Waiters queue in arrival order; `release` hands the slot straight to the
+    first one, waking a thread through its Event or a coroutine by resolving
+    its future on its own loop. A limit of 0 or less means no limit.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._free = limit
+        self._waiters = deque()
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Take a slot; False if none was free within `timeout` seconds."""
+        if self.limit <= 0:
+            return True
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            granted = threading.Event()
+            self._waiters.append(granted)
+        if granted.wait(timeout):
+            return True
+        with self._lock:
+            if granted.is_set():
+                return True
+            self._waiters.remove(granted)
+            return False
+
+    async def aacquire(self):
+        if self.limit <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            granted = loop.create_future()
+            waiter = (loop, granted)
+            self._waiters.append(waiter)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    waiting = True
+                except ValueError:
+                    waiting = False
+            # Granted just before the cancellation: pass the slot on. (A grant
+            # still on its way is passed on by `_resolve`.)
+            if not waiting and granted.done() and not granted.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, granted = waiter
+                try:
+                    loop.call_soon_threadsafe(self._resolve, granted)
+                    return
+                except RuntimeError:
+                    # The waiter's loop is closed; try the next one.
+                    continue
+            self._free += 1
+
+    def _resolve(self, granted):
+        if granted.done():
+            # Its waiter was cancelled meanwhile.
+            self.release()
+        else:
+            granted.set_result(None)
+
+
+_CAPS = {group: Slots(limit) for group, limit in parse_caps(TOOL_CONCURRENCY_CAPS).items()}
+_UNCAPPED = Slots(0)
+_RUN_SLOTS = contextvars.ContextVar("tool_slots", default=None)
+
+
+@contextmanager
+def tool_concurrency_scope(limit: int = TOOL_CONCURRENCY):
+    """Give the enclosed agent run its own limit on simultaneous tool calls."""
+    token = _RUN_SLOTS.set(Slots(limit))
+    try:
+        yield
+    finally:
+        _RUN_SLOTS.reset(token)
+
+
+def _slots_for(name: str):
+    return [_RUN_SLOTS.get() or _UNCAPPED, _CAPS.get(TOOL_GROUPS.get(name, name), _UNCAPPED)]
+
+
+def _record_wait(name: str, started: float):
+    waited = time.monotonic() - started
+    # Only contended calls get a span; an immediate grant is not worth a trace entry.
+    if waited >= 0.001:
+        record_span("tool_slot", name, started, waited, group=TOOL_GROUPS.get(name, name))
+
+
+def limit_tool(tool):
+    """
+    Return a copy of `tool` (a StructuredTool with sync `func` and optional
+    `coroutine`) whose calls first take a slot of their run and of their
+    resource group. ToolNode executes the tool calls of one LLM message side
+    by side (threads under `invoke`, gather under `ainvoke`); the slots bound
+    how many. The original is left untouched, so tools calling each other
+    directly (download_file runs its ingest through run_code) never wait on
+    a slot their caller already holds.
+    """
+    name = tool.name
+    func, coroutine = tool.func, tool.coroutine
+
+    @functools.wraps(func)
+    def limited(*args, **kwargs):
+        # Imported here: the tools package imports this module (code_pool).
+        from tools.time_budget import call_timeout
+        slots = _slots_for(name)
+        started = time.monotonic()
+        taken = []
+        try:
+            for s in slots:
+                # A call cut off by its time budget stops waiting.
+                if not s.acquire(call_timeout()):
+                    raise TimeoutError(f"{name} gave up waiting for a free slot")
+                taken.append(s)
+            _record_wait(name, started)
+            return func(*args, **kwargs)
+        finally:
+            for s in reversed(taken):
+                s.release()
+
+    alimited = None
+    if coroutine is not None:
+        @functools.wraps(coroutine)
+        async def alimited(*args, **kwargs):
+            slots = _slots_for(name)
+            started = time.monotonic()
+            taken = []
+            try:
+                for s in slots:
+                    await s.aacquire()
+                    taken.append(s)
+                _record_wait(name, started)
+                return await coroutine(*args, **kwargs)
+            finally:
+                for s in reversed(taken):
+                    s.release()
+
+    return tool.model_copy(update={"func": limited, "coroutine": alimited})
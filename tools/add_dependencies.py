@@ -1,6 +1,30 @@
 from typing import List
 from langchain_core.tools import tool
-import subprocess
+from .provisioning import get_provisioner, DEPS_INSTALL_TIMEOUT
+from .time_budget import call_timeout
+from .workspace import current_workspace
+
+
+def _describe(report: dict) -> str:
+    # A failure leads the message, so tracing.py records the call as an error.
+    lines = ["Error: dependency installation failed."] if report["failed"] else []
+    if report["present"]:
+        lines.append("Already installed: " + ", ".join(report["present"]))
+    if report["reused"] or report["installed"]:
+        lines.append("Installed: " + ", ".join(report["reused"] + report["installed"]))
+    if report["failed"]:
+        lines += [f"{spec}: {error}" for spec, error in report["failed"].items()]
+    elif lines:
+        lines.append("They can now be imported in run_code.")
+    return "\n".join(lines) or "No dependencies given."
+
+
+def _attach(report: dict):
+    # Overlays are per run: only this run's run_code executions see them.
+    workspace = current_workspace()
+    for site_dir in report["site_dirs"]:
+        if site_dir not in workspace.site_dirs:
+            workspace.site_dirs.append(site_dir)
 
 
 @tool
@@ -8,10 +32,14 @@ def add_dependencies(dependencies: List[str]) -> str:
     """
     Install the given Python packages into the environment.
 
+    Packages that are already installed return immediately; missing ones are
+    installed for the current run only (the project files are not modified).
+
     Parameters:
         dependencies (List[str]):
-            A list of Python package names to install. Each name must match the 
-            corresponding package name on PyPI.
+            A list of Python package names to install. Each name must match the
+            corresponding package name on PyPI (version specifiers such as
+            "scipy>=1.11" are allowed).
 
     Returns:
         str:
@@ -19,20 +47,24 @@ def add_dependencies(dependencies: List[str]) -> str:
     """
 
     try:
-        subprocess.check_call(
-            ["uv", "add"] + dependencies,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return "Successfully installed dependencies: " + ", ".join(dependencies)
-    
-    except subprocess.CalledProcessError as e:
-        return (
-            "Dependency installation failed.\n"
-            f"Exit code: {e.returncode}\n"
-            f"Error: {e.stderr or 'No error output.'}"
-        )
-    
+        # Installs keep going in the background past a cut-off; only the wait ends.
+        report = get_provisioner().provision(dependencies, call_timeout(DEPS_INSTALL_TIMEOUT))
+        _attach(report)
+        return _describe(report)
+
     except Exception as e:
-        return f"Unexpected error while installing dependencies: {e}" 
+        return f"Error installing dependencies: {e}"
+
+
+async def _aadd_dependencies(dependencies: List[str]) -> str:
+    """Async variant of add_dependencies, used when the graph runs with `ainvoke`."""
+    try:
+        report = await get_provisioner().aprovision(dependencies)
+        _attach(report)
+        return _describe(report)
+
+    except Exception as e:
+        return f"Error installing dependencies: {e}"
+
+
+add_dependencies.coroutine = _aadd_dependencies
@@ -0,0 +1,228 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from .time_budget import call_timeout
+
+# Pool tuning knobs (overridable through the environment / .env file)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+BROWSER_NAV_TIMEOUT_MS = int(os.getenv("BROWSER_NAV_TIMEOUT_MS", "60000"))
+
+
+class BrowserPool:
+    """
+    A long-lived headless Chromium shared by every render in the process.
+
+    Playwright objects are bound to the event loop that created them, so the
+    pool owns a private asyncio loop running in a daemon thread. Callers from
+    any thread (FastAPI background tasks, ToolNode executors, ...) submit work
+    to that loop and block on the result, while the loop itself multiplexes up
+    to `size` isolated browser contexts at once.
+
+    The browser is the pooled resource. Every render gets a fresh context
+    (a few milliseconds on a running browser), so cookies, local and session
+    storage, the HTTP cache and service workers never leak between chains.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE):
+        self.size = max(1, size)
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Owned by the pool loop; only touched from coroutines running on it.
+        self._playwright = None
+        self._browser = None
+        self._launch_lock = None
+        self._semaphore = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "launches": 0,
+            "renders": 0,
+            "failures": 0,
+            "contexts_created": 0,
+            "in_use": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "render_seconds_total": 0.0,
+            "render_seconds_max": 0.0,
+        }
+
+    # -------------------------------------------------
+    # Event loop plumbing
+    # -------------------------------------------------
+    def _ensure_loop(self):
+        """Start the pool's private event loop thread on first use."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                self._launch_lock = asyncio.Lock()
+                self._semaphore = asyncio.Semaphore(self.size)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=_run, name="browser-pool", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the pool loop and return a concurrent Future."""
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # -------------------------------------------------
+    # Browser and context lifecycle
+    # -------------------------------------------------
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            # The old browser died (or never existed): relaunch.
+            if self._playwright is None:
+                # Imported here so importing the tools does not load Playwright.
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            self._record(launches=1)
+            return self._browser
+
+    def warm_up(self, timeout: float = BROWSER_NAV_TIMEOUT_MS / 1000):
+        """Launch the browser ahead of the first render (see warmup.py)."""
+        self.submit(self._ensure_browser()).result(timeout)
+
+    @property
+    def launched(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _new_context(self):
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
+        context.set_default_navigation_timeout(BROWSER_NAV_TIMEOUT_MS)
+        self._record(contexts_created=1)
+        return context
+
+    # -------------------------------------------------
+    # Rendering
+    # -------------------------------------------------
+    async def _default_extract(self, page):
+        return await page.content()
+
+    async def arender(self, url: str, extract=None, wait_until: str = "networkidle"):
+        """
+        Render `url` in a fresh context and return `await extract(page)`
+        (the page's HTML by default). Must run on the pool loop.
+        """
+        extract = extract or self._default_extract
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            waited = time.monotonic() - queued_at
+            self._record(in_use=1)
+            started = time.monotonic()
+            healthy = False
+            context = None
+            try:
+                context = await self._new_context()
+                page = await context.new_page()
+                await page.goto(url, wait_until=wait_until)
+                result = await extract(page)
+                healthy = True
+                return result
+            finally:
+                if context is not None:
+                    # Closes its pages too.
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                rendered = time.monotonic() - started
+                self._record(
+                    in_use=-1,
+                    renders=1,
+                    failures=0 if healthy else 1,
+                    wait_seconds=waited,
+                    render_seconds=rendered,
+                )
+
+    def render(self, url: str, extract=None, wait_until: str = "networkidle", timeout: float = None):
+        """
+        Blocking wrapper around `arender` for use from synchronous code. The
+        render is cancelled (closing its context) once `timeout`, or the time
+        the current tool call has left, runs out.
+        """
+        future = self.submit(self.arender(url, extract, wait_until))
+        try:
+            return future.result(call_timeout(timeout))
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    # -------------------------------------------------
+    # Stats and shutdown
+    # -------------------------------------------------
+    def _record(self, wait_seconds: float = None, render_seconds: float = None, **counters):
+        with self._stats_lock:
+            for key, value in counters.items():
+                self._stats[key] += value
+            if wait_seconds is not None:
+                self._stats["wait_seconds_total"] += wait_seconds
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_seconds)
+            if render_seconds is not None:
+                self._stats["render_seconds_total"] += render_seconds
+                self._stats["render_seconds_max"] = max(self._stats["render_seconds_max"], render_seconds)
+
+    def stats(self) -> dict:
+        """Return a snapshot of pool counters plus average wait/render times."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        renders = snapshot["renders"] or 1
+        snapshot["wait_seconds_avg"] = snapshot["wait_seconds_total"] / renders
+        snapshot["render_seconds_avg"] = snapshot["render_seconds_total"] / renders
+        snapshot["size"] = self.size
+        snapshot["launched"] = self.launched
+        return snapshot
+
+    async def _aclose(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def close(self, timeout: float = 10):
+        """Close the browser and stop the pool loop."""
+        if self._loop is None or not self._thread.is_alive():
+            return
+        try:
+            self.submit(self._aclose()).result(timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the process-wide browser pool, creating it on first use."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BrowserPool()
+            atexit.register(_POOL.close)
+        return _POOL
@@ -0,0 +1,392 @@
+import asyncio
+import atexit
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from tool_concurrency import Slots
+from .time_budget import call_timeout
+
+# Pool tuning knobs (overridable through the environment / .env file)
+RUN_CODE_WORKERS = int(os.getenv("RUN_CODE_WORKERS", "2"))
+RUN_CODE_WORKER_MAX_EXECUTIONS = int(os.getenv("RUN_CODE_WORKER_MAX_EXECUTIONS", "50"))
+RUN_CODE_WORKER_MAX_RSS_MB = float(os.getenv("RUN_CODE_WORKER_MAX_RSS_MB", "1024"))
+# `tabular` is the load_table helper next to code_worker.py (see tabular.py).
+RUN_CODE_PRELOAD = os.getenv("RUN_CODE_PRELOAD", "numpy,pandas,tabular")
+# How long a freshly spawned worker may take to finish its preload imports.
+RUN_CODE_WORKER_STARTUP_TIMEOUT = float(os.getenv("RUN_CODE_WORKER_STARTUP_TIMEOUT", "120"))
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+
+
+class CodeWorker:
+    """
+    Parent-side handle on one warm `code_worker.py` interpreter.
+
+    Jobs and results travel as JSON lines over a dedicated pair of pipes;
+    the job's stdout/stderr are written by the worker into files owned by
+    the parent, so partial output survives timeouts and crashes.
+    """
+
+    def __init__(self, preload: str = RUN_CODE_PRELOAD):
+        job_read, self._job_write = os.pipe()
+        self._result_read, result_write = os.pipe()
+        self.proc = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, str(job_read), str(result_write), preload],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            pass_fds=(job_read, result_write),
+            close_fds=True,
+        )
+        os.close(job_read)
+        os.close(result_write)
+        self._buffer = b""
+        self.ready = False
+        self.executions = 0
+        self.rss_mb = 0.0
+        self.timed_out = False
+
+    def _take_message(self):
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def _read_message(self, timeout: float = None):
+        """Read one JSON line from the worker; None on EOF, TimeoutError on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError
+            readable, _, _ = select.select([self._result_read], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(self._result_read, 65536)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        return self._take_message()
+
+    async def _aread_message(self, timeout: float = None):
+        """Async counterpart of `_read_message`, waiting on the pipe via the event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError
+            readable = loop.create_future()
+            loop.add_reader(self._result_read, lambda: readable.done() or readable.set_result(None))
+            try:
+                await asyncio.wait_for(readable, remaining)
+            finally:
+                loop.remove_reader(self._result_read)
+            chunk = os.read(self._result_read, 65536)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        return self._take_message()
+
+    def _mark_ready(self, message) -> bool:
+        if message is None:
+            return False
+        self.ready = True
+        self.rss_mb = message.get("rss_mb", 0.0)
+        return True
+
+    def wait_ready(self, timeout: float = RUN_CODE_WORKER_STARTUP_TIMEOUT) -> bool:
+        """Block until the worker has finished its preload imports."""
+        return self.ready or self._mark_ready(self._read_message(timeout))
+
+    async def await_ready(self, timeout: float = RUN_CODE_WORKER_STARTUP_TIMEOUT) -> bool:
+        """Async counterpart of `wait_ready`."""
+        return self.ready or self._mark_ready(await self._aread_message(timeout))
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _submit(self, path: str, cwd: str, cpu_seconds: int = None, memory_mb: int = None,
+                site_dirs: list = None) -> dict:
+        """Send one job to the (ready) worker; returns the job description."""
+        fd, stdout_path = tempfile.mkstemp(prefix="run_code_", suffix=".out")
+        os.close(fd)
+        fd, stderr_path = tempfile.mkstemp(prefix="run_code_", suffix=".err")
+        os.close(fd)
+        job = {
+            "path": os.path.abspath(path),
+            "cwd": os.path.abspath(cwd),
+            "stdout_path": stdout_path,
+            "stderr_path": stderr_path,
+            "cpu_seconds": cpu_seconds,
+            "memory_mb": memory_mb,
+            "site_dirs": list(site_dirs or []),
+        }
+        os.write(self._job_write, (json.dumps(job) + "\n").encode())
+        self.executions += 1
+        return job
+
+    def _collect(self, job: dict, message, timeout: float = None) -> dict:
+        """Turn the worker's reply (None on death, "timeout") into the tool result dict."""
+        try:
+            note = ""
+            if message == "timeout":
+                self.timed_out = True
+                self.close()
+                message = {"return_code": -9}
+                note = f"\nExecution timed out after {timeout} seconds and was killed."
+            if message is None:
+                # The worker died mid-job (os._exit, segfault, CPU limit, OOM kill, ...).
+                message = {"return_code": self.proc.wait()}
+                if message["return_code"] == -signal.SIGXCPU:
+                    note = f"\nCPU time limit of {job['cpu_seconds']} seconds exceeded; execution was killed."
+                elif message["return_code"] == -signal.SIGKILL:
+                    note = "\nExecution was killed (possibly out of memory)."
+            self.rss_mb = message.get("rss_mb", self.rss_mb)
+
+            with open(job["stdout_path"], encoding="utf-8", errors="replace") as f:
+                stdout = f.read()
+            with open(job["stderr_path"], encoding="utf-8", errors="replace") as f:
+                stderr = f.read() + note
+            return {
+                "stdout": stdout,
+                "stderr": stderr,
+                "return_code": message["return_code"],
+            }
+        finally:
+            for p in (job["stdout_path"], job["stderr_path"]):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    def execute(self, path: str, cwd: str, timeout: float = None, cpu_seconds: int = None,
+                memory_mb: int = None, site_dirs: list = None) -> dict:
+        """
+        Run the script at `path` inside `cwd` and return the tool result dict.
+        `timeout` bounds wall-clock time (the worker is killed when exceeded),
+        `cpu_seconds` and `memory_mb` are enforced inside the worker via rlimits.
+        `site_dirs` are appended to sys.path for this job only.
+        """
+        if not self.wait_ready():
+            raise RuntimeError(f"worker exited during startup (code {self.proc.poll()})")
+        job = self._submit(path, cwd, cpu_seconds, memory_mb, site_dirs)
+        try:
+            message = self._read_message(timeout)
+        except TimeoutError:
+            message = "timeout"
+        return self._collect(job, message, timeout)
+
+    async def aexecute(self, path: str, cwd: str, timeout: float = None, cpu_seconds: int = None,
+                       memory_mb: int = None, site_dirs: list = None) -> dict:
+        """Async counterpart of `execute`; waits for the worker without holding a thread."""
+        if not await self.await_ready():
+            raise RuntimeError(f"worker exited during startup (code {self.proc.poll()})")
+        job = self._submit(path, cwd, cpu_seconds, memory_mb, site_dirs)
+        try:
+            message = await self._aread_message(timeout)
+        except TimeoutError:
+            message = "timeout"
+        except asyncio.CancelledError:
+            # Abandoned mid-job: the worker is still busy and must not return to the pool.
+            self.close()
+            self._collect(job, None)
+            raise
+        return self._collect(job, message, timeout)
+
+    def close(self):
+        """Terminate the worker process and release its pipes."""
+        if self.alive:
+            self.proc.kill()
+        self.proc.wait()
+        for fd in (self._job_write, self._result_read):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._job_write = self._result_read = -1
+
+
+class CodeWorkerPool:
+    """
+    A fixed-size pool of warm Python workers for the run_code tool.
+
+    Each call checks out an idle worker (spawning one if needed), runs the
+    script in a fresh `__main__` namespace and returns the worker to the pool.
+    Workers are recycled after `max_executions` jobs or once their RSS grows
+    beyond `max_rss_mb`, and a replacement is warmed up in the background.
+    """
+
+    def __init__(self, size: int = RUN_CODE_WORKERS, max_executions: int = RUN_CODE_WORKER_MAX_EXECUTIONS,
+                 max_rss_mb: float = RUN_CODE_WORKER_MAX_RSS_MB, preload: str = RUN_CODE_PRELOAD):
+        self.size = max(1, size)
+        self.max_executions = max(1, max_executions)
+        self.max_rss_mb = max_rss_mb
+        self.preload = preload
+
+        # Shared by `run` (threads) and `arun` (coroutines).
+        self._slots = Slots(self.size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+        self._stats = {
+            "executions": 0,
+            "spawned": 0,
+            "recycled": 0,
+            "timeouts": 0,
+            "exec_seconds_total": 0.0,
+            "wait_seconds_total": 0.0,
+        }
+
+    def _spawn(self) -> CodeWorker:
+        worker = CodeWorker(self.preload)
+        with self._lock:
+            self._stats["spawned"] += 1
+        return worker
+
+    def _spawn_idle(self):
+        worker = self._spawn()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.close()
+
+    def warm(self, count: int = None):
+        """Start `count` workers (default: the pool size) in the background."""
+        with self._lock:
+            missing = (self.size if count is None else count) - len(self._idle)
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._spawn_idle, name="code-pool-warm", daemon=True).start()
+
+    def warm_up(self, timeout: float = RUN_CODE_WORKER_STARTUP_TIMEOUT):
+        """
+        Start the missing workers and block until every one has finished its
+        preload imports (see warmup.py), so the pool is ready, not just spawned.
+        """
+        with self._lock:
+            missing = self.size - len(self._idle)
+        # Spawned together, so the preloads run side by side.
+        workers = [self._spawn() for _ in range(max(0, missing))]
+        deadline = time.monotonic() + timeout
+        try:
+            for worker in workers:
+                if not worker.wait_ready(max(0.0, deadline - time.monotonic())):
+                    raise RuntimeError(f"code worker exited during startup (code {worker.proc.poll()})")
+        except BaseException:
+            for worker in workers:
+                worker.close()
+            raise
+        for worker in workers:
+            with self._lock:
+                if not self._closed and len(self._idle) < self.size:
+                    self._idle.append(worker)
+                    continue
+            worker.close()
+
+    def _checkout(self) -> CodeWorker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+                worker.close()
+        return self._spawn()
+
+    def _checkin(self, worker: CodeWorker):
+        worn_out = (
+            not worker.alive
+            or worker.executions >= self.max_executions
+            or (self.max_rss_mb > 0 and worker.rss_mb > self.max_rss_mb)
+        )
+        with self._lock:
+            if not worn_out and not self._closed:
+                self._idle.append(worker)
+                return
+            if worn_out:
+                self._stats["recycled"] += 1
+        worker.close()
+        if not self._closed:
+            threading.Thread(target=self._spawn_idle, name="code-pool-warm", daemon=True).start()
+
+    def _record_run(self, worker: CodeWorker, queued_at: float, started: float):
+        finished = time.monotonic()
+        with self._lock:
+            self._stats["executions"] += 1
+            self._stats["timeouts"] += 1 if worker.timed_out else 0
+            self._stats["exec_seconds_total"] += finished - started
+            self._stats["wait_seconds_total"] += started - queued_at
+
+    def run(self, path: str, cwd: str, timeout: float = None, cpu_seconds: int = None,
+            memory_mb: int = None, site_dirs: list = None) -> dict:
+        """
+        Execute the script at `path` in a pooled worker; see `CodeWorker.execute`.
+        The wait and `timeout` are bounded by the current tool call's deadline.
+        """
+        queued_at = time.monotonic()
+        if not self._slots.acquire(call_timeout()):
+            raise TimeoutError("no code worker became free before the tool call was cut off")
+        timeout = call_timeout(timeout)
+        try:
+            started = time.monotonic()
+            worker = self._checkout()
+            try:
+                result = worker.execute(path, cwd, timeout, cpu_seconds, memory_mb, site_dirs)
+            finally:
+                self._checkin(worker)
+        finally:
+            self._slots.release()
+        self._record_run(worker, queued_at, started)
+        return result
+
+    async def arun(self, path: str, cwd: str, timeout: float = None, cpu_seconds: int = None,
+                   memory_mb: int = None, site_dirs: list = None) -> dict:
+        """Async counterpart of `run`."""
+        queued_at = time.monotonic()
+        await self._slots.aacquire()
+        try:
+            started = time.monotonic()
+            worker = self._checkout()
+            try:
+                result = await worker.aexecute(path, cwd, timeout, cpu_seconds, memory_mb, site_dirs)
+            finally:
+                self._checkin(worker)
+        finally:
+            self._slots.release()
+        self._record_run(worker, queued_at, started)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+        executions = snapshot["executions"] or 1
+        snapshot["exec_seconds_avg"] = snapshot["exec_seconds_total"] / executions
+        snapshot["wait_seconds_avg"] = snapshot["wait_seconds_total"] / executions
+        snapshot["size"] = self.size
+        return snapshot
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_code_pool() -> CodeWorkerPool:
+    """Return the process-wide run_code worker pool, creating it on first use."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = CodeWorkerPool()
+            atexit.register(_POOL.close)
+        return _POOL
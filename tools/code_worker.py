@@ -0,0 +1,179 @@
+"""
+Warm Python worker used by the run_code tool.
+
+Started by `tools.code_pool.CodeWorker` as a plain script (it deliberately
+imports nothing from the `tools` package). It pre-imports heavy libraries once,
+then executes one script per request in a fresh `__main__` namespace:
+
+    python code_worker.py <request_fd> <response_fd> [preload,modules]
+
+Requests and responses are JSON lines on the two inherited pipe descriptors,
+so the executed code's own stdin/stdout/stderr never interfere with the
+protocol. For each job, file descriptors 1 and 2 are redirected to the files
+named in the request, which also captures output of C extensions and child
+processes.
+"""
+import importlib
+import json
+import os
+import resource
+import runpy
+import sys
+import traceback
+
+
+def preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def rss_mb() -> float:
+    """Current resident set size of this worker in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Fall back to the peak RSS (reported in KiB on Linux).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def vm_size_bytes() -> int:
+    """Current virtual address space size of this worker."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def apply_limits(job: dict) -> dict:
+    """
+    Cap CPU time and additional address space for one job. Both limits are
+    relative to what the warm worker already uses, so pre-imported modules
+    do not count against the job. Returns the previous limits for restoring.
+    """
+    saved = {}
+    cpu_seconds = job.get("cpu_seconds")
+    if cpu_seconds:
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        limit = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        saved[resource.RLIMIT_CPU] = (soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    memory_mb = job.get("memory_mb")
+    if memory_mb:
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = vm_size_bytes() + int(memory_mb * 1024 * 1024)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            saved[resource.RLIMIT_AS] = (soft, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        except (OSError, ValueError):
+            pass
+    return saved
+
+
+def restore_limits(saved: dict):
+    for limit, value in saved.items():
+        try:
+            resource.setrlimit(limit, value)
+        except (OSError, ValueError):
+            pass
+
+
+def unload_overlays(site_dirs):
+    """Forget modules imported from a run's overlays, so the next job (maybe another run) cannot see them."""
+    if not site_dirs:
+        return
+    prefixes = tuple(os.path.join(os.path.abspath(d), "") for d in site_dirs)
+    for name, module in list(sys.modules.items()):
+        origin = getattr(module, "__file__", None) or ""
+        if origin.startswith(prefixes):
+            del sys.modules[name]
+
+
+def execute(job: dict) -> int:
+    """Run one script with fds 1/2 redirected; return its exit code."""
+    home = os.getcwd()
+    saved_limits = {}
+    saved_fds = (os.dup(1), os.dup(2))
+    saved_path, saved_argv = list(sys.path), list(sys.argv)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    out_fd = os.open(job["stdout_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    err_fd = os.open(job["stderr_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.dup2(out_fd, 1)
+    os.dup2(err_fd, 2)
+    os.close(out_fd)
+    os.close(err_fd)
+    try:
+        os.chdir(job["cwd"])
+        sys.path.insert(0, job["cwd"])
+        # Dependency overlays of this run go last, so they only add packages
+        # and never shadow the preloaded ones.
+        sys.path.extend(job.get("site_dirs") or [])
+        sys.argv = [job["path"]]
+        # Pick up packages installed (e.g. by add_dependencies) since the worker started.
+        importlib.invalidate_caches()
+        saved_limits = apply_limits(job)
+        runpy.run_path(job["path"], run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        # Hide the worker/runpy frames so the traceback reads like `python runner.py`.
+        etype, value, tb = sys.exc_info()
+        while tb is not None and tb.tb_frame.f_code.co_filename != job["path"]:
+            tb = tb.tb_next
+        traceback.print_exception(etype, value, tb)
+        return 1
+    finally:
+        restore_limits(saved_limits)
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+        sys.path[:], sys.argv = saved_path, saved_argv
+        unload_overlays(job.get("site_dirs") or [])
+        os.chdir(home)
+        # Drop figures etc. left behind by the script if matplotlib is in use.
+        if "matplotlib.pyplot" in sys.modules:
+            try:
+                sys.modules["matplotlib.pyplot"].close("all")
+            except Exception:
+                pass
+
+
+def main():
+    request_fd, response_fd = int(sys.argv[1]), int(sys.argv[2])
+    modules = [m for m in (sys.argv[3] if len(sys.argv) > 3 else "").split(",") if m]
+    preload(modules)
+
+    inbox = os.fdopen(request_fd, "r")
+    outbox = os.fdopen(response_fd, "w")
+    outbox.write(json.dumps({"ready": True, "rss_mb": rss_mb()}) + "\n")
+    outbox.flush()
+
+    for line in inbox:
+        job = json.loads(line)
+        return_code = execute(job)
+        outbox.write(json.dumps({"return_code": return_code, "rss_mb": rss_mb()}) + "\n")
+        outbox.flush()
+
+
+if __name__ == "__main__":
+    main()
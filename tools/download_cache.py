@@ -0,0 +1,497 @@
+import asyncio
+import bz2
+import fcntl
+import gzip
+import hashlib
+import lzma
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import httpx
+from .http_client import get_http_client
+from .ranged_download import (
+    DOWNLOAD_PARALLEL_MIN_BYTES, RANGE_HEADERS as RANGE_PROBE_HEADERS, PartialDownload, RangeNotHonored,
+    afetch_ranges, fetch_ranges, probe,
+)
+
+# Cache location and limits (overridable through the environment / .env file)
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.join("LLMFiles", ".cache"))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Within this window a cached URL is served without even a conditional request.
+DOWNLOAD_CACHE_FRESH_SECONDS = float(os.getenv("DOWNLOAD_CACHE_FRESH_SECONDS", "300"))
+
+CHUNK_SIZE = 1024 * 1024
+
+# ioctl(FICLONE): a copy-on-write clone on filesystems that support it
+# (btrfs, XFS, overlayfs on top of them).
+FICLONE = 0x40049409
+
+# Magic numbers of the compressed formats download_file can unpack on the fly.
+DECOMPRESSORS = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+
+
+class DownloadTooLarge(Exception):
+    """The body of a download exceeded the size limit the caller set."""
+
+
+class _BlobWriter:
+    """
+    Writes a body into a temp file while hashing it, then files it by
+    SHA-256. With `max_bytes`, writing past that size raises DownloadTooLarge.
+    """
+
+    def __init__(self, cache, max_bytes: int = None):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        if self.max_bytes is not None and self.size + len(chunk) > self.max_bytes:
+            raise DownloadTooLarge(f"body exceeds {self.max_bytes} bytes")
+        if chunk:
+            self.file.write(chunk)
+            self.digest.update(chunk)
+            self.size += len(chunk)
+
+    def commit(self):
+        self.file.close()
+        sha256 = self.digest.hexdigest()
+        self.cache._file_blob(self.tmp_path, sha256)
+        return sha256, self.size
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class DownloadCache:
+    """
+    On-disk, content-addressed cache for downloaded files.
+
+    Blobs live under `objects/` named by their SHA-256, so identical content
+    fetched from different URLs is stored once. A small SQLite index maps each
+    URL to its blob plus the validators (ETag / Last-Modified) needed to
+    revalidate it with a conditional GET. Cached blobs are cloned (reflinked
+    where the filesystem supports it, copied otherwise) into the requested
+    destination, so a hit costs a local copy rather than a transfer. Never a
+    hardlink: the app may run as root, which ignores the blobs' read-only
+    mode, and a write to a linked workspace file would corrupt the blob for
+    every later task. The total blob size is kept under `max_bytes` by evicting the
+    least recently used blobs.
+    """
+
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES,
+                 fresh_seconds: float = DOWNLOAD_CACHE_FRESH_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.index_path = os.path.join(root, "index.sqlite3")
+
+        self._counters_lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "evictions": 0,
+            "bytes_downloaded": 0,
+            "bytes_saved": 0,
+            "ranged_downloads": 0,
+            "bytes_resumed": 0,
+        }
+
+        with self._connect() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    validated_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_sha256 ON entries (sha256)")
+
+    # -------------------------------------------------
+    # Index helpers
+    # -------------------------------------------------
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.index_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _file_blob(self, path: str, sha256: str):
+        """Move a finished download at `path` into the store under its hash."""
+        object_path = self._object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            # Same content already cached under another URL: dedupe.
+            os.remove(path)
+        else:
+            # Blobs are only ever read (and cloned); keep them read-only.
+            os.chmod(path, 0o444)
+            os.replace(path, object_path)
+
+    def _count(self, **deltas):
+        with self._counters_lock:
+            for key, value in deltas.items():
+                self._counters[key] += value
+
+    def lookup(self, url: str):
+        """Return the index entry for `url` if its blob is still on disk."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM entries WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(self._object_path(row["sha256"])):
+                db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                return None
+            return dict(row)
+
+    def _touch(self, url: str, validated: bool):
+        now = time.time()
+        with self._connect() as db:
+            if validated:
+                db.execute("UPDATE entries SET last_access = ?, validated_at = ? WHERE url = ?", (now, now, url))
+            else:
+                db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (now, url))
+
+    # -------------------------------------------------
+    # Storing and linking blobs
+    # -------------------------------------------------
+    def _index(self, url: str, response, sha256: str, size: int) -> dict:
+        now = time.time()
+        entry = {
+            "url": url,
+            "sha256": sha256,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "validated_at": now,
+            "last_access": now,
+        }
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries VALUES "
+                "(:url, :sha256, :size, :etag, :last_modified, :validated_at, :last_access)",
+                entry,
+            )
+        self._count(misses=1, bytes_downloaded=size)
+        return entry
+
+    def _store(self, url: str, response, max_bytes: int = None) -> dict:
+        """Stream a response body into the blob store while hashing it (at most `max_bytes`)."""
+        writer = _BlobWriter(self, max_bytes)
+        try:
+            for chunk in response.iter_bytes(chunk_size=CHUNK_SIZE):
+                writer.write(chunk)
+            sha256, size = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        return self._index(url, response, sha256, size)
+
+    async def _astore(self, url: str, response, max_bytes: int = None) -> dict:
+        """Async counterpart of `_store`; writing, hashing and indexing run in threads."""
+        writer = await asyncio.to_thread(_BlobWriter, self, max_bytes)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                await asyncio.to_thread(writer.write, chunk)
+            sha256, size = await asyncio.to_thread(writer.commit)
+        except BaseException:
+            writer.abort()
+            raise
+        return await asyncio.to_thread(self._index, url, response, sha256, size)
+
+    @staticmethod
+    def _prepare_dest(dest_path: str):
+        """Create the parent of `dest_path` and unlink whatever is there, so writes never go through an old file."""
+        parent = os.path.dirname(dest_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+
+    def _link(self, entry: dict, dest_path: str):
+        """Give `dest_path` its own copy of the cached blob: a reflink where supported, else a copy."""
+        self._prepare_dest(dest_path)
+        source = self._object_path(entry["sha256"])
+        with open(source, "rb") as src, open(dest_path, "xb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    def evict(self):
+        """Drop least recently used blobs until the store fits in `max_bytes`."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT sha256, MAX(size) AS size, MAX(last_access) AS last_access "
+                "FROM entries GROUP BY sha256 ORDER BY last_access ASC"
+            ).fetchall()
+            total = sum(row["size"] for row in rows)
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM entries WHERE sha256 = ?", (row["sha256"],))
+                try:
+                    os.remove(self._object_path(row["sha256"]))
+                except FileNotFoundError:
+                    pass
+                total -= row["size"]
+                self._count(evictions=1)
+
+    def _hash_file(self, path: str):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _store_ranged(self, url: str, head, part: PartialDownload) -> dict:
+        """File a completed ranged download; only the non-resumed bytes count as downloaded."""
+        path = part.finish()
+        sha256, size = self._hash_file(path)
+        self._file_blob(path, sha256)
+        entry = self._index(url, head, sha256, size)
+        self._count(ranged_downloads=1, bytes_resumed=part.resumed_bytes, bytes_downloaded=-part.resumed_bytes)
+        return entry
+
+    def _plan_ranges(self, url: str, head, max_bytes: int = None):
+        """A PartialDownload when `url` is large and the server accepts ranges, else None."""
+        info = None if head is None else probe(head)
+        if info is not None and max_bytes is not None and info[0] > max_bytes:
+            raise DownloadTooLarge(f"{url} is {info[0]} bytes, more than {max_bytes}")
+        if info is None or info[0] < DOWNLOAD_PARALLEL_MIN_BYTES:
+            return None
+        return PartialDownload(self.tmp_dir, url, *info)
+
+    def _materialize(self, entry: dict, dest_path: str, decompress: bool) -> bool:
+        """
+        Place the cached blob at `dest_path`: cloned as is, or streamed
+        through the matching decompressor when `decompress` is set and the
+        blob is gzip/bzip2/xz. Returns whether it was decompressed.
+        """
+        source = self._object_path(entry["sha256"])
+        if decompress:
+            with open(source, "rb") as f:
+                magic = f.read(6)
+            for prefix, opener in DECOMPRESSORS:
+                if magic.startswith(prefix):
+                    self._prepare_dest(dest_path)
+                    with opener(source, "rb") as src, open(dest_path, "xb", buffering=CHUNK_SIZE) as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                    return True
+        self._link(entry, dest_path)
+        return False
+
+    # -------------------------------------------------
+    # Public API
+    # -------------------------------------------------
+    def _fresh(self, url: str, entry: dict) -> bool:
+        """Whether a cached entry may be served without contacting the server."""
+        if entry is None or time.time() - entry["validated_at"] >= self.fresh_seconds:
+            return False
+        self._touch(url, validated=False)
+        self._count(hits=1, bytes_saved=entry["size"])
+        return True
+
+    def _conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _not_modified(self, url: str, entry: dict) -> dict:
+        self._touch(url, validated=True)
+        self._count(revalidated=1, bytes_saved=entry["size"])
+        return entry
+
+    def _result(self, status: str, entry: dict, started: float, ranges: int = 0, resumed: int = 0,
+                decompressed: bool = False) -> dict:
+        seconds = time.monotonic() - started
+        transferred = entry["size"] - resumed if status == "miss" else 0
+        return {
+            "status": status,
+            "size": entry["size"],
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(transferred / 1024 ** 2 / seconds, 2) if transferred and seconds else 0.0,
+            "ranges": ranges,
+            "resumed_bytes": resumed,
+            "decompressed": decompressed,
+        }
+
+    def ensure(self, url: str, timeout: float = 60, max_bytes: int = None):
+        """
+        Make sure a current copy of `url` is in the cache, downloading only
+        when needed. Returns (status, entry, ranges fetched, resumed bytes);
+        see `fetch` for the statuses. The caller runs `evict` after a miss,
+        once it has linked the new blob where it needs it. With `max_bytes`,
+        a body announced or turning out larger raises DownloadTooLarge as
+        soon as that is known, and nothing is cached.
+        """
+        entry = self.lookup(url)
+        status, ranges, resumed = "miss", 0, 0
+        if self._fresh(url, entry):
+            return "hit", entry, ranges, resumed
+        client = get_http_client()
+        part = None
+        if entry is None:
+            try:
+                head = client.request("HEAD", url, headers=RANGE_PROBE_HEADERS, timeout=timeout)
+            except httpx.HTTPError:
+                head = None
+            part = self._plan_ranges(url, head, max_bytes)
+        if part is not None:
+            try:
+                ranges = fetch_ranges(url, part, timeout)
+                resumed = part.resumed_bytes
+                entry = self._store_ranged(url, head, part)
+            except RangeNotHonored:
+                # The file changed or ranges are refused after all: start over with a plain GET.
+                part.discard()
+                part = None
+            except BaseException:
+                # Keep the finished segments for the next attempt.
+                part.close()
+                raise
+        if part is None:
+            with client.stream("GET", url, headers=self._conditional_headers(entry), timeout=timeout) as response:
+                if entry is not None and response.status_code == 304:
+                    status = "revalidated"
+                    entry = self._not_modified(url, entry)
+                else:
+                    response.raise_for_status()
+                    entry = self._store(url, response, max_bytes)
+        return status, entry, ranges, resumed
+
+    async def aensure(self, url: str, timeout: float = 60, max_bytes: int = None):
+        """
+        Async counterpart of `ensure`, using the async HTTP client; the index
+        (SQLite) and file work (hashing, preallocating, filing blobs) run in
+        threads, so the event loop only waits on the network.
+        """
+        entry = await asyncio.to_thread(self.lookup, url)
+        status, ranges, resumed = "miss", 0, 0
+        if await asyncio.to_thread(self._fresh, url, entry):
+            return "hit", entry, ranges, resumed
+        client = get_http_client()
+        part = None
+        if entry is None:
+            try:
+                head = await client.arequest("HEAD", url, headers=RANGE_PROBE_HEADERS, timeout=timeout)
+            except httpx.HTTPError:
+                head = None
+            part = await asyncio.to_thread(self._plan_ranges, url, head, max_bytes)
+        if part is not None:
+            try:
+                ranges = await afetch_ranges(url, part, timeout)
+                resumed = part.resumed_bytes
+                entry = await asyncio.to_thread(self._store_ranged, url, head, part)
+            except RangeNotHonored:
+                await asyncio.to_thread(part.discard)
+                part = None
+            except BaseException:
+                part.close()
+                raise
+        if part is None:
+            async with client.astream("GET", url, headers=self._conditional_headers(entry), timeout=timeout) as response:
+                if entry is not None and response.status_code == 304:
+                    status = "revalidated"
+                    entry = await asyncio.to_thread(self._not_modified, url, entry)
+                else:
+                    response.raise_for_status()
+                    entry = await self._astore(url, response, max_bytes)
+        return status, entry, ranges, resumed
+
+    def fetch(self, url: str, dest_path: str, timeout: float = 60, decompress: bool = False) -> dict:
+        """
+        Materialize `url` at `dest_path`, downloading only when needed.
+
+        The returned dict has the cache "status" ("hit": served without
+        contacting the server, "revalidated": the server answered 304 Not
+        Modified, "miss": body downloaded and stored), the size, elapsed
+        seconds, throughput and how many byte ranges were fetched.
+
+        On a miss the URL is probed with HEAD first: large files on servers
+        that accept byte ranges are fetched over parallel connections into a
+        resumable partial file (see ranged_download.py); everything else is
+        streamed with a single GET.
+        """
+        started = time.monotonic()
+        status, entry, ranges, resumed = self.ensure(url, timeout)
+        decompressed = self._materialize(entry, dest_path, decompress)
+        if status == "miss":
+            self.evict()
+        return self._result(status, entry, started, ranges, resumed, decompressed)
+
+    async def afetch(self, url: str, dest_path: str, timeout: float = 60, decompress: bool = False) -> dict:
+        """Async counterpart of `fetch`."""
+        started = time.monotonic()
+        status, entry, ranges, resumed = await self.aensure(url, timeout)
+        decompressed = await asyncio.to_thread(self._materialize, entry, dest_path, decompress)
+        if status == "miss":
+            await asyncio.to_thread(self.evict)
+        return self._result(status, entry, started, ranges, resumed, decompressed)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters plus the current size of the blob store."""
+        with self._counters_lock:
+            snapshot = dict(self._counters)
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT COUNT(*) AS entries, "
+                "(SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY sha256)) AS bytes "
+                "FROM entries"
+            ).fetchone()
+        snapshot["entries"] = row["entries"]
+        snapshot["bytes"] = row["bytes"]
+        snapshot["max_bytes"] = self.max_bytes
+        return snapshot
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    """Return the process-wide download cache, creating it on first use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DownloadCache()
+        return _CACHE
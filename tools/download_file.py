@@ -1,9 +1,76 @@
 from langchain_core.tools import tool
-import requests
+from .download_cache import get_download_cache
+from .http_client import HTTP_TIMEOUT
+from .prefetch import get_prefetcher
+from .workspace import current_workspace
+from .run_code import run_code
+from .tabular import is_tabular, check_parquet
+from .time_budget import call_timeout
+import asyncio
+import json
 import os
 
+# Ingest tabular downloads (Parquet copy + schema preview) up to this size;
+# DOWNLOAD_INGEST=0 turns it off.
+DOWNLOAD_INGEST = os.getenv("DOWNLOAD_INGEST", "1") == "1"
+DOWNLOAD_INGEST_MAX_BYTES = int(os.getenv("DOWNLOAD_INGEST_MAX_BYTES", str(512 * 1024 ** 2)))
+
+INGEST_SCRIPT = """import json
+from tabular import ingest
+print(json.dumps(ingest({filename!r})))
+"""
+
+def _describe(filename: str, result: dict) -> str:
+    """One line for the agent: where the file is, how big it is and how it got there."""
+    size = result["size"]
+    size_text = f"{size / 1024 ** 2:.1f} MB" if size >= 1024 ** 2 else f"{size} bytes"
+    if result["status"] == "miss":
+        how = f"downloaded in {result['seconds']}s ({result['mb_per_second']} MB/s"
+        if result["ranges"]:
+            how += f", {result['ranges']} parallel ranges"
+        if result["resumed_bytes"]:
+            how += f", resumed after {result['resumed_bytes']} bytes"
+        how += ")"
+    elif result.get("prefetched"):
+        how = "prefetched while the page was read"
+    else:
+        how = "served from cache"
+    if result["decompressed"]:
+        how += ", decompressed"
+    return f"{filename} ({size_text}, {how})"
+
+
+def _should_ingest(filename: str, result: dict) -> bool:
+    if not (DOWNLOAD_INGEST and is_tabular(filename) and result["size"] <= DOWNLOAD_INGEST_MAX_BYTES):
+        return False
+    # Without pyarrow the preview is still useful; the fallback is only logged.
+    check_parquet()
+    return True
+
+
+def _describe_table(filename: str, output: dict) -> str:
+    """Schema preview appended to the tool result; empty when ingest failed."""
+    if output.get("return_code") != 0:
+        return ""
+    try:
+        info = json.loads(output["stdout"].strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return ""
+    columns = ", ".join(f"{name} ({dtype})" for name, dtype in info["columns"].items())
+    if info["column_count"] > len(info["columns"]):
+        columns += f", ... ({info['column_count']} columns in total)"
+    lines = [
+        f"\nRows: {info['rows']}",
+        f"Columns: {columns}",
+        f"Preview:\n{info['preview']}",
+    ]
+    if info["columnar"]:
+        lines.append(f'Load it with: from tabular import load_table; df = load_table("{filename}")')
+    return "\n".join(lines)
+
+
 @tool
-def download_file(url: str, filename: str) -> str:
+def download_file(url: str, filename: str, decompress: bool = False) -> str:
     """
     Download a file from a URL and save it with the given filename
     in the current working directory.
@@ -11,21 +78,69 @@ def download_file(url: str, filename: str) -> str:
     Args:
         url (str): Direct URL to the file.
         filename (str): The filename to save the downloaded content as.
+        decompress (bool): If the file is gzip/bzip2/xz compressed, save the
+            decompressed content instead (name `filename` accordingly, e.g.
+            "data.csv" for "data.csv.gz").
 
     Returns:
-        str: Full path to the saved file.
+        str: The saved filename followed by its size and download details.
     """
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        directory_name = "LLMFiles"
-        os.makedirs(directory_name, exist_ok=True)
-        path = os.path.join(directory_name, filename)
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
-        return filename
+        # Files land in the current agent run's private workspace.
+        workspace = current_workspace()
+        workspace.check_quota()
+        path = workspace.resolve(filename)
+
+        # Served from the shared content-addressed cache when possible
+        # ("hit"/"revalidated"); only a "miss" transfers the body. A file the
+        # page renderer already started prefetching is waited for instead.
+        prefetched = get_prefetcher().wait(url)
+        # Bounded by the time the tool call has left (see time_budget.py).
+        result = get_download_cache().fetch(url, path, call_timeout(HTTP_TIMEOUT), decompress)
+        result["prefetched"] = prefetched and result["status"] == "hit"
+        print(f"\nDownloaded {url} -> {path} (cache {result['status']})")
+
+        try:
+            workspace.check_quota()
+        except Exception:
+            os.remove(path)
+            raise
+
+        summary = _describe(filename, result)
+        if _should_ingest(filename, result):
+            # Parse once in a warm code worker: Parquet copy + schema preview,
+            # so the next step needs neither a df.head() turn nor a re-parse.
+            summary += _describe_table(filename, run_code.func(INGEST_SCRIPT.format(filename=filename)))
+        return summary
+    except Exception as e:
+        return f"Error downloading file: {str(e)}"
+
+
+async def _adownload_file(url: str, filename: str, decompress: bool = False) -> str:
+    """Async variant of download_file, used when the graph runs with `ainvoke`."""
+    try:
+        workspace = current_workspace()
+        # The quota check walks the whole workspace: keep it off the event loop.
+        await asyncio.to_thread(workspace.check_quota)
+        path = workspace.resolve(filename)
+
+        prefetched = await get_prefetcher().await_prefetch(url)
+        result = await get_download_cache().afetch(url, path, decompress=decompress)
+        result["prefetched"] = prefetched and result["status"] == "hit"
+        print(f"\nDownloaded {url} -> {path} (cache {result['status']})")
+
+        try:
+            await asyncio.to_thread(workspace.check_quota)
+        except Exception:
+            os.remove(path)
+            raise
+
+        summary = _describe(filename, result)
+        if _should_ingest(filename, result):
+            summary += _describe_table(filename, await run_code.coroutine(INGEST_SCRIPT.format(filename=filename)))
+        return summary
     except Exception as e:
-        return f"Error downloading file: {str(e)}"
\ No newline at end of file
+        return f"Error downloading file: {str(e)}"
+
+
+download_file.coroutine = _adownload_file
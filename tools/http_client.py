@@ -0,0 +1,280 @@
+import asyncio
+import atexit
+import email.utils
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+import httpx
+
+# Client tuning knobs (overridable through the environment / .env file)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "1") == "1"
+
+# Responses worth retrying. Non-idempotent requests (POST answer submissions)
+# are only retried when the server explicitly refused them or the request
+# never reached it, so an answer is never submitted twice.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_STATUSES_UNSAFE = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed via the httpx[http2] extra)
+        return True
+    except ImportError:
+        return False
+
+
+def _retry_after_seconds(response: httpx.Response):
+    """Parse a Retry-After header (delta-seconds or HTTP-date), if present."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    One pooled HTTP client shared by every network tool in the process.
+
+    Wraps an `httpx.Client` (and a lazily created `httpx.AsyncClient` for
+    async callers) with keep-alive connection pooling, HTTP/2 when `h2` is
+    installed, per-host concurrency caps, default timeouts and jittered
+    exponential-backoff retries on transient failures. Request latency and
+    connection reuse are recorded for GET /stats.
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 max_retries: int = HTTP_MAX_RETRIES, http2: bool = HTTP_ENABLE_HTTP2):
+        self.max_retries = max(0, max_retries)
+        self.max_connections_per_host = max(1, max_connections_per_host)
+        self.http2 = http2 and _http2_available()
+        self._client_kwargs = dict(
+            http2=self.http2,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self._client = httpx.Client(**self._client_kwargs)
+        self._async_client = None
+        self._async_loop = None
+
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._async_host_slots = {}
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "new_connections": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+
+    # -------------------------------------------------
+    # Bookkeeping
+    # -------------------------------------------------
+    def _record(self, latency: float = None, **counters):
+        with self._lock:
+            for key, value in counters.items():
+                self._stats[key] += value
+            if latency is not None:
+                self._stats["latency_seconds_total"] += latency
+                self._stats["latency_seconds_max"] = max(self._stats["latency_seconds_max"], latency)
+
+    def _trace(self, event_name, info):
+        # httpcore reports a TCP connect only when no pooled connection was reusable.
+        if event_name == "connection.connect_tcp.complete":
+            self._record(new_connections=1)
+
+    async def _atrace(self, event_name, info):
+        self._trace(event_name, info)
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(str(url)).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_slots[host]
+
+    def _async_host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(str(url)).netloc
+        with self._lock:
+            if host not in self._async_host_slots:
+                self._async_host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+            return self._async_host_slots[host]
+
+    def _should_retry(self, method: str, attempt: int, response: httpx.Response = None,
+                      error: Exception = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if error is not None:
+            if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                return True
+            return idempotent and isinstance(error, httpx.TransportError)
+        statuses = RETRY_STATUSES if idempotent else RETRY_STATUSES_UNSAFE
+        return response.status_code in statuses
+
+    def _backoff(self, attempt: int, response: httpx.Response = None) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After."""
+        delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+        if response is not None:
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, HTTP_BACKOFF_MAX))
+        return delay
+
+    # -------------------------------------------------
+    # Synchronous API
+    # -------------------------------------------------
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        Send a request with retries and yield the (unread) streaming response.
+        The per-host slot is held until the block exits.
+        """
+        extensions = dict(kwargs.pop("extensions", None) or {}, trace=self._trace)
+        with self._host_slot(url):
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    request = self._client.build_request(method, url, extensions=extensions, **kwargs)
+                    response = self._client.send(request, stream=True)
+                except httpx.TransportError as e:
+                    self._record(requests=1, latency=time.monotonic() - started)
+                    if not self._should_retry(method, attempt, error=e):
+                        self._record(failures=1)
+                        raise
+                    self._record(retries=1)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._record(requests=1, latency=time.monotonic() - started)
+                if self._should_retry(method, attempt, response=response):
+                    response.close()
+                    self._record(retries=1)
+                    time.sleep(self._backoff(attempt, response))
+                    attempt += 1
+                    continue
+                break
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request with retries and return the fully read response."""
+        with self.stream(method, url, **kwargs) as response:
+            response.read()
+            return response
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    # -------------------------------------------------
+    # Asynchronous API
+    # -------------------------------------------------
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient's pool is tied to the loop it was first used on.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(**self._client_kwargs)
+            self._async_loop = loop
+            self._async_host_slots = {}
+        return self._async_client
+
+    @asynccontextmanager
+    async def astream(self, method: str, url: str, **kwargs):
+        """Async counterpart of `stream`."""
+        client = self._get_async_client()
+        extensions = dict(kwargs.pop("extensions", None) or {}, trace=self._atrace)
+        async with self._async_host_slot(url):
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    request = client.build_request(method, url, extensions=extensions, **kwargs)
+                    response = await client.send(request, stream=True)
+                except httpx.TransportError as e:
+                    self._record(requests=1, latency=time.monotonic() - started)
+                    if not self._should_retry(method, attempt, error=e):
+                        self._record(failures=1)
+                        raise
+                    self._record(retries=1)
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._record(requests=1, latency=time.monotonic() - started)
+                if self._should_retry(method, attempt, response=response):
+                    await response.aclose()
+                    self._record(retries=1)
+                    await asyncio.sleep(self._backoff(attempt, response))
+                    attempt += 1
+                    continue
+                break
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Async counterpart of `request`."""
+        async with self.astream(method, url, **kwargs) as response:
+            await response.aread()
+            return response
+
+    # -------------------------------------------------
+    # Stats and shutdown
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+        requests = snapshot["requests"] or 1
+        snapshot["connections_reused"] = max(0, snapshot["requests"] - snapshot["new_connections"])
+        snapshot["latency_seconds_avg"] = snapshot["latency_seconds_total"] / requests
+        snapshot["http2"] = self.http2
+        return snapshot
+
+    def close(self):
+        self._client.close()
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the process-wide HTTP client, creating it on first use."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient()
+            atexit.register(_CLIENT.close)
+        return _CLIENT
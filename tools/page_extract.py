@@ -0,0 +1,185 @@
+import base64
+import binascii
+import os
+import re
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+# Size cap of the compact page representation (overridable through the environment / .env file)
+PAGE_MAX_CHARS = int(os.getenv("PAGE_MAX_CHARS", "20000"))
+
+# Extensions of links that point at downloadable files rather than pages.
+FILE_EXTENSIONS = (
+    ".csv", ".tsv", ".json", ".xml", ".txt", ".pdf", ".zip", ".gz", ".parquet",
+    ".xls", ".xlsx", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg",
+    ".mp3", ".wav", ".ogg", ".opus", ".m4a", ".mp4", ".webm",
+)
+MEDIA_TAGS = ["img", "audio", "video", "source", "track", "embed", "iframe"]
+# Markup that never contributes visible text.
+INVISIBLE_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "head"]
+
+_ATOB = re.compile(r"atob\(\s*([\"'`])([A-Za-z0-9+/=\s]+)\1\s*\)")
+_DATA_URI = re.compile(r"^data:([\w/+.-]*)(?:;[\w-]+=[^;,]*)*;base64,(.*)$", re.S)
+
+
+def _decode_base64(data: str):
+    """Decode base64 to text; None when it is not valid base64 text."""
+    try:
+        raw = base64.b64decode("".join(data.split()), validate=True)
+        return raw.decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _decoded_snippets(soup) -> list:
+    """Text hidden in `atob("...")` calls in scripts and in base64 text data: URIs."""
+    snippets = []
+    for script in soup.find_all("script"):
+        for _, data in _ATOB.findall(script.string or ""):
+            text = _decode_base64(data)
+            if text and text.strip():
+                snippets.append(text.strip())
+    for tag in soup.find_all(["a", "iframe", "object", "embed"]):
+        uri = tag.get("href") or tag.get("src") or tag.get("data") or ""
+        match = _DATA_URI.match(uri)
+        if match and (match.group(1).startswith("text/") or match.group(1) in ("", "application/json")):
+            text = _decode_base64(match.group(2))
+            if text and text.strip():
+                snippets.append(text.strip())
+    return snippets
+
+
+def _table_rows(table) -> list:
+    rows = []
+    for tr in table.find_all("tr"):
+        cells = [cell.get_text(" ", strip=True) for cell in tr.find_all(["th", "td"])]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return rows
+
+
+def _form_summary(form, base_url: str) -> str:
+    action = urljoin(base_url, form.get("action") or "")
+    method = (form.get("method") or "get").upper()
+    fields = []
+    for field in form.find_all(["input", "select", "textarea", "button"]):
+        name = field.get("name") or field.get("id")
+        if not name:
+            continue
+        kind = field.get("type") or field.name
+        value = field.get("value")
+        fields.append(f"{name}({kind})" + (f"={value}" if value else ""))
+    return f"{method} {action}; fields: {', '.join(fields) or 'none'}"
+
+
+def is_file_url(url: str) -> bool:
+    return url.lower().split("?")[0].endswith(FILE_EXTENSIONS)
+
+
+def _collect_links(soup, base_url: str):
+    """Return (page links, file/media links, file URLs) of a parsed page."""
+    links, files, file_urls = [], [], []
+    seen = set()
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if href.startswith(("javascript:", "data:", "#")):
+            continue
+        url = urljoin(base_url, href)
+        if url in seen:
+            continue
+        seen.add(url)
+        text = a.get_text(" ", strip=True)
+        entry = f"- {text} -> {url}" if text else f"- {url}"
+        if is_file_url(url):
+            files.append(entry)
+            file_urls.append(url)
+        else:
+            links.append(entry)
+    for tag in soup.find_all(MEDIA_TAGS):
+        src = tag.get("src") or tag.get("data")
+        if src and not src.startswith("data:"):
+            url = urljoin(base_url, src)
+            if url not in seen:
+                seen.add(url)
+                files.append(f"- <{tag.name}> {url}")
+                if is_file_url(url):
+                    file_urls.append(url)
+    return links, files, file_urls
+
+
+def file_links(html: str, base_url: str) -> list:
+    """Absolute URLs of the downloadable files a page links to or embeds."""
+    return _collect_links(BeautifulSoup(html, "html.parser"), base_url)[2]
+
+
+def _truncated(chars: int) -> str:
+    return (
+        f"\n...[truncated {chars} characters; "
+        "call again with mode='html' or a larger max_chars for more]"
+    )
+
+
+def extract_compact(html: str, base_url: str, max_chars: int = PAGE_MAX_CHARS, file_urls: list = None) -> str:
+    """
+    Reduce a rendered page to what the agent actually reads: visible text,
+    links with absolute URLs, file/media links, forms, tables as rows and any
+    base64-encoded text embedded in scripts or data: URIs. Beyond `max_chars`
+    characters the tables and then the text are cut; forms, file links and
+    links, which the agent acts on, are always kept whole. When `file_urls` is
+    given, the URLs of the downloadable files found are appended to it.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    decoded = _decoded_snippets(soup)
+
+    links, files, found = _collect_links(soup, base_url)
+    if file_urls is not None:
+        file_urls.extend(found)
+
+    forms = [f"- {_form_summary(form, base_url)}" for form in soup.find_all("form")]
+
+    tables = []
+    for i, table in enumerate(soup.find_all("table"), 1):
+        rows = _table_rows(table)
+        if rows:
+            tables.append(f"Table {i}:\n" + "\n".join(rows))
+        # Tables are rendered as rows below; keep them out of the text.
+        table.decompose()
+
+    for tag in soup.find_all(INVISIBLE_TAGS):
+        tag.decompose()
+    body = soup.body or soup
+    lines = [line.strip() for line in body.get_text("\n").splitlines()]
+    text = "\n".join(line for line in lines if line) or "(no visible text)"
+    tables = "\n\n".join(tables)
+
+    def compose(text, tables):
+        sections = [f"URL: {base_url}"]
+        if title:
+            sections.append(f"Title: {title}")
+        sections.append("TEXT:\n" + text)
+        if decoded:
+            sections.append("DECODED CONTENT:\n" + "\n---\n".join(decoded))
+        if forms:
+            sections.append("FORMS:\n" + "\n".join(forms))
+        if tables:
+            sections.append("TABLES:\n" + tables)
+        if files:
+            sections.append("FILES AND MEDIA:\n" + "\n".join(files))
+        if links:
+            sections.append("LINKS:\n" + "\n".join(links))
+        return "\n\n".join(sections)
+
+    result = compose(text, tables)
+    if max_chars and len(result) > max_chars:
+        # Trim the bulky sections only, tables first, so the sections after
+        # them (file links and links) survive the cut.
+        over = len(result) - max_chars
+        cut_tables = min(over, len(tables))
+        cut_text = min(over - cut_tables, len(text))
+        if cut_tables:
+            tables = tables[:len(tables) - cut_tables] + _truncated(cut_tables)
+        if cut_text:
+            text = text[:len(text) - cut_text] + _truncated(cut_text)
+        result = compose(text, tables)
+    return result
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .download_cache import DownloadTooLarge, get_download_cache
+from .time_budget import call_timeout
+
+# Prefetch knobs (overridable through the environment / .env file)
+# PREFETCH=0 turns speculative downloads off.
+PREFETCH = os.getenv("PREFETCH", "1") == "1"
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+# At most this many files per rendered page, each at most this large.
+PREFETCH_MAX_FILES = int(os.getenv("PREFETCH_MAX_FILES", "8"))
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", str(64 * 1024 ** 2)))
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "60"))
+
+# Prefetch records remembered for matching later download_file calls.
+MAX_TRACKED = 1000
+
+
+class Prefetcher:
+    """
+    Speculative downloads of the files a rendered page links to.
+
+    While the LLM reads a page, its CSV/PDF/audio links are fetched into the
+    shared download cache in the background, on a few threads. A later
+    download_file for one of those URLs waits for the prefetch if it is
+    still running and is then served from the cache (a clone into the run
+    workspace) instead of starting its own transfer. Downloads are aborted
+    once a file is known (from its HEAD) or read to be larger than
+    `max_bytes`.
+    """
+
+    def __init__(self, concurrency: int = PREFETCH_CONCURRENCY, max_files: int = PREFETCH_MAX_FILES,
+                 max_bytes: int = PREFETCH_MAX_BYTES, timeout: float = PREFETCH_TIMEOUT):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._stats = {
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "skipped_too_large": 0,
+            "bytes": 0,
+            "hits": 0,
+            "misses": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _fetch(self, url: str):
+        cache = get_download_cache()
+        try:
+            status, entry, _, _ = cache.ensure(url, self.timeout, self.max_bytes)
+        except DownloadTooLarge:
+            self._count(skipped_too_large=1)
+            raise
+        except Exception:
+            self._count(failed=1)
+            raise
+        if status == "miss":
+            cache.evict()
+        self._count(completed=1, bytes=entry["size"] if status == "miss" else 0)
+
+    def prefetch(self, urls) -> int:
+        """Start background downloads of `urls` (at most `max_files`); returns how many were started."""
+        started = 0
+        with self._lock:
+            for url in urls:
+                if started >= self.max_files:
+                    break
+                if url in self._jobs and not self._jobs[url].done():
+                    continue
+                self._jobs[url] = self._executor.submit(self._fetch, url)
+                self._jobs.move_to_end(url)
+                started += 1
+            while len(self._jobs) > MAX_TRACKED:
+                self._jobs.popitem(last=False)
+            self._stats["started"] += started
+        return started
+
+    def _claim(self, url: str):
+        with self._lock:
+            job = self._jobs.pop(url, None)
+            if job is None:
+                self._stats["misses"] += 1
+        return job
+
+    def _settle(self, started: float, hit: bool) -> bool:
+        self._count(wait_seconds_total=time.monotonic() - started, **{"hits" if hit else "misses": 1})
+        return hit
+
+    def wait(self, url: str) -> bool:
+        """
+        Called by download_file before fetching `url`: waits for its prefetch,
+        if any. Returns True when the prefetch succeeded, so the fetch that
+        follows is a cache hit.
+        """
+        job = self._claim(url)
+        if job is None:
+            return False
+        started = time.monotonic()
+        try:
+            job.result(call_timeout(self.timeout))
+        except Exception:
+            return self._settle(started, False)
+        return self._settle(started, True)
+
+    async def await_prefetch(self, url: str) -> bool:
+        """Async counterpart of `wait`."""
+        job = self._claim(url)
+        if job is None:
+            return False
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except Exception:
+            return self._settle(started, False)
+        return self._settle(started, True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = sum(1 for job in self._jobs.values() if not job.done())
+        claimed = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / claimed, 3) if claimed else 0.0
+        return snapshot
+
+
+_PREFETCHER = None
+_PREFETCHER_LOCK = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """Return the process-wide Prefetcher, creating it on first use."""
+    global _PREFETCHER
+    with _PREFETCHER_LOCK:
+        if _PREFETCHER is None:
+            _PREFETCHER = Prefetcher()
+        return _PREFETCHER
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from importlib import metadata
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+# Dependency provisioning knobs (overridable through the environment / .env file)
+# Overlay environments live here, one directory per installed batch.
+DEPS_DIR = os.getenv("DEPS_DIR", os.path.join("LLMFiles", ".deps"))
+# Local directory of pre-built wheels, searched before (or, offline, instead of) the index.
+DEPS_WHEELHOUSE = os.getenv("DEPS_WHEELHOUSE", "wheelhouse")
+# DEPS_OFFLINE=1 installs from the wheelhouse / installer cache only.
+DEPS_OFFLINE = os.getenv("DEPS_OFFLINE", "0") == "1"
+# Requests arriving within this window are installed by one installer process.
+DEPS_BATCH_WINDOW = float(os.getenv("DEPS_BATCH_WINDOW", "0.2"))
+DEPS_INSTALL_TIMEOUT = float(os.getenv("DEPS_INSTALL_TIMEOUT", "300"))
+
+
+def _installed_version(name: str, path=None):
+    """Version of distribution `name` in the interpreter (or in `path`), else None."""
+    try:
+        if path is None:
+            return metadata.version(name)
+        for dist in metadata.distributions(path=[path]):
+            if canonicalize_name(dist.metadata["Name"] or "") == canonicalize_name(name):
+                return dist.version
+    except metadata.PackageNotFoundError:
+        pass
+    return None
+
+
+def _satisfies(requirement: Requirement, version) -> bool:
+    return version is not None and requirement.specifier.contains(version, prereleases=True)
+
+
+class Provisioner:
+    """
+    Makes packages importable for run_code without touching the project.
+
+    A request is answered, cheapest first, by:
+      1. the interpreter itself, when the package is already installed;
+      2. an overlay environment a previous install left in `root`;
+      3. a new overlay, installed with `uv pip install --target` (or pip)
+         from the local wheelhouse.
+
+    Installs never edit pyproject.toml or uv.lock. Requests that arrive within
+    `batch_window` of each other, from any run, share one installer process,
+    and a requirement that is already being installed is waited on rather
+    than installed twice. Overlays are immutable once published, so the
+    directories handed to one run never change underneath it.
+    """
+
+    def __init__(self, root: str = DEPS_DIR, wheelhouse: str = DEPS_WHEELHOUSE,
+                 offline: bool = DEPS_OFFLINE, batch_window: float = DEPS_BATCH_WINDOW):
+        self.root = os.path.abspath(root)
+        self.envs_dir = os.path.join(self.root, "envs")
+        self.wheelhouse = os.path.abspath(wheelhouse)
+        self.offline = offline
+        self.batch_window = batch_window
+        os.makedirs(self.envs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._inflight = {}
+        self._timer = None
+        self._stats = {
+            "requests": 0,
+            "already_installed": 0,
+            "reused": 0,
+            "installed": 0,
+            "batches": 0,
+            "failed": 0,
+            "install_seconds_total": 0.0,
+        }
+
+    # -------------------------------------------------
+    # Planning
+    # -------------------------------------------------
+    def _overlays(self) -> list:
+        try:
+            names = sorted(os.listdir(self.envs_dir))
+        except OSError:
+            return []
+        return [os.path.join(self.envs_dir, n) for n in names if not n.startswith(".")]
+
+    def _find_overlay(self, requirement: Requirement):
+        for env in self._overlays():
+            if _satisfies(requirement, _installed_version(requirement.name, env)):
+                return env
+        return None
+
+    def _plan(self, specs: list):
+        """
+        Sort `specs` into already installed / reused / to install. Returns the
+        report dict and {spec: Future} for the requirements being installed.
+        """
+        report = {"present": [], "reused": [], "installed": [], "failed": {}, "site_dirs": []}
+        futures = {}
+        for spec in specs:
+            try:
+                requirement = Requirement(spec)
+            except InvalidRequirement as e:
+                report["failed"][spec] = f"invalid requirement: {e}"
+                continue
+            if requirement.marker is not None and not requirement.marker.evaluate():
+                report["present"].append(spec)
+                continue
+            if not requirement.url and _satisfies(requirement, _installed_version(requirement.name)):
+                report["present"].append(spec)
+                continue
+            env = None if requirement.url else self._find_overlay(requirement)
+            if env is not None:
+                report["reused"].append(spec)
+                report["site_dirs"].append(env)
+                continue
+            futures[spec] = self._enqueue(str(requirement))
+
+        with self._lock:
+            self._stats["requests"] += len(specs)
+            self._stats["already_installed"] += len(report["present"])
+            self._stats["reused"] += len(report["reused"])
+        return report, futures
+
+    def _enqueue(self, requirement: str) -> Future:
+        with self._lock:
+            future = self._inflight.get(requirement)
+            if future is None:
+                future = Future()
+                self._inflight[requirement] = future
+                self._pending.append(requirement)
+                if self._timer is None:
+                    self._timer = threading.Timer(self.batch_window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            return future
+
+    @staticmethod
+    def _settle(report: dict, spec: str, future: Future):
+        if not future.done():
+            report["failed"][spec] = "still installing; call add_dependencies again shortly"
+            return
+        try:
+            report["site_dirs"].append(future.result(timeout=0))
+            report["installed"].append(spec)
+        except Exception as e:
+            report["failed"][spec] = str(e)
+
+    def provision(self, specs: list, timeout: float = DEPS_INSTALL_TIMEOUT) -> dict:
+        """
+        Make `specs` (PEP 508 requirement strings) importable. Returns the lists
+        of specs that were present, reused and installed, failures with their
+        reason, and the overlay directories to add to the run's sys.path.
+        """
+        report, futures = self._plan(specs)
+        deadline = time.monotonic() + timeout
+        for spec, future in futures.items():
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+            self._settle(report, spec, future)
+        report["site_dirs"] = list(dict.fromkeys(report["site_dirs"]))
+        return report
+
+    async def aprovision(self, specs: list, timeout: float = DEPS_INSTALL_TIMEOUT) -> dict:
+        """Async counterpart of `provision`; waits for the installer without holding a thread."""
+        report, futures = self._plan(specs)
+        if futures:
+            waiting = [asyncio.wrap_future(f) for f in futures.values()]
+            await asyncio.wait(waiting, timeout=timeout)
+        for spec, future in futures.items():
+            self._settle(report, spec, future)
+        report["site_dirs"] = list(dict.fromkeys(report["site_dirs"]))
+        return report
+
+    # -------------------------------------------------
+    # Installing
+    # -------------------------------------------------
+    def _command(self, target: str, requirements: list) -> list:
+        options = ["--target", target]
+        if os.path.isdir(self.wheelhouse):
+            options += ["--find-links", self.wheelhouse]
+        if self.offline:
+            options.append("--no-index")
+        uv = shutil.which("uv")
+        if uv:
+            # Same interpreter as the code workers; uv's cache makes repeat installs mostly hardlinks.
+            return [uv, "pip", "install", "--python", sys.executable] + options + requirements
+        return [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--no-input"] + options + requirements
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._timer = None
+        if not batch:
+            return
+
+        started = time.monotonic()
+        key = hashlib.sha256("\n".join(sorted(batch)).encode()).hexdigest()[:16]
+        env = os.path.join(self.envs_dir, key)
+        staging = os.path.join(self.envs_dir, f".{key}-{os.getpid()}-{threading.get_ident()}")
+        error = None
+        try:
+            if not os.path.isdir(env):
+                shutil.rmtree(staging, ignore_errors=True)
+                proc = subprocess.run(
+                    self._command(staging, batch),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    timeout=DEPS_INSTALL_TIMEOUT,
+                )
+                if proc.returncode != 0:
+                    raise RuntimeError(proc.stderr.strip() or f"installer exited with code {proc.returncode}")
+                try:
+                    # Publish atomically; another process may have published the same batch.
+                    os.rename(staging, env)
+                except OSError:
+                    if not os.path.isdir(env):
+                        raise
+        except Exception as e:
+            error = e
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["install_seconds_total"] += time.monotonic() - started
+            self._stats["installed" if error is None else "failed"] += len(batch)
+            futures = [self._inflight.pop(r) for r in batch]
+        for future in futures:
+            if error is None:
+                future.set_result(env)
+            else:
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["overlays"] = len(self._overlays())
+        return snapshot
+
+
+_PROVISIONER = None
+_PROVISIONER_LOCK = threading.Lock()
+
+
+def get_provisioner() -> Provisioner:
+    """Return the process-wide Provisioner, creating it on first use."""
+    global _PROVISIONER
+    with _PROVISIONER_LOCK:
+        if _PROVISIONER is None:
+            _PROVISIONER = Provisioner()
+        return _PROVISIONER
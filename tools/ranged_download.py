@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import get_http_client
+
+# Ranged download tuning (overridable through the environment / .env file)
+# Files at least this large are fetched in parallel byte ranges when the server allows it.
+DOWNLOAD_PARALLEL_MIN_BYTES = int(os.getenv("DOWNLOAD_PARALLEL_MIN_BYTES", str(16 * 1024 ** 2)))
+DOWNLOAD_PARALLEL_CONNECTIONS = int(os.getenv("DOWNLOAD_PARALLEL_CONNECTIONS", "4"))
+DOWNLOAD_SEGMENT_BYTES = int(os.getenv("DOWNLOAD_SEGMENT_BYTES", str(8 * 1024 ** 2)))
+
+CHUNK_SIZE = 1024 * 1024
+# Ranges address the raw bytes, so transparent compression must be off.
+RANGE_HEADERS = {"Accept-Encoding": "identity"}
+
+
+class RangeNotHonored(Exception):
+    """The server answered a range request with something other than 206 (e.g. the file changed)."""
+
+
+def probe(head_response):
+    """
+    Inspect a HEAD response. Returns (size, validator) when the body can be
+    fetched in byte ranges, else None. The validator (strong ETag or
+    Last-Modified) guards every range request through If-Range.
+    """
+    headers = head_response.headers
+    if head_response.status_code != 200 or headers.get("Accept-Ranges", "").lower() != "bytes":
+        return None
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        size = int(headers.get("Content-Length", ""))
+    except ValueError:
+        return None
+    etag = headers.get("ETag")
+    validator = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified")
+    return size, validator
+
+
+class PartialDownload:
+    """
+    A preallocated partial file plus a JSON sidecar listing finished segments.
+
+    The partial is keyed by URL; it is reused after an interruption as long
+    as the size and validator still match, so only missing segments are
+    fetched again. Segments are written in place with os.pwrite, which lets
+    several connections fill one file concurrently.
+    """
+
+    def __init__(self, tmp_dir: str, url: str, size: int, validator: str,
+                 segment_bytes: int = DOWNLOAD_SEGMENT_BYTES):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        self.path = os.path.join(tmp_dir, f"{key}.part")
+        self.meta_path = os.path.join(tmp_dir, f"{key}.part.json")
+        self.size = size
+        self.validator = validator
+        self.segment_bytes = max(CHUNK_SIZE, segment_bytes)
+        self._lock = threading.Lock()
+
+        meta = self._load_meta()
+        if meta.get("size") == size and meta.get("validator") == validator and validator and os.path.exists(self.path):
+            self.done = set(meta.get("done", []))
+        else:
+            self.done = set()
+            self._save_meta()
+        self.resumed_bytes = sum(end - start + 1 for i, start, end in self._all_segments() if i in self.done)
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size != size:
+            # Reserve the whole file up front so segment writes never extend it.
+            os.ftruncate(self._fd, size)
+            if hasattr(os, "posix_fallocate") and size:
+                try:
+                    os.posix_fallocate(self._fd, 0, size)
+                except OSError:
+                    pass
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"size": self.size, "validator": self.validator, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _all_segments(self):
+        for index, start in enumerate(range(0, self.size, self.segment_bytes)):
+            yield index, start, min(self.size, start + self.segment_bytes) - 1
+
+    def pending(self) -> list:
+        """(index, first byte, last byte) of every segment still to fetch."""
+        return [segment for segment in self._all_segments() if segment[0] not in self.done]
+
+    def write(self, offset: int, data: bytes):
+        os.pwrite(self._fd, data, offset)
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            self._save_meta()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def finish(self) -> str:
+        """Close the completed partial and return its path; the sidecar is removed."""
+        self.close()
+        os.remove(self.meta_path)
+        return self.path
+
+    def discard(self):
+        self.close()
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _range_headers(start: int, end: int, validator: str) -> dict:
+    headers = dict(RANGE_HEADERS, Range=f"bytes={start}-{end}")
+    if validator:
+        headers["If-Range"] = validator
+    return headers
+
+
+def _check_range(response, start: int, end: int):
+    if response.status_code != 206:
+        raise RangeNotHonored(f"expected 206 for bytes {start}-{end}, got {response.status_code}")
+
+
+def fetch_ranges(url: str, part: PartialDownload, timeout: float,
+                 connections: int = DOWNLOAD_PARALLEL_CONNECTIONS) -> int:
+    """Fetch every pending segment of `part` over parallel connections; returns the segment count."""
+    client = get_http_client()
+
+    def fetch(segment):
+        index, start, end = segment
+        headers = _range_headers(start, end, part.validator)
+        with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            _check_range(response, start, end)
+            offset = start
+            for chunk in response.iter_bytes(chunk_size=CHUNK_SIZE):
+                part.write(offset, chunk)
+                offset += len(chunk)
+        if offset != end + 1:
+            raise IOError(f"short read for bytes {start}-{end}: got {offset - start} bytes")
+        part.mark_done(index)
+
+    pending = part.pending()
+    with ThreadPoolExecutor(max_workers=max(1, min(connections, len(pending) or 1))) as pool:
+        # list() re-raises the first failure; finished segments stay recorded for resuming.
+        list(pool.map(fetch, pending))
+    return len(pending)
+
+
+async def afetch_ranges(url: str, part: PartialDownload, timeout: float,
+                        connections: int = DOWNLOAD_PARALLEL_CONNECTIONS) -> int:
+    """Async counterpart of `fetch_ranges`."""
+    client = get_http_client()
+    slots = asyncio.Semaphore(max(1, connections))
+
+    async def fetch(segment):
+        index, start, end = segment
+        headers = _range_headers(start, end, part.validator)
+        async with slots:
+            async with client.astream("GET", url, headers=headers, timeout=timeout) as response:
+                _check_range(response, start, end)
+                offset = start
+                async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                    part.write(offset, chunk)
+                    offset += len(chunk)
+        if offset != end + 1:
+            raise IOError(f"short read for bytes {start}-{end}: got {offset - start} bytes")
+        part.mark_done(index)
+
+    pending = part.pending()
+    # Let every segment settle before reporting, like the threaded variant,
+    # so nothing is still writing into the partial when the caller cleans up.
+    results = await asyncio.gather(*[fetch(segment) for segment in pending], return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return len(pending)
@@ -1,11 +1,10 @@
-from google import genai
-import subprocess
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
-from google.genai import types
+import tempfile
+from .code_pool import get_code_pool
+from .workspace import current_workspace, RUN_CODE_TIMEOUT, RUN_CODE_CPU_SECONDS, RUN_CODE_MEMORY_MB
 load_dotenv()
-client = genai.Client()
 
 def strip_code_fences(code: str) -> str:
     code = code.strip()
@@ -24,9 +23,13 @@ def run_code(code: str) -> dict:
     This tool:
       1. Takes in python code as input
       3. Writes code into a temporary .py file
-      4. Executes the file
+      4. Executes the file in a warm Python worker (pandas/numpy pre-imported)
       5. Returns its output
 
+    To read a downloaded CSV/TSV/JSON/Excel file use
+    `from tabular import load_table; df = load_table("data.csv")`: it loads
+    the Parquet copy made at download time instead of re-parsing the text.
+
     Parameters
     ----------
     code : str
@@ -42,29 +45,67 @@ def run_code(code: str) -> dict:
         }
     """
     try: 
-        filename = "runner.py"
-        os.makedirs("LLMFiles", exist_ok=True)
-        with open(os.path.join("LLMFiles", filename), "w") as f:
-            f.write(code)
-
-        proc = subprocess.Popen(
-            ["uv", "run", filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd="LLMFiles"
-        )
-        stdout, stderr = proc.communicate()
-
-        # --- Step 4: Return everything ---
+        workspace, path = _write_script(code)
+
+        # Run in a pooled, pre-warmed interpreter instead of paying for
+        # `uv run` resolution and fresh pandas/numpy imports on every call.
+        try:
+            result = get_code_pool().run(path, cwd=workspace.path, site_dirs=workspace.site_dirs, **_limits())
+        finally:
+            os.remove(path)
+
+        return _check_quota(workspace, result)
+    except Exception as e:
         return {
-            "stdout": stdout,
-            "stderr": stderr,
-            "return_code": proc.returncode
+            "stdout": "",
+            "stderr": str(e),
+            "return_code": -1
         }
+
+
+def _write_script(code: str):
+    # Each agent run has its own workspace, and every execution gets its
+    # own script file, so concurrent calls never overwrite each other.
+    workspace = current_workspace()
+    workspace.check_quota()
+    fd, path = tempfile.mkstemp(prefix="runner_", suffix=".py", dir=workspace.path)
+    with os.fdopen(fd, "w") as f:
+        f.write(code)
+    return workspace, path
+
+
+def _limits() -> dict:
+    return {
+        "timeout": RUN_CODE_TIMEOUT or None,
+        "cpu_seconds": RUN_CODE_CPU_SECONDS or None,
+        "memory_mb": RUN_CODE_MEMORY_MB or None,
+    }
+
+
+def _check_quota(workspace, result: dict) -> dict:
+    try:
+        workspace.check_quota()
+    except Exception as e:
+        result["stderr"] += f"\n{e}. Delete unneeded files before continuing."
+    return result
+
+
+async def _arun_code(code: str) -> dict:
+    """Async variant of run_code, used when the graph runs with `ainvoke`."""
+    try:
+        workspace, path = _write_script(code)
+        try:
+            result = await get_code_pool().arun(path, cwd=workspace.path, site_dirs=workspace.site_dirs, **_limits())
+        finally:
+            os.remove(path)
+
+        return _check_quota(workspace, result)
     except Exception as e:
         return {
             "stdout": "",
             "stderr": str(e),
             "return_code": -1
-        }
\ No newline at end of file
+        }
+
+
+run_code.coroutine = _arun_code
@@ -1,5 +1,7 @@
 from langchain_core.tools import tool
-import requests
+from .http_client import get_http_client
+from .time_budget import current_budget
+import httpx
 import json
 from typing import Any, Dict, Optional
 
@@ -23,42 +25,74 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         returned. Otherwise, the raw text response is returned.
 
     Raises:
-        requests.HTTPError: If the server responds with an unsuccessful status.
-        requests.RequestException: For network-related errors.
+        httpx.HTTPStatusError: If the server responds with an unsuccessful status.
+        httpx.HTTPError: For network-related errors.
     """
     headers = headers or {"Content-Type": "application/json"}
     try:
         print(f"\nSending Answer \n{json.dumps(payload, indent=4)}\n to url: {url}")
-        response = requests.post(url, json=payload, headers=headers)
-
-        # Raise on 4xx/5xx
-        response.raise_for_status()
-
-        # Try to return JSON, fallback to raw text
-        data = response.json()
-        delay = data.get("delay", 0)
-        delay = delay if isinstance(delay, (int, float)) else 0
-        correct = data.get("correct")
-        if not correct and delay < 180:
-            del data["url"]
-        if delay >= 180:
-            data = {
-                "url": data.get("url")
-            }
-        print("Got the response: \n", json.dumps(data, indent=4), '\n')
-        return data
-    except requests.HTTPError as e:
-        # Extract server’s error response
-        err_resp = e.response
-
-        try:
-            err_data = err_resp.json()
-        except ValueError:
-            err_data = err_resp.text
-
-        print("HTTP Error Response:\n", err_data)
-        return err_data
+        # Shared pooled client: keep-alive to the evaluation host, timeouts
+        # and retries on transient failures.
+        response = get_http_client().post(url, json=payload, headers=headers)
+
+        return _handle_response(response)
+    except httpx.HTTPStatusError as e:
+        return _handle_http_error(e)
 
     except Exception as e:
         print("Unexpected error:", e)
-        return str(e)
\ No newline at end of file
+        return f"Error sending request: {e}"
+
+
+def _handle_response(response: httpx.Response) -> Any:
+    """Shared post-processing of a submission response (sync and async variants)."""
+    # Raise on 4xx/5xx
+    response.raise_for_status()
+
+    # Try to return JSON, fallback to raw text
+    data = response.json()
+    # The run's time budget decides whether a wrong answer is retried or
+    # the chain moves on to the next URL (see time_budget.py).
+    budget = current_budget()
+    decision = budget.on_submission(data)
+    if decision == "retry":
+        data.pop("url", None)
+        data["time_left_seconds"] = int(budget.remaining())
+    elif decision == "move_on":
+        data = {
+            "url": data.get("url"),
+            "note": "Out of time for this question; continue with the new URL.",
+        }
+    print("Got the response: \n", json.dumps(data, indent=4), '\n')
+    return data
+
+
+def _handle_http_error(e: httpx.HTTPStatusError) -> Any:
+    # Extract server’s error response
+    err_resp = e.response
+
+    try:
+        err_data = err_resp.json()
+    except ValueError:
+        err_data = err_resp.text
+
+    print("HTTP Error Response:\n", err_data)
+    return err_data
+
+
+async def _apost_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+    """Async variant of post_request, used when the graph runs with `ainvoke`."""
+    headers = headers or {"Content-Type": "application/json"}
+    try:
+        print(f"\nSending Answer \n{json.dumps(payload, indent=4)}\n to url: {url}")
+        response = await get_http_client().arequest("POST", url, json=payload, headers=headers)
+        return _handle_response(response)
+    except httpx.HTTPStatusError as e:
+        return _handle_http_error(e)
+
+    except Exception as e:
+        print("Unexpected error:", e)
+        return f"Error sending request: {e}"
+
+
+post_request.coroutine = _apost_request
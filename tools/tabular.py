@@ -0,0 +1,120 @@
+"""
+Tabular data helpers available inside the run_code sandbox.
+
+Like code_worker.py this module imports nothing from the `tools` package: it
+lives next to the worker script, so executed code can simply do
+
+    from tabular import load_table
+    df = load_table("data.csv")
+
+download_file calls `ingest` (through the code worker pool) right after a
+CSV/TSV/JSON/Excel download. It parses the file once, stores a Parquet copy
+next to it (`data.csv.parquet`) and reports the schema, row count and a
+preview. `load_table` then reads the Parquet copy, memory-mapped, instead of
+re-parsing the text on every run.
+"""
+import importlib.util
+import os
+
+TABULAR_EXTENSIONS = (".csv", ".tsv", ".json", ".jsonl", ".ndjson", ".xlsx", ".xls")
+COLUMNAR_SUFFIX = ".parquet"
+PREVIEW_ROWS = 5
+MAX_SCHEMA_COLUMNS = 50
+
+
+def is_tabular(path: str) -> bool:
+    return path.lower().endswith(TABULAR_EXTENSIONS)
+
+
+def columnar_path(path: str) -> str:
+    return path + COLUMNAR_SUFFIX
+
+
+_FALLBACK_LOGGED = False
+
+
+def _parquet_available() -> bool:
+    # Checked without importing pyarrow, so callers outside the sandbox stay light.
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def check_parquet() -> bool:
+    """
+    Whether Parquet conversion is possible. Logs once per process when
+    pyarrow is missing; called by download_file in the server process (the
+    code workers' stderr belongs to the executed jobs).
+    """
+    global _FALLBACK_LOGGED
+    if _parquet_available():
+        return True
+    if not _FALLBACK_LOGGED:
+        _FALLBACK_LOGGED = True
+        print("pyarrow is not installed: downloaded tables are parsed but not converted to Parquet")
+    return False
+
+
+def read_source(path: str, **kwargs):
+    """Parse a CSV/TSV/JSON/Excel file with pandas, picking the reader by extension."""
+    import pandas as pd
+
+    lower = path.lower()
+    if lower.endswith(".tsv"):
+        return pd.read_csv(path, sep="\t", **kwargs)
+    if lower.endswith(".csv"):
+        return pd.read_csv(path, **kwargs)
+    if lower.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True, **kwargs)
+    if lower.endswith(".json"):
+        return pd.read_json(path, **kwargs)
+    return pd.read_excel(path, **kwargs)
+
+
+def _fresh(path: str) -> bool:
+    """Whether the Parquet copy of `path` exists and is newer than the source."""
+    converted = columnar_path(path)
+    return os.path.exists(converted) and os.path.getmtime(converted) >= os.path.getmtime(path)
+
+
+def load_table(path: str, columns=None):
+    """
+    Load a tabular file as a DataFrame, from its Parquet copy when one is
+    available (creating it on first use). `columns` restricts the columns read.
+    """
+    import pandas as pd
+
+    if _fresh(path):
+        return pd.read_parquet(columnar_path(path), columns=columns, memory_map=True)
+    df = read_source(path)
+    _write_columnar(df, path)
+    return df if columns is None else df[columns]
+
+
+def _write_columnar(df, path: str) -> bool:
+    if not _parquet_available():
+        return False
+    try:
+        # Parquet needs string column names.
+        df.columns = [str(c) for c in df.columns]
+        tmp = columnar_path(path) + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, columnar_path(path))
+        return True
+    except Exception:
+        return False
+
+
+def ingest(path: str) -> dict:
+    """Convert `path` to Parquet once and describe it: rows, column dtypes and a preview."""
+    import pandas as pd
+
+    df = pd.read_parquet(columnar_path(path)) if _fresh(path) else read_source(path)
+    converted = _fresh(path) or _write_columnar(df, path)
+    with pd.option_context("display.max_columns", 20, "display.width", 160, "display.max_colwidth", 40):
+        preview = df.head(PREVIEW_ROWS).to_string()
+    return {
+        "rows": len(df),
+        "column_count": len(df.columns),
+        "columns": {str(name): str(dtype) for name, dtype in list(df.dtypes.items())[:MAX_SCHEMA_COLUMNS]},
+        "preview": preview,
+        "columnar": columnar_path(path) if converted else None,
+    }
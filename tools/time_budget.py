@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+# Time budget knobs (overridable through the environment / .env file)
+# Seconds the quiz allows per question, and for a whole chain (0 = unlimited).
+QUIZ_STEP_SECONDS = float(os.getenv("QUIZ_STEP_SECONDS", "180"))
+QUIZ_CHAIN_SECONDS = float(os.getenv("QUIZ_CHAIN_SECONDS", "0"))
+# After a wrong answer, move on to the next URL (when the response offers
+# one) once less than this much of the question's time is left.
+QUIZ_RETRY_MIN_SECONDS = float(os.getenv("QUIZ_RETRY_MIN_SECONDS", "30"))
+# "remaining": a tool call may use at most TOOL_TIMEOUT_FRACTION of the time
+# left (but never less than TOOL_TIMEOUT_MIN_SECONDS); "off": no cut-off.
+TOOL_TIMEOUT_POLICY = os.getenv("TOOL_TIMEOUT_POLICY", "remaining")
+TOOL_TIMEOUT_FRACTION = float(os.getenv("TOOL_TIMEOUT_FRACTION", "0.75"))
+TOOL_TIMEOUT_MIN_SECONDS = float(os.getenv("TOOL_TIMEOUT_MIN_SECONDS", "15"))
+
+# Submissions are never cut off: the server may already have recorded them.
+UNBOUNDED_TOOLS = {"post_request"}
+
+
+class TimeBudget:
+    """
+    Clock of one quiz chain: when the chain and its current question began,
+    and what happened to every question so far.
+
+    A question (step) starts with the chain's first URL and with every new
+    URL a submission response hands out. The budget decides what a wrong
+    answer leads to (retry, or move on when time is short), bounds how long
+    a single tool call may take, and describes the remaining time for the
+    LLM prompt.
+    """
+
+    def __init__(self, url: str, step_seconds: float = QUIZ_STEP_SECONDS,
+                 chain_seconds: float = QUIZ_CHAIN_SECONDS):
+        self.step_seconds = step_seconds
+        self.chain_seconds = chain_seconds
+        self.chain_started = time.monotonic()
+        self.steps = []
+        self.cut_off = 0
+        self._start_step(url)
+
+    # -------------------------------------------------
+    # Clock
+    # -------------------------------------------------
+    @property
+    def step(self) -> dict:
+        return self.steps[-1]
+
+    def _start_step(self, url: str):
+        self.steps.append({"url": url, "started": time.monotonic(), "attempts": 0,
+                           "server_delay": None, "seconds": None, "outcome": None})
+
+    def _finish_step(self, outcome: str):
+        step = self.step
+        if step["outcome"] is None:
+            step["seconds"] = round(self.step_elapsed(), 3)
+            step["outcome"] = outcome
+
+    def step_elapsed(self) -> float:
+        elapsed = time.monotonic() - self.step["started"]
+        # The quiz server's own clock wins when it reports a larger delay.
+        return max(elapsed, self.step["server_delay"] or 0)
+
+    def chain_elapsed(self) -> float:
+        return time.monotonic() - self.chain_started
+
+    def remaining(self) -> float:
+        """Seconds left for the current question, also bounded by the chain budget."""
+        left = self.step_seconds - self.step_elapsed()
+        if self.chain_seconds > 0:
+            left = min(left, self.chain_seconds - self.chain_elapsed())
+        return max(0.0, left)
+
+    # -------------------------------------------------
+    # Decisions
+    # -------------------------------------------------
+    def on_submission(self, response: dict) -> str:
+        """
+        Account for a submission response and decide what comes next:
+        "next" (answer accepted, new URL), "done" (accepted, chain over),
+        "retry" (wrong, time left) or "move_on" (wrong, skip to the new URL).
+        """
+        step = self.step
+        step["attempts"] += 1
+        delay = response.get("delay")
+        if isinstance(delay, (int, float)) and delay > 0:
+            step["server_delay"] = delay
+        next_url = response.get("url")
+        if response.get("correct"):
+            self._finish_step("correct")
+            if next_url:
+                self._start_step(next_url)
+                return "next"
+            return "done"
+        if next_url and self.remaining() < QUIZ_RETRY_MIN_SECONDS:
+            self._finish_step("skipped")
+            self._start_step(next_url)
+            return "move_on"
+        return "retry"
+
+    def tool_timeout(self, name: str):
+        """Seconds the tool call `name` may take under TOOL_TIMEOUT_POLICY, or None."""
+        if TOOL_TIMEOUT_POLICY == "off" or name in UNBOUNDED_TOOLS:
+            return None
+        return max(TOOL_TIMEOUT_MIN_SECONDS, self.remaining() * TOOL_TIMEOUT_FRACTION)
+
+    def prompt_note(self) -> str:
+        """One-paragraph status of the clock, appended to the system prompt."""
+        left = self.remaining()
+        answered = sum(1 for s in self.steps if s["outcome"] == "correct")
+        note = (
+            f"TIME BUDGET: {left:.0f}s left for the current question ({self.step['url']}), "
+            f"{self.step['attempts']} attempts so far. {answered} questions answered in "
+            f"{self.chain_elapsed():.0f}s."
+        )
+        if left < QUIZ_RETRY_MIN_SECONDS:
+            note += " Time is nearly up: submit your best answer now."
+        return note
+
+    # -------------------------------------------------
+    # Checkpointing
+    # -------------------------------------------------
+    def snapshot(self) -> dict:
+        """The clock with wall-clock start times, for the run's checkpoint (see `restore`)."""
+        now, wall = time.monotonic(), time.time()
+        return {
+            "chain_started_at": wall - (now - self.chain_started),
+            "cut_off": self.cut_off,
+            "steps": [dict(step, started=wall - (now - step["started"])) for step in self.steps],
+        }
+
+    @classmethod
+    def restore(cls, snapshot: dict, **kwargs) -> "TimeBudget":
+        """
+        Rebuild the clock of a resumed run from `snapshot`. The time the run
+        was interrupted counts as elapsed, as it does on the quiz server.
+        """
+        budget = cls(snapshot["steps"][-1]["url"], **kwargs)
+        now, wall = time.monotonic(), time.time()
+        budget.chain_started = now - (wall - snapshot["chain_started_at"])
+        budget.cut_off = snapshot["cut_off"]
+        budget.steps = [dict(step, started=now - (wall - step["started"])) for step in snapshot["steps"]]
+        return budget
+
+    def summary(self) -> dict:
+        """Per-question timing for the task log."""
+        steps = []
+        for step in self.steps:
+            seconds = step["seconds"]
+            if seconds is None:
+                seconds = round(time.monotonic() - step["started"], 3)
+            steps.append({"url": step["url"], "seconds": seconds, "attempts": step["attempts"],
+                          "server_delay": step["server_delay"], "outcome": step["outcome"] or "unfinished"})
+        return {
+            "chain_seconds": round(self.chain_elapsed(), 3),
+            "answered": sum(1 for s in steps if s["outcome"] == "correct"),
+            "skipped": sum(1 for s in steps if s["outcome"] == "skipped"),
+            "tool_calls_cut_off": self.cut_off,
+            "steps": steps,
+        }
+
+
+# -------------------------------------------------
+# Per-run scoping
+# -------------------------------------------------
+_CURRENT = contextvars.ContextVar("time_budget", default=None)
+
+
+# Monotonic deadline of the tool call running in this context (set by
+# `budget_tool`). Synchronous tools bound their own waits by it, so a call
+# that runs out of time stops and frees its browser, worker and slots.
+_CALL_DEADLINE = contextvars.ContextVar("tool_call_deadline", default=None)
+
+
+def call_timeout(timeout: float = None):
+    """`timeout` shortened to the time the current tool call has left (None: no limit)."""
+    deadline = _CALL_DEADLINE.get()
+    if deadline is None:
+        return timeout
+    left = max(0.0, deadline - time.monotonic())
+    return left if timeout is None else min(timeout, left)
+
+
+def current_budget() -> TimeBudget:
+    """Return the time budget of the agent run executing in this context."""
+    budget = _CURRENT.get()
+    # Outside a run (e.g. calling a tool from a REPL): a throwaway one.
+    return budget if budget is not None else TimeBudget(url="")
+
+
+@contextmanager
+def time_budget_scope(url: str, snapshot: dict = None):
+    """
+    Start the clock of a quiz chain beginning at `url` for the enclosed agent
+    run, or continue the clock saved in `snapshot` when resuming it.
+    """
+    budget = TimeBudget.restore(snapshot) if snapshot else TimeBudget(url)
+    token = _CURRENT.set(budget)
+    try:
+        yield budget
+    finally:
+        _CURRENT.reset(token)
+
+
+# -------------------------------------------------
+# Tool cut-off
+# -------------------------------------------------
+# Synchronous tool calls cannot be interrupted from outside, so they run in
+# the caller's thread under a deadline (`call_timeout`) that the tools apply
+# to their own waits: the browser render is cancelled, the run_code worker
+# killed, slot and prefetch waits given up, and downloads and dependency
+# installs get no more than the time left (a package install keeps going in
+# the background; the call stops waiting for it).
+
+
+def _cut_off_message(name: str, timeout: float, budget: TimeBudget) -> str:
+    budget.cut_off += 1
+    return (
+        f"Error: {name} was cut off after {timeout:.0f}s to stay within the question's time budget "
+        f"({budget.remaining():.0f}s left). Use a faster approach or submit your best answer."
+    )
+
+
+def budget_tool(tool):
+    """
+    Return a copy of `tool` whose calls are cut off after the time the
+    current question's budget allows (see `TimeBudget.tool_timeout`).
+    """
+    name = tool.name
+    func, coroutine = tool.func, tool.coroutine
+
+    @functools.wraps(func)
+    def bounded(*args, **kwargs):
+        budget = current_budget()
+        timeout = budget.tool_timeout(name)
+        if timeout is None:
+            return func(*args, **kwargs)
+        deadline = time.monotonic() + timeout
+        token = _CALL_DEADLINE.set(deadline)
+        try:
+            result = func(*args, **kwargs)
+        except TimeoutError:
+            if time.monotonic() < deadline:
+                raise
+            return _cut_off_message(name, timeout, budget)
+        finally:
+            _CALL_DEADLINE.reset(token)
+        if time.monotonic() >= deadline:
+            # Stopped by its deadline; the tool's own result says how far it got.
+            budget.cut_off += 1
+        return result
+
+    abounded = None
+    if coroutine is not None:
+        @functools.wraps(coroutine)
+        async def abounded(*args, **kwargs):
+            budget = current_budget()
+            timeout = budget.tool_timeout(name)
+            try:
+                return await asyncio.wait_for(coroutine(*args, **kwargs), timeout)
+            except asyncio.TimeoutError:
+                return _cut_off_message(name, timeout, budget)
+
+    return tool.model_copy(update={"func": bounded, "coroutine": abounded})
@@ -1,11 +1,33 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+import asyncio
+from .browser_pool import get_browser_pool
+from .page_extract import extract_compact, file_links, PAGE_MAX_CHARS
+from .prefetch import get_prefetcher, PREFETCH
+
+
+async def _content_and_url(page):
+    # The final URL (after redirects) is the base for resolving relative links.
+    return await page.content(), page.url
+
+
+def _format(html: str, url: str, mode: str, max_chars: int) -> str:
+    files = []
+    if mode == "html":
+        result = html
+        if PREFETCH:
+            files = file_links(html, url)
+    else:
+        result = extract_compact(html, url, max_chars, file_urls=files)
+    if PREFETCH and files:
+        # Start downloading the linked files while the LLM reads the page.
+        get_prefetcher().prefetch(files)
+    return result
+
 
 @tool
-def get_rendered_html(url: str) -> str:
+def get_rendered_html(url: str, mode: str = "compact", max_chars: int = PAGE_MAX_CHARS) -> str:
     """
-    Fetch and return the fully rendered HTML of a webpage.
+    Fetch a webpage, render it with JavaScript, and return its content.
 
     This function uses Playwright to load a webpage in a headless Chromium
     browser, allowing all JavaScript on the page to execute. Use this for
@@ -20,27 +42,43 @@ def get_rendered_html(url: str) -> str:
     ----------
     url : str
         The URL of the webpage to retrieve and render.
+    mode : str
+        "compact" (default): visible text, links with absolute URLs, file and
+        media links, forms, tables as rows, and decoded base64 content.
+        "html": the full rendered HTML; use it only when the compact view is
+        missing something (e.g. element attributes).
+    max_chars : int
+        Maximum length of the compact output. Only the text and tables are
+        cut to fit; forms, file links and links are always kept.
 
     Returns
     -------
     str
-        The fully rendered and cleaned HTML content.
+        The compact page representation, or the rendered HTML.
     """
-    # ... existing code ...
     print("\nFetching and rendering:", url)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+        # Render in a pooled context of the shared, long-lived browser instead
+        # of launching a fresh Chromium for every page.
+        html, final_url = get_browser_pool().render(url, extract=_content_and_url)
+        return _format(html, final_url, mode, max_chars)
 
-            # Load the page (let JS execute)
-            page.goto(url, wait_until="networkidle")
+    except Exception as e:
+        return f"Error fetching/rendering page: {str(e)}"
 
-            # Extract rendered HTML
-            content = page.content()
 
-            browser.close()
-            return content
+async def _aget_rendered_html(url: str, mode: str = "compact", max_chars: int = PAGE_MAX_CHARS) -> str:
+    """Async variant of get_rendered_html, used when the graph runs with `ainvoke`."""
+    print("\nFetching and rendering:", url)
+    try:
+        pool = get_browser_pool()
+        # The render runs on the pool's own loop; awaiting the bridged future
+        # keeps the caller's event loop free in the meantime.
+        html, final_url = await asyncio.wrap_future(pool.submit(pool.arender(url, extract=_content_and_url)))
+        return _format(html, final_url, mode, max_chars)
 
     except Exception as e:
-        return f"Error fetching/rendering page: {str(e)}"
\ No newline at end of file
+        return f"Error fetching/rendering page: {str(e)}"
+
+
+get_rendered_html.coroutine = _aget_rendered_html
@@ -0,0 +1,136 @@
+import contextvars
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+# Workspace layout and limits (overridable through the environment / .env file)
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "LLMFiles")
+WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_BYTES", str(1024 ** 3)))
+# Set WORKSPACE_KEEP=1 to keep a run's files after it finishes (for debugging).
+WORKSPACE_KEEP = os.getenv("WORKSPACE_KEEP", "0") == "1"
+WORKSPACE_MAX_AGE_SECONDS = float(os.getenv("WORKSPACE_MAX_AGE_SECONDS", str(24 * 3600)))
+
+# Per-execution limits for run_code
+RUN_CODE_TIMEOUT = float(os.getenv("RUN_CODE_TIMEOUT", "300"))
+RUN_CODE_CPU_SECONDS = int(os.getenv("RUN_CODE_CPU_SECONDS", "240"))
+RUN_CODE_MEMORY_MB = int(os.getenv("RUN_CODE_MEMORY_MB", "2048"))
+
+
+class WorkspaceQuotaError(Exception):
+    """Raised when a workspace grows beyond its disk quota."""
+
+
+class Workspace:
+    """
+    A private working directory for one agent run.
+
+    Every file the tools produce for a run (downloads, generated scripts and
+    their outputs) lives under `path`, so concurrent runs never race on the
+    same files. `max_bytes` bounds how much disk one run may use.
+    `site_dirs` lists the dependency overlays add_dependencies made
+    importable for this run's run_code executions.
+    """
+
+    def __init__(self, path: str, max_bytes: int = WORKSPACE_MAX_BYTES, run_id: str = None):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.run_id = run_id
+        self.site_dirs = []
+        os.makedirs(self.path, exist_ok=True)
+
+    def resolve(self, filename: str) -> str:
+        """Return the absolute path of `filename` inside the workspace."""
+        path = os.path.abspath(os.path.join(self.path, filename))
+        if os.path.commonpath([path, self.path]) != self.path:
+            raise ValueError(f"Path escapes the workspace: {filename}")
+        return path
+
+    def usage_bytes(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def check_quota(self):
+        """Raise WorkspaceQuotaError if the workspace is over its quota."""
+        used = self.usage_bytes()
+        if self.max_bytes > 0 and used > self.max_bytes:
+            raise WorkspaceQuotaError(
+                f"Workspace quota exceeded: {used} bytes used, limit is {self.max_bytes} bytes"
+            )
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _runs_dir() -> str:
+    return os.path.join(WORKSPACE_ROOT, "runs")
+
+
+# Tools called outside an agent run (e.g. from a REPL) share the legacy directory,
+# which also holds the download cache and run workspaces, so it has no quota.
+_DEFAULT = None
+_CURRENT = contextvars.ContextVar("workspace", default=None)
+
+
+def current_workspace() -> Workspace:
+    """Return the workspace of the agent run executing in this context."""
+    global _DEFAULT
+    workspace = _CURRENT.get()
+    if workspace is None:
+        if _DEFAULT is None:
+            _DEFAULT = Workspace(WORKSPACE_ROOT, max_bytes=0)
+        workspace = _DEFAULT
+    return workspace
+
+
+@contextmanager
+def task_workspace(run_id: str, keep: bool = WORKSPACE_KEEP, resume: bool = False):
+    """
+    Create a fresh workspace for `run_id` and make it current for the
+    duration of the block (including tool calls LangGraph runs in executor
+    threads, which inherit the context). Removed afterwards unless `keep`.
+
+    With `resume`, the files of an earlier, interrupted run of `run_id` are
+    kept. A run that fails leaves its workspace behind for such a resume;
+    sweep_stale_workspaces removes it eventually.
+    """
+    path = os.path.join(_runs_dir(), str(run_id))
+    if not resume:
+        # Task ids restart after a process restart; never inherit a stale directory.
+        shutil.rmtree(path, ignore_errors=True)
+    workspace = Workspace(path, run_id=str(run_id))
+    token = _CURRENT.set(workspace)
+    failed = False
+    try:
+        yield workspace
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _CURRENT.reset(token)
+        if not keep and not failed:
+            workspace.cleanup()
+
+
+def sweep_stale_workspaces(max_age_seconds: float = WORKSPACE_MAX_AGE_SECONDS) -> int:
+    """Delete run workspaces untouched for longer than `max_age_seconds`."""
+    removed = 0
+    runs_dir = _runs_dir()
+    if not os.path.isdir(runs_dir):
+        return removed
+    cutoff = time.time() - max_age_seconds
+    for name in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            pass
+    return removed
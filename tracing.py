@@ -0,0 +1,295 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Tracing limits (overridable through the environment / .env file)
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+# Finished traces kept in memory for /tasks/{id}/trace (main.py also persists them).
+TRACE_KEEP_FINISHED = int(os.getenv("TRACE_KEEP_FINISHED", "100"))
+
+# Upper bounds (seconds) of the span duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# Tools report failures in their return value rather than raising: a
+# message starting with this marker, or a run_code result with a non-zero
+# return code.
+TOOL_ERROR_PREFIX = "Error"
+
+
+def _size(value) -> int:
+    """Payload size in characters of a tool input/output or message content."""
+    value = getattr(value, "content", value)
+    return len(value if isinstance(value, str) else str(value))
+
+
+def _tool_failed(output) -> bool:
+    """Whether a tool's output (a ToolMessage or the raw return value) reports a failure."""
+    if getattr(output, "status", None) == "error":
+        return True
+    value = getattr(output, "content", output)
+    if isinstance(value, str) and value.startswith("{"):
+        # Dict results reach the callbacks serialized as JSON.
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if isinstance(value, dict):
+        return value.get("return_code", 0) != 0
+    return isinstance(value, str) and value.startswith(TOOL_ERROR_PREFIX)
+
+
+class Trace:
+    """
+    Timeline of one agent run: a list of spans (agent node calls, tool calls,
+    rate limiter waits) with their start offset, duration, outcome and
+    attributes such as payload sizes and token counts.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_at = time.time()
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, kind: str, name: str, started: float, duration: float, outcome: str, **attrs):
+        """Record a span; `started` is a time.monotonic() reading."""
+        span = {
+            "kind": kind,
+            "name": name,
+            "start": round(started - self._origin, 6),
+            "duration": round(duration, 6),
+            "outcome": outcome,
+            "attrs": attrs,
+        }
+        with self._lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        METRICS.observe(kind, name, outcome, duration, **attrs)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {"run_id": self.run_id, "started_at": self.started_at, "dropped": self.dropped, "spans": spans}
+
+
+# -------------------------------------------------
+# Current trace and explicit spans
+# -------------------------------------------------
+_CURRENT = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_ACTIVE = {}
+_FINISHED = OrderedDict()
+
+
+def current_trace():
+    """Return the trace of the agent run executing in this context, if any."""
+    return _CURRENT.get()
+
+
+class _Span:
+    def __init__(self):
+        self.attrs = {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Time the enclosed block as a span of the current trace. Attributes known
+    only at the end (sizes, token counts) can be added with `.set(...)`.
+    Without a current trace the span still feeds /metrics.
+    """
+    handle = _Span()
+    handle.attrs.update(attrs)
+    started = time.monotonic()
+    outcome = "ok"
+    try:
+        yield handle
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        record_span(kind, name, started, time.monotonic() - started, outcome, **handle.attrs)
+
+
+def record_span(kind: str, name: str, started: float, duration: float, outcome: str = "ok", **attrs):
+    trace = current_trace()
+    if trace is not None:
+        trace.add(kind, name, started, duration, outcome, **attrs)
+    else:
+        METRICS.observe(kind, name, outcome, duration, **attrs)
+
+
+@contextmanager
+def trace_scope(run_id: str):
+    """Make a fresh Trace current for the enclosed agent run."""
+    trace = Trace(str(run_id))
+    token = _CURRENT.set(trace)
+    with _lock:
+        _ACTIVE[trace.run_id] = trace
+    try:
+        yield trace
+    finally:
+        _CURRENT.reset(token)
+        with _lock:
+            _ACTIVE.pop(trace.run_id, None)
+            _FINISHED[trace.run_id] = trace
+            while len(_FINISHED) > TRACE_KEEP_FINISHED:
+                _FINISHED.popitem(last=False)
+
+
+def get_trace(run_id: str):
+    """Return the running or recently finished trace of `run_id` as a dict, or None."""
+    with _lock:
+        trace = _ACTIVE.get(str(run_id)) or _FINISHED.get(str(run_id))
+    return None if trace is None else trace.to_dict()
+
+
+# -------------------------------------------------
+# Tool spans via LangChain callbacks
+# -------------------------------------------------
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    Records a span for every tool call the ToolNode makes, plus one "node"
+    span per tools step: with parallel tool calls its duration is that of the
+    slowest call rather than the sum. Passed in the graph config, so it sees
+    runs from both `invoke` and `ainvoke`.
+    """
+
+    # Run in the calling context instead of an executor, so timings are exact.
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._open = {}
+        self._steps = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        if kwargs.get("name") == "tools" and (metadata or {}).get("langgraph_node") == "tools":
+            self._steps[run_id] = time.monotonic()
+
+    def _close_step(self, run_id, outcome: str, tool_calls: int):
+        started = self._steps.pop(run_id, None)
+        if started is not None:
+            self.trace.add("node", "tools", started, time.monotonic() - started, outcome, tool_calls=tool_calls)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        messages = outputs.get("messages", []) if isinstance(outputs, dict) else outputs
+        self._close_step(run_id, "ok", len(messages) if isinstance(messages, list) else 0)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close_step(run_id, "error", 0)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._open[run_id] = (name, time.monotonic(), len(input_str or ""))
+
+    def _close(self, run_id, outcome: str, output_chars: int):
+        opened = self._open.pop(run_id, None)
+        if opened is None:
+            return
+        name, started, input_chars = opened
+        self.trace.add(
+            "tool", name, started, time.monotonic() - started, outcome,
+            input_chars=input_chars, output_chars=output_chars,
+        )
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._close(run_id, "error" if _tool_failed(output) else "ok", _size(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, "error", 0)
+
+
+# -------------------------------------------------
+# Aggregated metrics (Prometheus text exposition)
+# -------------------------------------------------
+def _labels(**labels) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Metrics:
+    """Process-wide histograms and counters aggregated from every span."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._payload = {}
+        self._tokens = {}
+
+    def observe(self, kind: str, name: str, outcome: str, duration: float, **attrs):
+        key = (kind, name, outcome)
+        with self._lock:
+            counts, total = self._durations.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._durations[key] = (counts, total + duration)
+            for direction in ("input", "output"):
+                chars = attrs.get(f"{direction}_chars")
+                if chars:
+                    pkey = (kind, name, direction)
+                    self._payload[pkey] = self._payload.get(pkey, 0) + chars
+            for kind_of_token in ("input", "output"):
+                tokens = attrs.get(f"{kind_of_token}_tokens")
+                if tokens:
+                    self._tokens[kind_of_token] = self._tokens.get(kind_of_token, 0) + tokens
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            durations = {k: (list(c), t) for k, (c, t) in self._durations.items()}
+            payload = dict(self._payload)
+            tokens = dict(self._tokens)
+
+        lines = [
+            "# HELP quiz_span_duration_seconds Duration of agent node, tool and rate limiter spans.",
+            "# TYPE quiz_span_duration_seconds histogram",
+        ]
+        for (kind, name, outcome), (counts, total) in sorted(durations.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(
+                    f"quiz_span_duration_seconds_bucket{_labels(kind=kind, name=name, outcome=outcome, le=bound)} {count}"
+                )
+            labels = _labels(kind=kind, name=name, outcome=outcome)
+            lines.append(
+                f"quiz_span_duration_seconds_bucket{_labels(kind=kind, name=name, outcome=outcome, le='+Inf')} {counts[-1]}"
+            )
+            lines.append(f"quiz_span_duration_seconds_sum{labels} {total}")
+            lines.append(f"quiz_span_duration_seconds_count{labels} {counts[-1]}")
+
+        lines += [
+            "# HELP quiz_span_payload_chars_total Characters passed into and returned from spans.",
+            "# TYPE quiz_span_payload_chars_total counter",
+        ]
+        for (kind, name, direction), chars in sorted(payload.items()):
+            lines.append(f"quiz_span_payload_chars_total{_labels(kind=kind, name=name, direction=direction)} {chars}")
+
+        lines += [
+            "# HELP quiz_llm_tokens_total LLM tokens reported by the provider.",
+            "# TYPE quiz_llm_tokens_total counter",
+        ]
+        for kind_of_token, count in sorted(tokens.items()):
+            lines.append(f"quiz_llm_tokens_total{_labels(type=kind_of_token)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+import traceback
+from agent import get_app
+from tools.browser_pool import get_browser_pool
+from tools.code_pool import get_code_pool
+
+# Warm-up knobs (overridable through the environment / .env file)
+# WARMUP=0 builds everything on first use instead (the first task pays for it).
+WARMUP = os.getenv("WARMUP", "1") == "1"
+# Also launch the headless browser and the run_code workers ahead of time.
+WARMUP_BROWSER = os.getenv("WARMUP_BROWSER", "1") == "1"
+WARMUP_CODE_POOL = os.getenv("WARMUP_CODE_POOL", "1") == "1"
+
+
+class WarmUp:
+    """
+    Builds the expensive pieces of the server (chat model and compiled
+    graph, browser, code workers) after startup instead of at import, so
+    liveness (/healthz) is answered right away, and reports when everything
+    is in place for readiness (/readyz).
+
+    Steps run one after another in a daemon thread (or inline with `run`).
+    A failed step leaves the process not ready; the piece is then built
+    again on first use, where the error surfaces in the task.
+    """
+
+    def __init__(self):
+        self._steps = []
+        self._lock = threading.Lock()
+        self._status = {}
+        self._thread = None
+
+    def add(self, name: str, fn):
+        """Register `fn` (no arguments) as the warm-up step `name`."""
+        self._steps.append((name, fn))
+        self._status[name] = {"state": "pending" if WARMUP else "skipped", "seconds": None, "error": None}
+
+    def _set(self, name: str, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    def run(self):
+        """Run every step in the calling thread."""
+        if not WARMUP:
+            return
+        for name, fn in self._steps:
+            self._set(name, state="running")
+            started = time.monotonic()
+            try:
+                fn()
+            except Exception as e:
+                traceback.print_exc()
+                self._set(name, state="failed", seconds=round(time.monotonic() - started, 3), error=str(e))
+            else:
+                self._set(name, state="ok", seconds=round(time.monotonic() - started, 3))
+
+    def start(self):
+        """Run the steps in the background."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def status(self) -> dict:
+        with self._lock:
+            steps = {name: dict(status) for name, status in self._status.items()}
+        ready = all(s["state"] in ("ok", "skipped") for s in steps.values())
+        return {"ready": ready, "steps": steps}
+
+
+def create_warm_up() -> WarmUp:
+    """The warm-up of a process that runs agents: graph first, then browser and code workers."""
+    warm_up = WarmUp()
+    warm_up.add("agent", get_app)
+    if WARMUP_BROWSER:
+        warm_up.add("browser", lambda: get_browser_pool().warm_up())
+    if WARMUP_CODE_POOL:
+        # Done once every worker has finished its preload imports.
+        warm_up.add("code_pool", lambda: get_code_pool().warm_up())
+    return warm_up
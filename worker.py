@@ -0,0 +1,120 @@
+import asyncio
+import os
+import signal
+import socket
+import time
+import uuid
+# The worker runs tasks exactly like the API's in-process scheduler does.
+from task_runner import run_agent_with_logging, mark_expired, aset_status
+from scheduler import SCHEDULER_WORKERS
+from task_queue import create_task_queue, TASK_HEARTBEAT_SECONDS, TASK_MAX_ATTEMPTS
+from warmup import create_warm_up
+
+# Agent worker knobs (overridable through the environment / .env file)
+# Quiz chains one worker process runs at once.
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(SCHEDULER_WORKERS)))
+# Seconds between claim attempts while the queue is empty or all slots are busy.
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+
+
+class AgentWorker:
+    """
+    Agent worker process of the multi-worker deployment (TASK_QUEUE=sqlite).
+
+    Claims tasks from the shared queue while it has free slots, runs each
+    one with `run_agent_with_logging` (so statuses, results, traces and
+    checkpoints end up in the shared stores), and heartbeats its leases
+    meanwhile. A run whose lease was lost (the worker stalled past
+    TASK_LEASE_SECONDS and another worker took over) is cancelled. On
+    shutdown the running tasks are cancelled and their leases released, so
+    another worker resumes them from their checkpoints right away.
+    """
+
+    def __init__(self, queue, concurrency: int = WORKER_CONCURRENCY, worker_id: str = None):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._running = {}
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Claim and run tasks until `stop` is called."""
+        print(f"Worker {self.worker_id} running up to {self.concurrency} tasks")
+        while not self._stopping.is_set():
+            job = None
+            if len(self._running) < self.concurrency:
+                job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            if job is None:
+                # Queue empty or all slots busy: wait a little (or for `stop`).
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task_id = job["task_id"]
+            self._running[task_id] = asyncio.create_task(self._run(job), name=f"task-{task_id}")
+            self._running[task_id].add_done_callback(lambda _, task_id=task_id: self._running.pop(task_id, None))
+        await self._drain()
+
+    async def _run(self, job: dict):
+        task_id = job["task_id"]
+        if job["deadline"] is not None and time.time() > job["deadline"]:
+            await mark_expired(job["url"], task_id)
+            self.queue.complete(task_id, self.worker_id)
+            return
+        if job["attempts"] > TASK_MAX_ATTEMPTS:
+            await aset_status(task_id, "failed", f"Gave up after {TASK_MAX_ATTEMPTS} lost leases", completed_at=time.time())
+            self.queue.complete(task_id, self.worker_id)
+            return
+        if job["reclaimed"]:
+            print(f"Reclaimed task {task_id} after an expired lease (attempt {job['attempts']})")
+        run = asyncio.create_task(run_agent_with_logging(job["url"], task_id, job["resume"]))
+        heartbeat = asyncio.create_task(self._heartbeat(task_id, run))
+        try:
+            await run
+        except asyncio.CancelledError:
+            # Lost lease or shutdown: the task stays in the queue for another worker.
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            return
+        finally:
+            heartbeat.cancel()
+        self.queue.complete(task_id, self.worker_id)
+
+    async def _heartbeat(self, task_id: int, run: asyncio.Task):
+        while True:
+            await asyncio.sleep(TASK_HEARTBEAT_SECONDS)
+            if not await asyncio.to_thread(self.queue.heartbeat, task_id, self.worker_id):
+                print(f"Lost the lease of task {task_id}; another worker took it over")
+                run.cancel()
+                return
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _drain(self):
+        """Cancel the running tasks and hand their leases back to the queue."""
+        tasks = dict(self._running)
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for task_id in tasks:
+            self.queue.release(task_id, self.worker_id)
+
+
+async def main():
+    queue = create_task_queue()
+    if queue is None:
+        raise SystemExit("worker.py needs a shared queue: set TASK_QUEUE=sqlite for the API and the workers")
+    # Build the model, graph and browser before claiming, so the first task
+    # does not pay for them while its lease runs.
+    await asyncio.to_thread(create_warm_up().run)
+    worker = AgentWorker(queue)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())